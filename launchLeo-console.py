@@ -5,4 +5,6 @@ A minimal script to launch leo.
 """
 
 import leo.core.runLeo
-leo.core.runLeo.run_console()
+# Spawned worker processes import this module.
+if __name__ == '__main__':
+    leo.core.runLeo.run_console()
@@ -5,5 +5,7 @@ A minimal script to launch leo.
 """
 
 import leo.core.runLeo  # Overrides sys.excepthook.
-leo.core.runLeo.run()
+# Spawned worker processes import this module.
+if __name__ == '__main__':
+    leo.core.runLeo.run()
 
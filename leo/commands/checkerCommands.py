@@ -5,10 +5,16 @@
 """Commands that invoke external checkers"""
 #@+<< imports >>
 #@+node:ekr.20161021092038.1: ** << imports >> checkerCommands.py
+import concurrent.futures
+import hashlib
+import io
+import multiprocessing
 import os
 import re
 import shlex
+import subprocess
 import sys
+import threading
 import time
 #
 # Third-party imports.
@@ -184,6 +190,7 @@ def flake8_command(event):
 def kill_pylint(event):
     """Kill any running pylint processes and clear the queue."""
     g.app.backgroundProcessManager.kill('pylint')
+    get_checker_pool().kill('pylint')
 #@+node:ekr.20210302111730.1: *3* mypy command
 @g.command('mypy')
 def mypy_command(event):
@@ -230,7 +237,7 @@ def pyflakes_command(event):
         if c.isChanged():
             c.save()
         if pyflakes:
-            PyflakesCommand(c).run(force=True)
+            PyflakesCommand(c).run(force=True, background=True)
         else:
             g.es_print('can not import pyflakes')
 #@+node:ekr.20150514125218.7: *3* pylint command
@@ -356,6 +363,209 @@ class MypyCommand:
         roots = g.findRootsWithPredicate(c, root, predicate=None)
         self.check_all(roots)
     #@-others
+#@+node:tom.20261019021012.1: ** class CheckerPool
+class CheckerPool:
+    """
+    Run checkers on many files concurrently, without blocking Leo.
+
+    Pyflakes checks run in worker processes. Pylint checks run in threads,
+    each waiting for a pylint process. An idle-time handler writes the
+    output for each file to the log as soon as its check completes.
+
+    The pool caches the output for each file in g.app.db, keyed by a hash
+    of the file's contents and of the checker's configuration, so that
+    unchanged files are not rechecked.
+
+    get_checker_pool() returns the singleton CheckerPool.
+    """
+
+    db_key = 'checkerCommands.cache'
+    max_cache_entries = 2000
+
+    def __init__(self):
+        """Ctor for CheckerPool class."""
+        self.batches = []  # g.Bunches describing running checks.
+        self.cache = None  # Keys are (kind, path), values are (key, data).
+        self.cache_changed = False
+        self.executors = {}  # Keys are (processes, workers).
+        if g.app.idleTimeManager:
+            g.app.idleTimeManager.add_callback(self.on_idle)
+
+    #@+others
+    #@+node:tom.20261019021012.2: *3* pool.get & put
+    def get(self, kind, path, key):
+        """Return the cached data for path if its key matches key."""
+        entry = self.get_cache().get((kind, path))
+        if entry and entry[0] == key:
+            return entry[1]
+        return None
+
+    def put(self, kind, path, key, data):
+        """Cache data, the result of checking the file at path."""
+        cache = self.get_cache()
+        cache.pop((kind, path), None)
+        cache[kind, path] = key, data
+        while len(cache) > self.max_cache_entries:
+            del cache[next(iter(cache))]
+        self.cache_changed = True
+    #@+node:tom.20261019021012.3: *3* pool.get_cache & save_cache
+    def get_cache(self):
+        """Return the cache dict, loading it from g.app.db if necessary."""
+        if self.cache is None:
+            try:
+                d = g.app.db.get(self.db_key)
+            except Exception:
+                d = None
+            self.cache = d if isinstance(d, dict) else {}
+        return self.cache
+
+    def save_cache(self):
+        """Save the cache to g.app.db if it has changed."""
+        if self.cache_changed:
+            self.cache_changed = False
+            try:
+                g.app.db[self.db_key] = self.cache
+            except Exception:
+                g.es_exception()
+    #@+node:tom.20261019021012.4: *3* pool.get_executor
+    def get_executor(self, processes, workers):
+        """Return a pool of worker processes or threads, creating it if necessary."""
+        key = processes, workers
+        executor = self.executors.get(key)
+        if not executor:
+            if processes:
+                context = multiprocessing.get_context('spawn')
+                executor = concurrent.futures.ProcessPoolExecutor(
+                    max_workers=workers, mp_context=context)
+            else:
+                executor = concurrent.futures.ThreadPoolExecutor(max_workers=workers)
+            self.executors[key] = executor
+        return executor
+    #@+node:tom.20261019021012.5: *3* pool.kill
+    def kill(self, kind):
+        """
+        Forget all checks of the given kind, cancelling those not yet started
+        and terminating the subprocesses of those that have.
+        """
+        for batch in self.batches:
+            if batch.kind == kind:
+                for task in batch.tasks:
+                    task.future.cancel()
+                if batch.procs:
+                    batch.procs.kill()
+        self.batches = [z for z in self.batches if z.kind != kind]
+    #@+node:tom.20261019021012.6: *3* pool.on_idle
+    def on_idle(self):
+        """Report the results of all completed checks."""
+        for batch in self.batches[:]:
+            for task in [z for z in batch.tasks if z.future.done()]:
+                batch.tasks.remove(task)
+                self.report(batch, task)
+            if not batch.tasks:
+                self.batches.remove(batch)
+                self.save_cache()
+                if batch.finish:
+                    batch.finish(batch)
+    #@+node:tom.20261019021012.7: *3* pool.report
+    def report(self, batch, task):
+        """Cache and report the result of one completed check."""
+        try:
+            data = task.future.result()
+        except Exception as e:
+            batch.n_failed += 1
+            g.es_print(f"{batch.kind}: {g.shortFileName(task.path)}: {e!r}")
+            return
+        self.put(batch.kind, task.path, task.key, data)
+        batch.n_errors += data[0]
+        task.report(data)
+    #@+node:tom.20261019021012.8: *3* pool.start
+    def start(self, kind, tasks, func, processes, workers, finish=None, procs=None):
+        """
+        Start checking files. tasks is a list of g.Bunches with these ivars:
+
+        path:   The file's path.
+        key:    A hash of everything the check depends on.
+        args:   The arguments to func, which returns (number of errors, lines).
+        report: A function that writes (number of errors, lines) to the log.
+
+        Report cached results immediately. Call finish(batch) when all
+        checks are complete.
+
+        procs is a CheckerProcesses instance that func adds its subprocesses
+        to, or None. pool.kill terminates them.
+        """
+        batch = g.Bunch(
+            finish=finish, kind=kind,
+            n_cached=0, n_errors=0, n_failed=0, n_files=len(tasks),
+            procs=procs, t1=time.time(), tasks=[],
+        )
+        for task in tasks:
+            data = self.get(kind, task.path, task.key)
+            if data is None:
+                batch.tasks.append(task)
+            else:
+                batch.n_cached += 1
+                batch.n_errors += data[0]
+                task.report(data)
+        for task in batch.tasks:
+            try:
+                executor = self.get_executor(processes, max(1, workers))
+                task.future = executor.submit(func, *task.args)
+            except Exception:
+                # Fall back to checking the file in Leo's process.
+                task.future = concurrent.futures.Future()
+                try:
+                    task.future.set_result(func(*task.args))
+                except Exception as e:
+                    task.future.set_exception(e)
+        self.batches.append(batch)
+        itm = g.app.idleTimeManager
+        if g.unitTesting or not itm or not itm.timer:
+            # There are no idle-time events: wait for the results.
+            concurrent.futures.wait([z.future for z in batch.tasks])
+        self.on_idle()
+        return batch
+    #@-others
+#@+node:tom.20261019031012.43: ** class CheckerProcesses
+class CheckerProcesses:
+    """
+    The subprocesses running for one batch of checks.
+
+    Worker threads add and remove processes. CheckerPool.kill terminates
+    them, and any process added later.
+    """
+
+    def __init__(self):
+        """Ctor for CheckerProcesses class."""
+        self.killed = False
+        self.lock = threading.Lock()
+        self.procs = set()
+
+    #@+others
+    #@+node:tom.20261019031012.44: *3* procs.add & remove
+    def add(self, proc):
+        """Add proc, a subprocess.Popen, terminating it if the batch has been killed."""
+        with self.lock:
+            if not self.killed:
+                self.procs.add(proc)
+                return
+        proc.terminate()
+
+    def remove(self, proc):
+        with self.lock:
+            self.procs.discard(proc)
+    #@+node:tom.20261019031012.45: *3* procs.kill
+    def kill(self):
+        """Terminate all running processes and any added later."""
+        with self.lock:
+            self.killed = True
+            procs, self.procs = self.procs, set()
+        for proc in procs:
+            try:
+                proc.terminate()
+            except OSError:
+                pass
+    #@-others
 #@+node:ekr.20160516072613.2: ** class PyflakesCommand
 class PyflakesCommand:
     """A class to run pyflakes on all Python @<file> nodes in c.p's tree."""
@@ -395,6 +605,7 @@ class PyflakesCommand:
     #@+node:ekr.20160516072613.6: *3* pyflakes.check_all
     def check_all(self, log_flag, pyflakes_errors_only, roots):
         """Run pyflakes on all files in paths."""
+        pool = get_checker_pool()
         total_errors = 0
         for i, root in enumerate(roots):
             fn = self.finalize(root)
@@ -407,14 +618,65 @@ class PyflakesCommand:
             if s and s.strip():
                 if not pyflakes_errors_only:
                     g.es(f"Pyflakes: {sfn}")
+                key = self.get_key(s)
+                data = pool.get('pyflakes', fn, key)
+                if data is None:
+                    data = pyflakes_check_string(s, sfn)
+                    pool.put('pyflakes', fn, key, data)
                 # Send all output to the log pane.
-                r = reporter.Reporter(
-                    errorStream=self.LogStream(i, roots),
-                    warningStream=self.LogStream(i, roots),
-                )
-                errors = api.check(s, sfn, r)
+                errors, lines = data
+                stream = self.LogStream(i, roots)
+                for line in lines:
+                    stream.write(line)
                 total_errors += errors
+        pool.save_cache()
         return total_errors
+    #@+node:tom.20261019021012.12: *3* pyflakes.check_all_in_background
+    def check_all_in_background(self, pyflakes_errors_only, roots):
+        """
+        Run pyflakes on all files in the checker pool.
+
+        Write each file's warnings to the log as soon as they are known.
+        """
+        c = self.c
+        tasks = []
+        for i, root in enumerate(roots):
+            fn = self.finalize(root)
+            sfn = g.shortFileName(fn)
+            # #1306: nopyflakes
+            if any(z.strip().startswith('@nopyflakes') for z in g.splitLines(root.b)):
+                continue
+            s = g.readFileIntoEncodedString(fn)
+            if not s or not s.strip():
+                continue
+
+            def report(data, i=i, sfn=sfn):
+                if not pyflakes_errors_only:
+                    g.es(f"Pyflakes: {sfn}")
+                # Send all output to the log pane.
+                stream = self.LogStream(i, roots)
+                for line in data[1]:
+                    stream.write(line)
+
+            tasks.append(g.Bunch(args=(s, sfn), key=self.get_key(s), path=fn, report=report))
+
+        def finish(batch):
+            if batch.n_errors > 0:
+                g.es(f"ERROR: pyflakes: {batch.n_errors} error{g.plural(batch.n_errors)}")
+            elif not batch.n_failed:
+                g.es(
+                    f"OK: pyflakes: "
+                    f"{batch.n_files} file{g.plural(batch.n_files)} "
+                    f"({batch.n_cached} cached) "
+                    f"in {g.timeSince(batch.t1)}")
+
+        workers = c.config.getInt('checker-workers') or os.cpu_count() or 1
+        get_checker_pool().start('pyflakes', tasks,
+            finish=finish,
+            func=pyflakes_check_string,
+            processes=True,
+            workers=workers,
+        )
     #@+node:ekr.20171228013625.1: *3* pyflakes.check_script
     def check_script(self, p, script):
         """Call pyflakes to check the given script."""
@@ -439,9 +701,19 @@ class PyflakesCommand:
         c = self.c
         # Use os.path.normpath to give system separators.
         return os.path.normpath(g.fullPath(c, p))  # #1914.
+    #@+node:tom.20261019021012.13: *3* pyflakes.get_key
+    def get_key(self, s):
+        """Return the key of the cached pyflakes output for s, the contents of a file."""
+        version = getattr(pyflakes, '__version__', '').encode('utf-8')
+        return hashlib.sha1(version + b'\0' + s).hexdigest()
     #@+node:ekr.20160516072613.5: *3* pyflakes.run
-    def run(self, p=None, force=False, pyflakes_errors_only=False):
-        """Run Pyflakes on all Python @<file> nodes in c.p's tree."""
+    def run(self, p=None, force=False, pyflakes_errors_only=False, background=False):
+        """
+        Run Pyflakes on all Python @<file> nodes in c.p's tree.
+
+        background: check the files in the checker pool, without waiting
+                    for the results. Return True.
+        """
         if not pyflakes:
             return True  # Pretend all is fine.
         c = self.c
@@ -452,7 +724,10 @@ class PyflakesCommand:
             sys.path.append(leo_path)
         t1 = time.time()
         roots = g.findRootsWithPredicate(c, root, predicate=None)
-        if roots:
+        if roots and background:
+            self.check_all_in_background(pyflakes_errors_only, roots)
+            ok = True
+        elif roots:
             # These messages are important for clarity.
             log_flag = not force
             total_errors = self.check_all(log_flag, pyflakes_errors_only, roots)
@@ -521,8 +796,7 @@ class PylintCommand:
         if not data:
             g.es('pylint: no files found', color='red')
             return None
-        for fn, p in data:
-            self.run_pylint(fn, p)
+        self.check_all(data)
         # #1808: return the last data file.
         return data[-1] if data else False
     #@+node:ekr.20150514125218.10: *3* 3. pylint.get_rc_file
@@ -554,10 +828,52 @@ class PylintCommand:
             g.trace(f"not an @<file> node: {p.h!r}")
             return None
         return g.fullPath(c, p)  # #1914
-    #@+node:ekr.20150514125218.12: *3* 5. pylint.run_pylint
-    def run_pylint(self, fn, p):
-        """Run pylint on fn with the given pylint configuration file."""
-        c, rc_fn = self.c, self.rc_fn
+    #@+node:ekr.20150514125218.12: *3* 5. pylint.check_all & helpers
+    def check_all(self, data):
+        """
+        Run pylint on all files in data, a list of (fn, p), in the checker pool.
+
+        Write each file's messages to the log as soon as they are known.
+        """
+        c = self.c
+        with open(self.rc_fn, 'rb') as f:
+            rc_hash = hashlib.sha1(f.read()).hexdigest()
+        procs = CheckerProcesses()
+        tasks = []
+        for fn, p in data:
+            try:
+                with open(fn, 'rb') as f:
+                    key = hashlib.sha1(rc_hash.encode('utf-8') + b'\0' + f.read()).hexdigest()
+            except OSError:
+                g.es_print(f"pylint: can not read {fn}")
+                continue
+
+            def report(data, fn=fn, p=p):
+                self.put_lines(fn, p, data[1])
+
+            tasks.append(g.Bunch(
+                args=(self.get_command(fn), self.link_pattern, procs),
+                key=key, path=fn, report=report))
+
+        def finish(batch):
+            g.es_print(
+                f"pylint finished: {batch.n_files} file{g.plural(batch.n_files)} "
+                f"({batch.n_cached} cached), "
+                f"{batch.n_errors} message{g.plural(batch.n_errors)} "
+                f"in {g.timeSince(batch.t1)}")
+
+        workers = c.config.getInt('checker-workers') or os.cpu_count() or 1
+        get_checker_pool().start('pylint', tasks,
+            finish=finish,
+            func=run_pylint_command,
+            processes=False,  # Each thread waits for a pylint process.
+            procs=procs,
+            workers=workers,
+        )
+    #@+node:tom.20261019021012.14: *4* pylint.get_command
+    def get_command(self, fn):
+        """Return the command that runs pylint on fn."""
+        rc_fn = self.rc_fn
         #
         # Invoke pylint directly.
         is_win = sys.platform.startswith('win')
@@ -568,16 +884,72 @@ class PylintCommand:
             f'{sys.executable} -c "from pylint import lint; args=[{args}]; lint.Run(args)"')
         if not is_win:
             command = shlex.split(command)  # type:ignore
-        #
-        # Run the command using the BPM.
-        bpm = g.app.backgroundProcessManager
-        bpm.start_process(c, command,
-            fn=fn,
-            kind='pylint',
-            link_pattern=self.link_pattern,
-            link_root=p,
-        )
+        return command
+    #@+node:tom.20261019021012.15: *4* pylint.put_lines
+    def put_lines(self, fn, p, lines):
+        """Write pylint's output for fn to the log, with clickable links to p."""
+        link_pattern = re.compile(self.link_pattern)
+        g.es_print(f"pylint: {g.shortFileName(fn)}")
+        for s in lines:
+            s = s.rstrip()
+            if not s:
+                continue
+            # Always print the message.
+            print(s)
+            m = link_pattern.match(s)
+            if m:
+                # m.group(1) is the line number.
+                unl = p.get_UNL(with_proto=True, with_count=True)
+                g.es(s, nodeLink=f"{unl},{-int(m.group(1))}")
+            else:
+                g.es(s)
     #@-others
+#@+node:tom.20261019021012.9: ** function: get_checker_pool
+checker_pool = None
+
+def get_checker_pool():
+    """Return the singleton CheckerPool, creating it if necessary."""
+    global checker_pool
+    if not checker_pool:
+        checker_pool = CheckerPool()
+    return checker_pool
+#@+node:tom.20261019021012.10: ** function: pyflakes_check_string
+def pyflakes_check_string(s, sfn):
+    """
+    Check s, the contents of the file sfn, with pyflakes.
+
+    Return (number of warnings, list of output lines).
+    This function may run in a worker process.
+    """
+    stream = io.StringIO()
+    r = reporter.Reporter(errorStream=stream, warningStream=stream)
+    errors = api.check(s, sfn, r)
+    return errors, stream.getvalue().splitlines()
+#@+node:tom.20261019021012.11: ** function: run_pylint_command
+def run_pylint_command(command, link_pattern, procs=None):
+    """
+    Run the pylint command and wait for it to finish.
+
+    Return (number of messages, list of output lines).
+    This function runs in a worker thread. procs is a CheckerProcesses
+    instance or None.
+    """
+    proc = subprocess.Popen(
+        command,
+        stderr=subprocess.STDOUT,
+        stdout=subprocess.PIPE,
+        universal_newlines=True,
+    )
+    if procs:
+        procs.add(proc)
+    try:
+        out, junk = proc.communicate()
+    finally:
+        if procs:
+            procs.remove(proc)
+    lines = out.splitlines()
+    pattern = re.compile(link_pattern)
+    return len([z for z in lines if pattern.match(z)]), lines
 #@-others
 #@@language python
 #@@tabwidth -4
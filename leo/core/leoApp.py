@@ -5,9 +5,11 @@
 #@+<< imports >>
 #@+node:ekr.20120219194520.10463: ** << imports >> (leoApp)
 import argparse
+import hashlib
 import importlib
 import io
 import os
+import re
 import sqlite3
 import subprocess
 import string
@@ -177,6 +179,9 @@ class LeoApp:
             # The singleton db, managed by g.app.commander_cacher.
         self.config = None
             # The singleton leoConfig instance.
+        self.content_hasher = None
+            # The singleton leoCache.ContentHashCacher instance.
+            # Use leoCache.get_content_hasher to access it.
         self.db = None
             # The singleton global db, managed by g.app.global_cacher.
         self.externalFilesController = None
@@ -1238,12 +1243,15 @@ class LeoApp:
             return False
         g.app.recentFilesManager.writeRecentFilesFile(c)
             # Make sure .leoRecentFiles.txt is written.
+        # A completed background save clears c.changed.
+        c.fileCommands.finishBackgroundSaves()
         if c.changed:
             c.promptingForClose = True
             veto = frame.promptForSave()
             c.promptingForClose = False
             if veto:
                 return False
+        c.fileCommands.finishBackgroundSaves()  # The prompt may have saved c.
         g.app.setLog(None)  # no log until we reactive a window.
         g.doHook("close-frame", c=c)
         #
@@ -1596,6 +1604,12 @@ class LoadManager:
         self.theme_c = None
             # #1374.
         self.theme_path = None
+        #
+        # Settings snapshots.
+        self.settings_snapshot_hit = False
+            # True if readGlobalSettingsFiles loaded the global settings from g.app.db.
+        self.settings_snapshot_version = 2
+            # Increment this to invalidate all existing snapshots.
     #@+node:ekr.20120211121736.10812: *3* LM.Directory & file utils
     #@+node:ekr.20120219154958.10481: *4* LM.completeFileName
     def completeFileName(self, fileName):
@@ -2155,12 +2169,16 @@ class LoadManager:
         c.openDirectory = frame.openDirectory = g.os_path_dirname(fn)
         g.app.gui = oldGui
         return c if ok else None
-    #@+node:ekr.20120213081706.10382: *4* LM.readGlobalSettingsFiles
-    def readGlobalSettingsFiles(self):
+    #@+node:ekr.20120213081706.10382: *4* LM.readGlobalSettingsFiles & helpers
+    def readGlobalSettingsFiles(self, use_snapshot=True):
         """
         Read leoSettings.leo and myLeoSettings.leo using a null gui.
 
         New in Leo 6.1: this sets ivars for the ActiveSettingsOutline class.
+
+        If use_snapshot is True, load the merged settings from a snapshot in
+        g.app.db when none of the settings files have changed. In that case
+        lm.leo_settings_c and lm.my_settings_c are None.
         """
         trace = 'themes' in g.app.debug
         lm = self
@@ -2169,29 +2187,47 @@ class LoadManager:
         old_commanders = g.app.commanders()
         lm.leo_settings_path = lm.computeLeoSettingsPath()
         lm.my_settings_path = lm.computeMyLeoSettingsPath()
-        lm.leo_settings_c = lm.openSettingsFile(self.leo_settings_path)
-        lm.my_settings_c = lm.openSettingsFile(self.my_settings_path)
-        commanders = [lm.leo_settings_c, lm.my_settings_c]
-        commanders = [z for z in commanders if z]
-        settings_d, bindings_d = lm.createDefaultSettingsDicts()
-        for c in commanders:
-            # Merge the settings dicts from c's outline into
-            # *new copies of* settings_d and bindings_d.
-            settings_d, bindings_d = lm.computeLocalSettings(
-                c, settings_d, bindings_d, localFlag=False)
-        # Adjust the name.
-        bindings_d.setName('lm.globalBindingsDict')
+        key = lm.computeSettingsSnapshotKey(
+            [lm.leo_settings_path, lm.my_settings_path]) if use_snapshot else None
+        snapshot = lm.getSettingsSnapshot('global', key)
+        lm.settings_snapshot_hit = bool(snapshot)
+        if snapshot:
+            lm.leo_settings_c = lm.my_settings_c = None
+            commanders = []
+            settings_d, bindings_d = snapshot
+        else:
+            lm.leo_settings_c = lm.openSettingsFile(self.leo_settings_path)
+            lm.my_settings_c = lm.openSettingsFile(self.my_settings_path)
+            commanders = [lm.leo_settings_c, lm.my_settings_c]
+            commanders = [z for z in commanders if z]
+            settings_d, bindings_d = lm.createDefaultSettingsDicts()
+            for c in commanders:
+                # Merge the settings dicts from c's outline into
+                # *new copies of* settings_d and bindings_d.
+                settings_d, bindings_d = lm.computeLocalSettings(
+                    c, settings_d, bindings_d, localFlag=False)
+            # Adjust the name.
+            bindings_d.setName('lm.globalBindingsDict')
+            lm.putSettingsSnapshot('global', key, (settings_d, bindings_d))
         lm.globalSettingsDict = settings_d
         lm.globalBindingsDict = bindings_d
         # Add settings from --theme or @string theme-name files.
         # This must be done *after* reading myLeoSettigns.leo.
         lm.theme_path = lm.computeThemeFilePath()
         if lm.theme_path:
-            lm.theme_c = lm.openSettingsFile(lm.theme_path)
-            if lm.theme_c:
-                # Merge theme_c's settings into globalSettingsDict.
-                settings_d, junk_shortcuts_d = lm.computeLocalSettings(
-                    lm.theme_c, settings_d, bindings_d, localFlag=False)
+            theme_key = key and lm.computeSettingsSnapshotKey([lm.theme_path], base=key)
+            snapshot = lm.getSettingsSnapshot('theme', theme_key)
+            if snapshot:
+                lm.theme_c = None
+                settings_d = snapshot
+            else:
+                lm.theme_c = lm.openSettingsFile(lm.theme_path)
+                if lm.theme_c:
+                    # Merge theme_c's settings into globalSettingsDict.
+                    settings_d, junk_shortcuts_d = lm.computeLocalSettings(
+                        lm.theme_c, settings_d, bindings_d, localFlag=False)
+                    lm.putSettingsSnapshot('theme', theme_key, settings_d)
+            if snapshot or lm.theme_c:
                 lm.globalSettingsDict = settings_d
                 # Set global vars
                 g.app.theme_directory = g.os_path_dirname(lm.theme_path)
@@ -2203,6 +2239,86 @@ class LoadManager:
         for c in commanders:
             if c not in old_commanders:
                 g.app.forgetOpenFile(c.fileName())
+    #@+node:tom.20261019011012.1: *5* LM.computeSettingsSnapshotKey
+    def computeSettingsSnapshotKey(self, paths, base=None):
+        """
+        Return a key describing everything that parsing the given settings
+        files depends on, or None if settings snapshots can not be used.
+        """
+        if isinstance(g.app.db, g.NullObject):
+            return None
+        if g.app.trace_binding or g.app.trace_setting:
+            return None  # The traces happen only while parsing.
+        from leo.core import leoConfig
+        from leo.core import leoVersion
+        key = list(base or (
+            self.settings_snapshot_version,
+            leoVersion.version,
+            # Sources of the defaults and of the parser.
+            [os.path.getmtime(z) for z in (__file__, leoConfig.__file__)],
+            # Used by @ifplatform and @ifhostname.
+            sys.platform,
+            self.computeMachineName(),
+        ))
+        for path in paths:
+            if not path or not os.path.exists(path):
+                key.append((path, None, []))
+                continue
+            with open(path, 'rb') as f:
+                s = f.read()
+            # Used by @ifenv.
+            names = sorted(set(re.findall(rb'@ifenv\s+([^,<\s]+)', s)))
+            env = [(g.toUnicode(z), os.getenv(g.toUnicode(z))) for z in names]
+            key.append((path, hashlib.sha1(s).hexdigest(), env))
+        return tuple(key)
+    #@+node:tom.20261019011012.2: *5* LM.getSettingsSnapshot
+    def getSettingsSnapshot(self, kind, key):
+        """
+        Return the data saved by putSettingsSnapshot if its key matches key.
+
+        Restore the ivars of g.app.config set while parsing the settings files.
+        """
+        if key is None:
+            return None
+        try:
+            d = g.app.db.get(f"lm.settings-snapshot.{kind}")
+        except Exception:
+            return None
+        if not d or d.get('key') != key:
+            return None
+        for ivar, val in d.get('config').items():
+            setattr(g.app.config, ivar, val)
+        if 'cache' in g.app.debug:
+            g.trace('loaded', kind, 'settings from g.app.db')
+        return d.get('data')
+    #@+node:tom.20261019011012.3: *5* LM.putSettingsSnapshot
+    def putSettingsSnapshot(self, kind, key, data):
+        """
+        Save data, the result of parsing settings files, in g.app.db.
+
+        Do nothing if the parsers created @button or @command nodes:
+        those refer to positions in the settings commanders.
+        """
+        config = g.app.config
+        if key is None or config.atCommonButtonsList or config.atCommonCommandsList:
+            return
+        # The ivars of g.app.config that the parsers set.
+        # The parsers put @openwith data into the settings dicts.
+        ivars = (
+            'buttonsFileName', 'context_menus',
+            'enabledPluginsFileName', 'enabledPluginsString',
+            'menusFileName', 'menusList',
+            'modeCommandsDict',  # Set by @mode nodes.
+        )
+        d = {
+            'config': {z: getattr(config, z) for z in ivars if hasattr(config, z)},
+            'data': data,
+            'key': key,
+        }
+        try:
+            g.app.db[f"lm.settings-snapshot.{kind}"] = d
+        except Exception:
+            g.es_exception()
     #@+node:ekr.20120214165710.10838: *4* LM.traceSettingsDict
     def traceSettingsDict(self, d, verbose=False):
         if verbose:
@@ -2275,7 +2391,8 @@ class LoadManager:
         if 'startup' in g.app.debug:
             t4 = time.process_time()
             print('')
-            g.es_print(f"settings:{t2 - t1:5.2f} sec")
+            snapshot = ' (snapshot)' if lm.settings_snapshot_hit else ''
+            g.es_print(f"settings:{t2 - t1:5.2f} sec{snapshot}")
             g.es_print(f" plugins:{t3 - t2:5.2f} sec")
             g.es_print(f"   files:{t4 - t3:5.2f} sec")
             g.es_print(f"   total:{t4 - t1:5.2f} sec")
@@ -152,13 +152,19 @@ Leo's outline structure. These comments have the form::
 import argparse
 import ast
 import codecs
+import concurrent.futures
 import difflib
 import glob
+import hashlib
 import io
+import json
+import multiprocessing
 import os
 import re
 import sys
 import textwrap
+import time
+import token as token_module
 import tokenize
 import traceback
 from typing import List, Optional
@@ -324,6 +330,17 @@ class LeoGlobals:  # pragma: no cover
         return s2 + '\n' if s.endswith('\n') else s2
     #@-others
 #@+node:ekr.20200702114522.1: **  leoAst.py: top-level commands
+#@+node:tom.20261019011012.5: *3* command: batch_command
+def batch_command(kind, files, cache_path=None, jobs=None):
+    """
+    Entry point for --batch.
+
+    Run the orange, orange-diff, fstringify or fstringify-diff command on
+    all files, using worker processes and a cache of unchanged files.
+    """
+    if cache_path is None:  # pragma: no cover
+        cache_path = BatchRunner.default_cache_path()
+    BatchRunner(kind, cache_path=cache_path, jobs=jobs).run(files)
 #@+node:ekr.20200702114557.1: *3* command: fstringify_command
 def fstringify_command(files):
     """
@@ -385,10 +402,31 @@ if 1:  # pragma: no cover
         add('--fstringify-diff', dest='fd', action='store_true', help='show fstringify diff')
         add('--orange', dest='o', action='store_true', help='leonine Black')
         add('--orange-diff', dest='od', action='store_true', help='show orange diff')
+        add = parser.add_argument
+        add('--batch', dest='batch', action='store_true',
+            help='use worker processes and skip files known to be unchanged')
+        add('--cache', dest='cache', metavar='PATH', help='--batch: the cache file')
+        add('--jobs', dest='jobs', metavar='N', type=int, help='--batch: number of processes')
+        add('--recursive', dest='recursive', action='store_true',
+            help='include .py files in subdirectories')
         args = parser.parse_args()
         files = args.PATHS
         if len(files) == 1 and os.path.isdir(files[0]):
-            files = glob.glob(f"{files[0]}{os.sep}*.py")
+            if args.recursive:
+                files = glob.glob(f"{files[0]}{os.sep}**{os.sep}*.py", recursive=True)
+            else:
+                files = glob.glob(f"{files[0]}{os.sep}*.py")
+        if args.batch:
+            table = (
+                (args.f, 'fstringify'),
+                (args.fd, 'fstringify-diff'),
+                (args.o, 'orange'),
+                (args.od, 'orange-diff'),
+            )
+            for flag, kind in table:
+                if flag:
+                    batch_command(kind, files, cache_path=args.cache, jobs=args.jobs)
+            return
         if args.f:
             fstringify_command(files)
         if args.fd:
@@ -397,6 +435,42 @@ if 1:  # pragma: no cover
             orange_command(files)
         if args.od:
             orange_diff_command(files)
+    #@+node:tom.20261019011012.13: *3* function: batch_files_worker
+    def batch_files_worker(kind, settings, files):
+        """
+        Run the given command (see BatchRunner.kinds) on the files, without
+        writing them. This function runs in worker processes.
+
+        Return a list of tuples (filename, content_hash, contents, results,
+        encoding, error). contents and results are None if the command would
+        not change the file.
+        """
+        aList = []
+        for filename in files:
+            content_hash = contents = results = encoding = error = None
+            try:
+                with open(filename, 'rb') as f:
+                    bb = f.read()
+                content_hash = hashlib.sha1(bb).hexdigest()
+                encoding, bb = strip_BOM(bb)
+                if not encoding:
+                    encoding = get_encoding_directive(bb)
+                contents = regularize_nls(g.toUnicode(bb, encoding=encoding))
+                if contents:
+                    tog = TokenOrderGenerator()
+                    tokens, tree = tog.init_from_string(contents, filename)
+                    if kind.startswith('orange'):
+                        results = Orange(settings).beautify(contents, filename, tokens, tree)
+                    else:
+                        results = Fstringify().fstringify(contents, filename, tokens, tree)
+                # Something besides newlines must change.
+                if not contents or regularize_nls(contents) == regularize_nls(results):
+                    contents = results = None
+            except Exception as e:
+                contents = results = None
+                error = f"{e.__class__.__name__}: {e}" if str(e) else e.__class__.__name__
+            aList.append((filename, content_hash, contents, results, encoding, error))
+        return aList
     #@+node:ekr.20200107114409.1: *3* functions: reading & writing files
     #@+node:ekr.20200218071822.1: *4* function: regularize_nls
     def regularize_nls(s):
@@ -753,17 +827,6 @@ if 1:  # pragma: no cover
         Perform consistency checks and handle all exeptions.
         """
 
-        def check(contents, tokens):
-            result = tokens_to_string(tokens)
-            ok = result == contents
-            if not ok:
-                print('\nRound-trip check FAILS')
-                print('Contents...\n')
-                g.printObj(contents)
-                print('\nResult...\n')
-                g.printObj(result)
-            return ok
-
         try:
             five_tuples = tokenize.tokenize(
                 io.BytesIO(contents.encode('utf-8')).readline)
@@ -771,9 +834,8 @@ if 1:  # pragma: no cover
             print('make_tokens: exception in tokenize.tokenize')
             g.es_exception()
             return None
-        tokens = Tokenizer().create_input_tokens(contents, five_tuples)
-        assert check(contents, tokens)
-        return tokens
+        # create_input_tokens checks the round trip.
+        return Tokenizer().create_input_tokens(contents, five_tuples)
     #@+node:ekr.20191027075648.1: *4* function: parse_ast
     def parse_ast(s):
         """
@@ -891,16 +953,20 @@ if 1:  # pragma: no cover
         Return True if node is an instance of a node that might be split into
         shorter lines.
         """
-        return isinstance(node, (
-            ast.Assign, ast.AnnAssign, ast.AsyncFor, ast.AsyncWith, ast.AugAssign,
-            ast.Call, ast.Delete, ast.ExceptHandler, ast.For, ast.Global,
-            ast.If, ast.Import, ast.ImportFrom,
-            ast.Nonlocal, ast.Return, ast.While, ast.With, ast.Yield, ast.YieldFrom))
+        return isinstance(node, _long_statement_classes)
+
+    _long_statement_classes = (
+        ast.Assign, ast.AnnAssign, ast.AsyncFor, ast.AsyncWith, ast.AugAssign,
+        ast.Call, ast.Delete, ast.ExceptHandler, ast.For, ast.Global,
+        ast.If, ast.Import, ast.ImportFrom,
+        ast.Nonlocal, ast.Return, ast.While, ast.With, ast.Yield, ast.YieldFrom)
     #@+node:ekr.20200120110005.1: *4* function: is_statement_node
     def is_statement_node(node):
         """Return True if node is a top-level statement."""
-        return is_long_statement(node) or isinstance(node, (
-            ast.Break, ast.Continue, ast.Pass, ast.Try))
+        return isinstance(node, _statement_classes)
+
+    _statement_classes = _long_statement_classes + (
+        ast.Break, ast.Continue, ast.Pass, ast.Try)
     #@+node:ekr.20191231082137.1: *4* function: nearest_common_ancestor
     def nearest_common_ancestor(node1, node2):
         """
@@ -1175,6 +1241,169 @@ class AstDumper:  # pragma: no cover
                 if a not in ['ctx',] and b not in (None, [])
         )
     #@-others
+#@+node:tom.20261019011012.6: ** class BatchRunner
+class BatchRunner:
+    """
+    Run the orange, orange-diff, fstringify or fstringify-diff command on
+    many files, using a pool of worker processes.
+
+    The cache file remembers the content hashes of files that the command
+    left unchanged, so later runs skip those files until they change.
+    """
+
+    kinds = ('fstringify', 'fstringify-diff', 'orange', 'orange-diff')
+    max_cache_entries = 100000  # Per command and settings.
+    min_parallel_files = 8  # Fewer files aren't worth starting processes.
+
+    #@+others
+    #@+node:tom.20261019011012.7: *3* batch.ctor
+    def __init__(self, kind, cache_path=None, jobs=None, settings=None):
+        """Ctor for BatchRunner class."""
+        if kind not in self.kinds:
+            raise ValueError(f"BatchRunner: unknown command: {kind!r}")
+        self.kind = kind
+        self.cache_path = cache_path
+        self.jobs = (os.cpu_count() or 1) if jobs is None else jobs
+        self.settings = settings or {}  # Settings for the Orange class.
+        # Statistics...
+        self.n_cached = 0
+        self.n_changed = 0
+        self.n_checked = 0
+        self.n_errors = 0
+    #@+node:tom.20261019011012.8: *3* batch.cache_key
+    def cache_key(self):
+        """
+        Return the key of this command's entry in the cache.
+
+        The key depends on the command, its settings and this file.
+        """
+        kind = self.kind.replace('-diff', '')
+        settings = []
+        if kind == 'orange':
+            orange = Orange(self.settings)
+            settings = [(z, getattr(orange, z, None)) for z in Orange.valid_keys]
+        with open(__file__, 'rb') as f:
+            code_hash = hashlib.sha1(f.read()).hexdigest()
+        data = repr((kind, settings, code_hash)).encode('utf-8')
+        return f"{kind}:{hashlib.sha1(data).hexdigest()}"
+    #@+node:tom.20261019011012.9: *3* batch.default_cache_path
+    @staticmethod
+    def default_cache_path():  # pragma: no cover
+        """Return the path to the cache file used by the --batch option."""
+        return os.path.join(os.path.expanduser('~'), '.leo', 'leoAst-cache.json')
+    #@+node:tom.20261019011012.10: *3* batch.load_cache & save_cache
+    def load_cache(self):
+        """Return the contents of the cache file, or {}."""
+        path = self.cache_path
+        if not path or not os.path.exists(path):
+            return {}
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                d = json.load(f)
+            return d if isinstance(d, dict) else {}
+        except Exception:  # pragma: no cover
+            print(f"batch: ignoring bad cache file: {path}")
+            return {}
+
+    def save_cache(self, d):
+        """Replace the cache file by the json representation of d."""
+        path = self.cache_path
+        if not path:
+            return
+        tmp_path = path + '.tmp'
+        try:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(d, f)
+            os.replace(tmp_path, path)
+        except Exception as e:  # pragma: no cover
+            print(f"batch: can not write {path}\n{e}")
+    #@+node:tom.20261019011012.11: *3* batch.process_files
+    def process_files(self, files):
+        """
+        Run the command on all files, in worker processes when possible.
+
+        Return the list of results from batch_files_worker.
+        """
+        n = min(self.jobs, len(files))
+        if n < 2 or len(files) < self.min_parallel_files:
+            return batch_files_worker(self.kind, self.settings, files)
+        # Several chunks per worker balance the load.
+        size = max(1, len(files) // (4 * n) + 1)
+        chunks = [files[i : i + size] for i in range(0, len(files), size)]
+        results, done = [], set()
+        try:
+            context = multiprocessing.get_context('spawn')
+            with concurrent.futures.ProcessPoolExecutor(
+                max_workers=n, mp_context=context,
+            ) as executor:
+                futures = [
+                    executor.submit(batch_files_worker, self.kind, self.settings, chunk)
+                        for chunk in chunks]
+                for i, future in enumerate(futures):
+                    try:
+                        results.extend(future.result())
+                        done.add(i)
+                    except Exception:  # pragma: no cover
+                        g.es_exception()
+        except Exception:  # pragma: no cover
+            g.es_exception()
+        # Fall back to this process for any failed chunks.
+        for i, chunk in enumerate(chunks):
+            if i not in done:  # pragma: no cover
+                results.extend(batch_files_worker(self.kind, self.settings, chunk))
+        return results
+    #@+node:tom.20261019011012.12: *3* batch.run
+    def run(self, files):
+        """
+        Run the command on all files that exist.
+
+        Print and return a summary line.
+        """
+        t1 = time.perf_counter()
+        cache = self.load_cache()
+        key = self.cache_key()
+        unchanged = cache.get(key, [])
+        unchanged_set = set(unchanged)
+        todo = []
+        for filename in files:
+            if not os.path.exists(filename):
+                print(f"file not found: {filename}")
+                continue
+            self.n_checked += 1
+            with open(filename, 'rb') as f:
+                if hashlib.sha1(f.read()).hexdigest() in unchanged_set:
+                    self.n_cached += 1
+                else:
+                    todo.append(filename)
+        new_unchanged = []
+        for filename, content_hash, contents, results, encoding, error in self.process_files(todo):
+            if error:
+                self.n_errors += 1
+                print(f"{self.kind}: {error}: {filename}")
+            elif results is None:
+                new_unchanged.append(content_hash)
+            elif self.kind.endswith('-diff'):
+                self.n_changed += 1
+                show_diffs(contents, results, filename=filename)
+            else:
+                self.n_changed += 1
+                print(f"{self.kind}: Wrote {filename}")
+                write_file(filename, results, encoding=encoding)
+        if new_unchanged:
+            unchanged.extend(z for z in new_unchanged if z not in unchanged_set)
+            cache[key] = unchanged[-self.max_cache_entries :]
+            self.save_cache(cache)
+        t2 = time.perf_counter()
+        summary = (
+            f"{self.kind}: {self.n_checked} file{g.plural(self.n_checked)} checked, "
+            f"{self.n_changed} changed, {self.n_cached} cached, "
+            f"{self.n_errors} error{g.plural(self.n_errors)} in {t2 - t1:.2f} sec")
+        print(summary)
+        return summary
+    #@-others
 #@+node:ekr.20191227170628.1: ** TOG classes...
 #@+node:ekr.20191113063144.1: *3*  class TokenOrderGenerator
 class TokenOrderGenerator:
@@ -1419,6 +1648,8 @@ class TokenOrderGenerator:
         self.px = px
     #@+node:ekr.20191125120814.1: *6* tog.set_links
     last_statement_node = None
+    statement_cache = None
+    statement_cache_node = None
 
     def set_links(self, node, token):
         """Make two-way links between token and the given node."""
@@ -1433,7 +1664,11 @@ class TokenOrderGenerator:
         if token.kind == 'op' and token.value in ',()':
             return
         # *Always* remember the last statement.
-        statement = find_statement_node(node)
+        # sync_token links runs of tokens to the same node: cache the lookup.
+        if node is not self.statement_cache_node:
+            self.statement_cache_node = node
+            self.statement_cache = find_statement_node(node)
+        statement = self.statement_cache
         if statement:
             self.last_statement_node = statement  # type:ignore
             assert not isinstance(self.last_statement_node, ast.Module)
@@ -2598,19 +2833,22 @@ class Orange:
 
     # Doc parts end with @c or a node sentinel. Specialized for python.
     end_doc_pat = re.compile(r"^\s*#@(@(c(ode)?)|([+]node\b.*))$")
+
+    # The keys of the settings dict.
+    valid_keys = (
+        'allow_joined_strings',
+        'max_join_line_length',
+        'max_split_line_length',
+        'orange',
+        'tab_width',
+    )
     #@+others
     #@+node:ekr.20200107165250.2: *4* orange.ctor
     def __init__(self, settings=None):
         """Ctor for Orange class."""
         if settings is None:
             settings = {}
-        valid_keys = (
-            'allow_joined_strings',
-            'max_join_line_length',
-            'max_split_line_length',
-            'orange',
-            'tab_width',
-        )
+        valid_keys = self.valid_keys
         # For mypy...
         self.kind: str = ''
         # Default settings...
@@ -3272,7 +3510,7 @@ class Orange:
         # Calculate the tail before cleaning the prefix.
         tail = line_tokens[len(prefix) :]
         # Cut back the token list: subtract 1 for the trailing line-end.
-        self.code_list = self.code_list[: len(self.code_list) - len(line_tokens) - 1]
+        del self.code_list[len(self.code_list) - len(line_tokens) - 1 :]
         # Append the tail, splitting it further, as needed.
         self.append_tail(prefix, tail)
         # Add the line-end token deleted by find_line_prefix.
@@ -3337,12 +3575,12 @@ class Orange:
     #@+node:ekr.20200107165250.36: *6* orange.find_prev_line
     def find_prev_line(self):
         """Return the previous line, as a list of tokens."""
-        line = []
-        for t in reversed(self.code_list[:-1]):
-            if t.kind in ('hard-newline', 'line-end'):
-                break
-            line.append(t)
-        return list(reversed(line))
+        # Don't copy self.code_list: that would take quadratic time.
+        code_list = self.code_list
+        i = len(code_list) - 1
+        while i > 0 and code_list[i - 1].kind not in ('hard-newline', 'line-end'):
+            i -= 1
+        return code_list[i : len(code_list) - 1]
     #@+node:ekr.20200107165250.37: *6* orange.find_line_prefix
     def find_line_prefix(self, token_list):
         """
@@ -3419,7 +3657,7 @@ class Orange:
         if len(tail_s) > self.max_join_line_length:  # pragma: no cover (defensive)
             return
         # Cut back the code list.
-        self.code_list = self.code_list[:i]
+        del self.code_list[i:]
         # Add the new output tokens.
         self.add_token('string', tail_s)
         self.add_token('line-end', '\n')
@@ -4114,7 +4352,6 @@ class Tokenizer:
         - Untokenize does not round-trip ws before bs-nl
           https://bugs.python.org/issue38663
         """
-        import token as token_module
         # Unpack..
         tok_type, val, start, end, line = five_tuple
         s_row, s_col = start  # row/col offsets of start of token.
@@ -5,7 +5,10 @@
 """Classes to read and write @file nodes."""
 #@+<< imports >>
 #@+node:ekr.20041005105605.2: ** << imports >> (leoAtFile.py)
+import concurrent.futures
+import hashlib
 import io
+import multiprocessing
 import os
 import re
 import sys
@@ -14,6 +17,7 @@ import time
 import tokenize
 from typing import List
 from leo.core import leoGlobals as g
+from leo.core import leoCache
 from leo.core import leoNodes
 #@-<< imports >>
 #@+others
@@ -56,6 +60,9 @@ class AtFile:
         self.section_delim2 = '>>'
         # **Only** at.writeAll manages these flags.
         self.unchangedFiles = 0
+        self.skippedFiles = 0
+        self.writtenFiles = 0
+        self.replacedFileName = None  # Set by at.replaceFile.
         # promptForDangerousWrite sets cancelFlag and yesToAll only if canCancelFlag is True.
         self.canCancelFlag = False
         self.cancelFlag = False
@@ -64,6 +71,17 @@ class AtFile:
         self.checkPythonCodeOnWrite = False
         self.runPyFlakesOnWrite = False
         self.underindentEscapeString = '\\-'
+        self.atFileReadWorkers = 0
+        self.useAtFileCache = False
+        self.skipUnchangedWrites = False
+        # Keys are full paths, values are tuples (fingerprint, stamp).
+        # Set by at.writeAllHelper.
+        self.writeFingerprints = {}
+        # The cache of @file trees, created in at.getAtFileCacher.
+        self.atFileCacher = None
+        # Keys are full paths, values are tuples (content_hash, tree).
+        # Set by at.scanFilesInWorkers.
+        self.scannedFiles = {}
         self.reloadSettings()
     #@+node:ekr.20171113152939.1: *5* at.reloadSettings
     def reloadSettings(self):
@@ -75,6 +93,15 @@ class AtFile:
             'run-pyflakes-on-write', default=False)
         self.underindentEscapeString = c.config.getString(
             'underindent-escape-string') or '\\-'
+        # More workers than cpus would only add overhead.
+        self.atFileReadWorkers = min(
+            c.config.getInt('at-file-read-workers') or 0, os.cpu_count() or 1)
+        self.useAtFileCache = c.config.getBool(
+            'use-at-file-cache', default=False)
+        self.skipUnchangedWrites = c.config.getBool(
+            'skip-unchanged-writes', default=False)
+        # Settings may change the written files.
+        self.writeFingerprints = {}
     #@+node:ekr.20041005105605.10: *4* at.initCommonIvars
     def initCommonIvars(self):
         """
@@ -230,6 +257,30 @@ class AtFile:
         root_v = leoNodes.VNode(context=c)
         root = leoNodes.Position(root_v)
         FastAtRead(c, gnx2vnode={}).read_into_root(s, fn, root)
+    #@+node:tom.20261018091833.1: *5* at.clearAtFileCache & printAtFileCacheStats
+    @cmd('clear-at-file-cache')
+    def clearAtFileCache(self, event=None):  # pragma: no cover
+        """
+        Clear the cache of @file trees.
+
+        The next read of each @file node will rescan the external file.
+        """
+        n = self.getAtFileCacher().clear()
+        g.es_print(f"cleared {n} cached @file tree{g.plural(n)}")
+
+    @cmd('print-at-file-cache-stats')
+    def printAtFileCacheStats(self, event=None):  # pragma: no cover
+        """Print the hit/miss statistics of the cache of @file trees."""
+        at = self
+        if not at.useAtFileCache:
+            g.es_print('@bool use-at-file-cache = False')
+        g.es_print(at.getAtFileCacher().stats())
+    #@+node:tom.20261018091833.2: *5* at.getAtFileCacher
+    def getAtFileCacher(self):
+        """Return the cache of @file trees, creating it if necessary."""
+        if not self.atFileCacher:
+            self.atFileCacher = leoCache.AtFileCacher(g.app.commander_db)
+        return self.atFileCacher
     #@+node:ekr.20041005105605.19: *5* at.openFileForReading & helper
     def openFileForReading(self, fromString=False):
         """
@@ -300,6 +351,10 @@ class AtFile:
         at.fromString = fromString
         if at.errors:
             return False  # pragma: no cover
+        # A worker process may already have read and scanned the file.
+        tree = None if fromString else at.getScannedTree(root, fileName)
+        if tree:
+            return at.readScannedTree(root, fileName, tree)
         fileName, file_s = at.openFileForReading(fromString=fromString)
         # #1798:
         if file_s is None:
@@ -321,7 +376,22 @@ class AtFile:
                 # at.tab_width
         gnx2vnode = c.fileCommands.gnxDict
         contents = fromString or file_s
-        FastAtRead(c, gnx2vnode).read_into_root(contents, fileName, root)
+        fast = FastAtRead(c, gnx2vnode)
+        cacher = at.getAtFileCacher() if at.useAtFileCache and not fromString else None
+        cached = False
+        if cacher:
+            # Use the cached tree if the external file has not changed.
+            tree = cacher.get_tree(fileName, contents.replace('\r', ''), root.gnx)
+            cached = bool(tree)
+        if tree:
+            fast.read_tree_into_root(tree, root)
+        else:
+            root_gnx = root.gnx
+            fast.read_into_root(contents, fileName, root)
+            if cacher and root.gnx == root_gnx:
+                tree = fast.make_tree(root.v)
+        if cacher and tree and not cached:
+            cacher.put_tree(fileName, contents.replace('\r', ''), root.gnx, tree)
         root.clearDirty()
         return True
     #@+node:ekr.20100122130101.6174: *6* at.deleteTnodeList
@@ -358,14 +428,19 @@ class AtFile:
         t1 = time.time()
         c.init_error_dialogs()
         files = at.findFilesToRead(force, root)
+        if at.atFileReadWorkers > 1:
+            at.scanFilesInWorkers(files)
         for p in files:
             at.readFileAtPosition(force, p)
+        at.scannedFiles = {}
         for p in files:
             p.v.clearDirty()
         if not g.unitTesting:  # pragma: no cover
             if files:
                 t2 = time.time()
                 g.es(f"read {len(files)} files in {t2 - t1:2.2f} seconds")
+                if at.useAtFileCache:
+                    g.es(at.getAtFileCacher().stats())
             elif force:
                 g.es("no @<file> nodes in the selected tree")
         c.changed = old_changed
@@ -424,6 +499,82 @@ class AtFile:
             at.rememberReadPath(g.fullPath(c, p), p)
         elif p.isAtCleanNode():
             at.readOneAtCleanNode(p)
+    #@+node:tom.20261018101544.1: *6* at.scanFilesInWorkers
+    def scanFilesInWorkers(self, files):
+        """
+        Read and scan the external files of all @file nodes in files,
+        using a pool of at.atFileReadWorkers worker processes.
+
+        Set at.scannedFiles. Keys are full paths, values are tuples
+        (content_hash, tree). at.read links each tree into the outline
+        without reading the file again.
+        """
+        at, c = self, self.c
+        cacher = at.getAtFileCacher() if at.useAtFileCache else None
+        jobs, paths = [], set()
+        for p in files:
+            if p.isAtThinFileNode() or p.isAtFileNode():
+                path = g.fullPath(c, p)
+                if path and path not in paths:
+                    paths.add(path)
+                    # The encoding that at.scanAllDirectives would set.
+                    encoding = (
+                        c.scanAllDirectives(p).get('encoding')
+                        or c.config.default_derived_file_encoding)
+                    cached_hash = cacher.get_hash(path, p.gnx) if cacher else None
+                    jobs.append((path, p.gnx, encoding, cached_hash))
+        n = min(at.atFileReadWorkers, len(jobs))
+        if n < 2:
+            return
+        chunksize = max(1, len(jobs) // (4 * n))
+        try:
+            # Spawned workers do not inherit the gui or g.app.
+            context = multiprocessing.get_context('spawn')
+            with concurrent.futures.ProcessPoolExecutor(max_workers=n, mp_context=context) as executor:
+                results = executor.map(scan_external_file, *zip(*jobs), chunksize=chunksize)
+                for job, result in zip(jobs, results):
+                    if result:
+                        at.scannedFiles[job[0]] = result
+        except Exception:
+            # Read all files in the main process.
+            g.es_exception()
+            at.scannedFiles = {}
+    #@+node:tom.20261018101544.2: *6* at.getScannedTree
+    def getScannedTree(self, root, fileName):
+        """
+        Return the tree that a worker process created by reading fileName,
+        or None if the main process must read the file itself.
+
+        Update the @file cache using the worker's content hash.
+        """
+        at = self
+        content_hash, tree = at.scannedFiles.pop(fileName, (None, None))
+        if not content_hash:
+            return None
+        if not at.useAtFileCache:
+            return tree
+        cacher = at.getAtFileCacher()
+        if not tree:
+            # The file has not changed since its tree was cached.
+            return cacher.get_tree(fileName, None, root.gnx, content_hash=content_hash)
+        cacher.misses += 1
+        cacher.put_tree(fileName, None, root.gnx, tree, content_hash=content_hash)
+        return tree
+    #@+node:tom.20261020090000.3: *6* at.readScannedTree
+    def readScannedTree(self, root, fileName, tree):
+        """
+        Link tree, created by a worker process, into root, doing what
+        at.openFileForReading and at.read would do.
+        """
+        at, c = self, self.c
+        at.setPathUa(root, fileName)
+        at.warnOnReadOnlyFile(fileName)
+        c.setFileTimeStamp(fileName)
+        root.clearVisitedInTree()
+        at.scanAllDirectives(root)
+        FastAtRead(c, c.fileCommands.gnxDict).read_tree_into_root(tree, root)
+        root.clearDirty()
+        return True
     #@+node:ekr.20080801071227.7: *5* at.readAtShadowNodes
     def readAtShadowNodes(self, p):  # pragma: no cover
         """Read all @shadow nodes in the p's tree."""
@@ -973,6 +1124,8 @@ class AtFile:
         # This is the *only* place where these are set.
         # promptForDangerousWrite sets cancelFlag only if canCancelFlag is True.
         at.unchangedFiles = 0
+        at.skippedFiles = 0
+        at.writtenFiles = 0
         at.canCancelFlag = True
         at.cancelFlag = False
         at.yesToAll = False
@@ -1056,7 +1209,12 @@ class AtFile:
         at = self
         if g.unitTesting:
             return
-        if files:
+        if files and at.skipUnchangedWrites:
+            n, n2, n3 = at.unchangedFiles, at.skippedFiles, at.writtenFiles
+            g.es(
+                f"finished: {n3} written, {n} unchanged, "
+                f"{n2} skipped file{g.plural(n + n2 + n3)}")
+        elif files:
             n = at.unchangedFiles
             g.es(f"finished: {n} unchanged file{g.plural(n)}")
         elif all:
@@ -1099,6 +1257,14 @@ class AtFile:
             at.writePathChanged(p)
         except IOError:
             return
+        fileName, fingerprint = at.getWriteFingerprint(p)
+        if fingerprint is not None and at.isUnchangedWrite(fileName, fingerprint, p):
+            at.skippedFiles += 1
+            p.clearDirty()
+            for p2 in p.self_and_subtree(copy=False):
+                p2.v.clearDirty()
+            return
+        at.replacedFileName = None
         table = (
             (p.isAtAsisFileNode, at.asisWrite),
             (p.isAtAutoNode, at.writeOneAtAutoNode),
@@ -1117,10 +1283,68 @@ class AtFile:
             g.trace(f"Can not happen: {p.h}")
             return
         #
+        # Remember what was written.
+        if fingerprint is not None:
+            if at.replacedFileName == fileName and not at.errors:
+                stamp = leoCache.get_content_hasher().stamp(fileName)
+                at.writeFingerprints[fileName] = fingerprint, stamp
+            else:
+                at.writeFingerprints.pop(fileName, None)
+        #
         # Clear the dirty bits in all descendant nodes.
         # The persistence data may still have to be written.
         for p2 in p.self_and_subtree(copy=False):
             p2.v.clearDirty()
+    #@+node:tom.20261018160144.1: *7* at.getWriteFingerprint & isUnchangedWrite
+    def getWriteFingerprint(self, p):
+        """
+        Return (fileName, fingerprint) for the @<file> tree at p,
+        or (None, None) if unchanged writes of p can not be skipped.
+
+        The fingerprint is the sha1 digest of everything in the outline that
+        affects the written file: the file name, the bodies of p's ancestors
+        (which may contain directives) and the gnx, headline, body and number
+        of children of every node of the tree, in outline order. Each field
+        is prefixed by its length, so different outlines can't run together.
+        """
+        at, c = self, self.c
+        if not at.skipUnchangedWrites:
+            return None, None
+        if p.isAtAutoNode() or p.isAtShadowFileNode():
+            return None, None  # These write more than one file.
+        fileName = g.os_path_realpath(g.fullPath(c, p))
+        if not fileName:
+            return None, None  # pragma: no cover
+        h = hashlib.sha1()
+
+        def put(s):
+            b = s.encode('utf-8', 'surrogatepass')
+            h.update(b'%d:' % len(b))
+            h.update(b)
+
+        put(fileName)
+        for z in p.parents():
+            put(z.v.b)
+        for z in p.self_and_subtree(copy=False):
+            v = z.v
+            put(v.gnx)
+            put(v.h)
+            put(v.b)
+            put(str(len(v.children)))
+        return fileName, h.hexdigest()
+
+    def isUnchangedWrite(self, fileName, fingerprint, p):
+        """
+        Return True if writing p would not change the external file:
+        Leo last wrote the same fingerprint to fileName, and the file's
+        size, modification time and inode have not changed since.
+        """
+        at = self
+        data = at.writeFingerprints.get(fileName)
+        if not data or data[0] != fingerprint or p.isOrphan():
+            return False
+        stamp = leoCache.get_content_hasher().stamp(fileName)
+        return stamp is not None and stamp == data[1]
     #@+node:ekr.20190108105509.1: *7* at.writePathChanged
     def writePathChanged(self, p):  # pragma: no cover
         """
@@ -2539,10 +2763,15 @@ class AtFile:
         # If file does not exist, create it from the contents.
         fileName = g.os_path_realpath(fileName)
         sfn = g.shortFileName(fileName)
+        hasher = leoCache.get_content_hasher()
+        data = g.toEncodedString(contents, encoding=encoding)
         if not g.os_path_exists(fileName):
-            ok = g.writeFile(contents, encoding, fileName)
+            ok = g.writeFile(data, encoding, fileName)
             if ok:
+                hasher.put_hash(fileName, hasher.hash_bytes(data))
                 c.setFileTimeStamp(fileName)
+                at.replacedFileName = fileName
+                at.writtenFiles += 1
                 if not g.unitTesting:
                     g.es(f"{timestamp}created: {fileName}")  # pragma: no cover
                 if root:
@@ -2555,8 +2784,13 @@ class AtFile:
             return False  # No change to original file.
         #
         # Compare the old and new contents.
-        old_contents = g.readFileIntoUnicodeString(fileName,
-            encoding=at.encoding, silent=True)
+        # Don't read the file if the cached hash shows it is unchanged.
+        content_hash = hasher.hash_bytes(data)
+        if content_hash == hasher.get_cached_hash(fileName):
+            old_contents = contents
+        else:
+            old_contents = g.readFileIntoUnicodeString(fileName,
+                encoding=at.encoding, silent=True)
         if not old_contents:
             old_contents = ''
         unchanged = (
@@ -2565,6 +2799,7 @@ class AtFile:
             or ignoreBlankLines and at.compareIgnoringBlankLines(old_contents, contents))
         if unchanged:
             at.unchangedFiles += 1
+            at.replacedFileName = fileName
             if not g.unitTesting and c.config.getBool(
                 'report-unchanged-files', default=True):
                 g.es(f"{timestamp}unchanged: {sfn}")  # pragma: no cover
@@ -2582,9 +2817,12 @@ class AtFile:
                 g.warning("correcting line endings in:", fileName)
         #
         # Write a changed file.
-        ok = g.writeFile(contents, encoding, fileName)
+        ok = g.writeFile(data, encoding, fileName)
         if ok:
+            hasher.put_hash(fileName, content_hash)
             c.setFileTimeStamp(fileName)
+            at.replacedFileName = fileName
+            at.writtenFiles += 1
             if not g.unitTesting:
                 g.es(f"{timestamp}wrote: {sfn}")  # pragma: no cover
         else:  # pragma: no cover
@@ -2821,7 +3059,7 @@ class AtFile:
         v = p.v
         # Fix bug #50: body text lost switching @file to @auto-rst
         if not hasattr(v, 'at_read'):
-            v.at_read = {}  # pragma: no cover
+            v.at_read = {}
         d = v.at_read
         aSet = d.get(fn, set())
         aSet.add(p.h)
@@ -2984,6 +3222,20 @@ class FastAtRead:
         self.others_pat = None
         self.ref_pat = None   
         self.section_delims_pat = None
+    #@+node:tom.20261018101544.3: *3* fast_at.make_tree & new_vnode
+    def make_tree(self, v):
+        """
+        Return a picklable description of v's tree.
+
+        The description is a nested tuple: (gnx, headline, body, children).
+        """
+        return (v.fileIndex, v._headString, v._bodyString, [self.make_tree(z) for z in v.children])
+
+    def new_vnode(self, context, gnx):
+        """Return a new VNode, or a ScannedNode if there is no commander."""
+        if context is None:
+            return ScannedNode(gnx)
+        return leoNodes.VNode(context=context, gnx=gnx)
     #@+node:ekr.20180602103135.3: *3* fast_at.get_patterns
     #@@nobeautify
 
@@ -3215,7 +3467,7 @@ class FastAtRead:
                     v.children = []
                 else:
                     # Make a new vnode.
-                    v = leoNodes.VNode(context=context, gnx=gnx)
+                    v = self.new_vnode(context, gnx)
                 #
                 # The last version of the body and headline wins.
                 gnx2vnode[gnx] = v
@@ -3513,7 +3765,120 @@ class FastAtRead:
             t2 = time.process_time()
             g.trace(f"{t2 - t1:5.2f} sec. {path}")
         return True
+    #@+node:tom.20261018101544.4: *3* fast_at.read_tree_into_root
+    def read_tree_into_root(self, tree, root):
+        """
+        Link the tree created by fast_at.make_tree into root and self.gnx2vnode.
+
+        This method duplicates the effects of fast_at.read_into_root,
+        including its handling of clones, without scanning any lines.
+        """
+        gnx2vnode = self.gnx2vnode
+        root_v = root.v
+        root_v._deleteAllChildren()
+        gnx2vnode[root_v.fileIndex] = root_v
+        bodies = {root_v.fileIndex: tree[2]}  # The last version of each body wins.
+
+        def link(parent_v, children, in_clone):
+            parent_v.children = []
+            for gnx, head, body, grand_children in children:
+                v = gnx2vnode.get(gnx)
+                bodies[gnx] = body
+                if v and in_clone:
+                    # Scanning the descendants of a clone.
+                    v._headString = head
+                    parent_v.children.append(v)
+                    link(v, grand_children, True)
+                    continue
+                # An existing vnode starts a clone tree.
+                is_clone = v is not None
+                if not v:
+                    v = self.new_vnode(self.c, gnx)
+                    gnx2vnode[gnx] = v
+                v._headString = head
+                parent_v.children.append(v)
+                v.parents.append(parent_v)
+                link(v, grand_children, in_clone or is_clone)
+
+        link(root_v, tree[3], False)
+        for gnx, body in bodies.items():
+            gnx2vnode[gnx]._bodyString = body
     #@-others
+#@+node:tom.20261018101544.5: ** class ScannedNode
+class ScannedNode:
+    """
+    A minimal stand-in for a VNode.
+
+    FastAtRead creates ScannedNodes in worker processes,
+    which have no commander. See scan_external_file.
+    """
+
+    __slots__ = ['_bodyString', '_headString', 'children', 'fileIndex', 'parents']
+
+    def __init__(self, gnx):
+        self._bodyString = ''
+        self._headString = ''
+        self.children: List["ScannedNode"] = []
+        self.fileIndex = gnx
+        self.parents: List["ScannedNode"] = []
+
+    def __repr__(self):
+        return f"<ScannedNode {self.fileIndex} {self._headString}>"
+
+    def _deleteAllChildren(self):
+        self.children = []
+
+    @property
+    def gnx(self):
+        return self.fileIndex
+
+    @property
+    def h(self):
+        return self._headString
+
+    # A ScannedNode is its own position.
+
+    @property
+    def v(self):
+        return self
+#@+node:tom.20261018101544.6: ** function: scan_external_file
+def scan_external_file(path, root_gnx, encoding, cached_hash=None):
+    """
+    Read, decode and scan the external file of an @file node.
+
+    This function runs in a worker process. It must not use g.app or
+    any commander.
+
+    Return (content_hash, tree), or None if the main process must read the
+    file itself. tree is None if content_hash matches cached_hash.
+    """
+    try:
+        with open(path, 'rb') as f:
+            s = f.read()
+        # Decode the file as at.readFileToUnicode does.
+        e, s = g.stripBOM(s)
+        if not e:
+            e = encoding
+            # Use the encoding given in the @+leo sentinel, if any.
+            for line in g.splitLines(g.toUnicode(s, 'ascii')):
+                m = FastAtRead.header_pattern.match(line)
+                if m:
+                    if m.group(6):
+                        e = m.group(6).rstrip(',')
+                    break
+            if not g.isValidEncoding(e):
+                return None
+        contents = g.toUnicode(s, encoding=e).replace('\r', '')
+        content_hash = leoCache.AtFileCacher().content_hash(contents)
+        if content_hash == cached_hash:
+            return content_hash, None
+        root_v = ScannedNode(root_gnx)
+        x = FastAtRead(c=None, gnx2vnode={root_gnx: root_v})
+        if not x.read_into_root(contents, path, root_v) or root_v.fileIndex != root_gnx:
+            return None
+        return content_hash, x.make_tree(root_v)
+    except Exception:
+        return None
 #@-others
 #@@language python
 #@@tabwidth -4
@@ -44,8 +44,22 @@
 # - bridge.openLeoFile(path) returns a completely standard Leo commander.
 #   Host programs can use these commanders as described in Leo's scripting
 #   chapter.
+#
+# - leoBridge.process_files runs a function on many .leo files at once,
+#   using a pool of worker processes, each with its own bridge::
+#
+#     def count_nodes(c):
+#         return len(list(c.all_unique_nodes()))
+#
+#     if __name__ == '__main__':
+#         for r in leoBridge.process_files(paths, count_nodes):
+#             print(r.path, r.result, r.error, r.seconds)
 #@-<< about the leoBridge module >>
+import collections
+import concurrent.futures
+import multiprocessing
 import os
+import time
 import traceback
 # This module must import *no* Leo modules at the outer level!
 gBridgeController = None  # The singleton bridge controller.
@@ -336,6 +350,82 @@ class BridgeController:
             g.app.db = g.app.global_cacher.db
             g.app.commander_cacher = leoCache.CommanderCacher()
             g.app.commander_db = g.app.commander_cacher.db
+            g.app.content_hasher = None  # Recreated by leoCache.get_content_hasher.
     #@-others
+#@+node:tom.20261018163410.1: ** process_files & helpers
+BatchResult = collections.namedtuple('BatchResult',
+    'path result error open_seconds seconds pid')
+
+def process_files(paths, func, workers=0, **kwargs):
+    """
+    Call func(c) for the commander c of each .leo file in paths.
+
+    Yield a BatchResult for each file as soon as it is available, in order
+    of completion. r.result is func's return value, or None if r.error,
+    a traceback, is not None. r.open_seconds is the time taken to open the
+    file and r.seconds the time taken to open the file and call func.
+
+    workers: the number of worker processes. 0: one per cpu.
+             The files are processed in this process if workers < 2.
+
+    Each worker creates its own bridge, passing kwargs to controller, and
+    processes many files, so the cost of starting Leo is paid once per
+    worker, not once per file.
+
+    func and its results must be picklable. In particular, func must be
+    defined at the outer level of a module. Workers are spawned, so host
+    programs must guard their main code with `if __name__ == '__main__':`.
+    """
+    paths = list(paths)
+    n = min(workers or os.cpu_count() or 1, len(paths))
+    if n < 2:
+        _init_batch_worker(kwargs)
+        for path in paths:
+            yield _process_file(path, func)
+        return
+    context = multiprocessing.get_context('spawn')
+    with concurrent.futures.ProcessPoolExecutor(
+        max_workers=n,
+        mp_context=context,
+        initializer=_init_batch_worker,
+        initargs=(kwargs,),
+    ) as executor:
+        futures = {executor.submit(_process_file, path, func): path for path in paths}
+        for future in concurrent.futures.as_completed(futures):
+            try:
+                yield future.result()
+            except Exception:
+                # The worker died or func's result could not be pickled.
+                yield BatchResult(futures[future], None, traceback.format_exc(), 0.0, 0.0, None)
+
+def _init_batch_worker(kwargs):
+    """Create the bridge for this process, if it does not already exist."""
+    d = dict(gui='nullGui', loadPlugins=False, silent=True, verbose=False)
+    d.update(kwargs)
+    controller(**d)
+
+def _process_file(path, func):
+    """Open the .leo file at path, call func(c) and close the file."""
+    bridge = gBridgeController
+    g = bridge.globals()
+    t1 = time.perf_counter()
+    c, result, error, open_seconds = None, None, None, 0.0
+    old_commanders = g.app.commanders()
+    try:
+        if not os.path.exists(path):
+            raise FileNotFoundError(path)
+        c = bridge.openLeoFile(path)
+        open_seconds = time.perf_counter() - t1
+        result = func(c)
+    except Exception:
+        error = traceback.format_exc()
+    finally:
+        if c and c not in old_commanders:
+            try:
+                c.changed = False  # Don't prompt to save.
+                g.app.closeLeoWindow(c.frame, finish_quit=False)
+            except Exception:
+                pass
+    return BatchResult(path, result, error, open_seconds, time.perf_counter() - t1, os.getpid())
 #@-others
 #@-leo
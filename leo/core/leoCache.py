@@ -4,10 +4,12 @@
 #@+<< imports >>
 #@+node:ekr.20100208223942.10436: ** << imports >> (leoCache)
 import fnmatch
+import hashlib
 import os
 import pickle
 import sqlite3
 import stat
+import time
 from typing import Any, Dict, Sequence
 import zlib
 from leo.core import leoGlobals as g
@@ -23,6 +25,106 @@ join = g.os_path_join
 normcase = g.os_path_normcase
 split = g.os_path_split
 #@+others
+#@+node:tom.20261018090512.1: ** class AtFileCacher
+class AtFileCacher:
+    """
+    A cache of the vnode trees created by reading @file nodes.
+
+    Keys are full paths of external files. Values are tuples
+    (content_hash, root_gnx, tree), where tree is a nested tuple:
+    (gnx, headline, body, children).
+
+    On a hit, FastAtRead.read_tree_into_root relinks the cached tree
+    into fc.gnxDict without rescanning the external file.
+    """
+
+    key_suffix = 'at-file-tree'
+
+    def __init__(self, db=None):
+        if db is None or isinstance(db, g.NullObject):
+            db = {}  # A dummy, per-session cache.
+        self.db = db
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+    #@+others
+    #@+node:tom.20261018090512.2: *3* at_cacher.clear
+    def clear(self):
+        """Remove all cached @file trees. Return the number of trees removed."""
+        # Careful: self.db may be a Python dict.
+        keys = [z for z in list(self.db.keys()) if self.is_cache_key(z)]
+        for key in keys:
+            del self.db[key]
+        self.hits = self.misses = self.stores = 0
+        return len(keys)
+    #@+node:tom.20261018090512.3: *3* at_cacher.content_hash & cache_key
+    def cache_key(self, path):
+        return f"{path}:::{self.key_suffix}"
+
+    def content_hash(self, contents):
+        """Return the hash of the (unicode) contents of an external file."""
+        return hashlib.md5(g.toEncodedString(contents)).hexdigest()
+
+    def is_cache_key(self, key):
+        # SqlitePickleShare.keys() yields 1-tuples.
+        if isinstance(key, tuple):
+            key = key[0]
+        return isinstance(key, str) and key.endswith(f":::{self.key_suffix}")
+    #@+node:tom.20261018090512.4: *3* at_cacher.get_tree
+    def get_tree(self, path, contents, root_gnx, content_hash=None):
+        """
+        Return the cached tree for the external file at path or None.
+
+        The tree is valid only if neither the contents of the file
+        nor the gnx of the @file node have changed.
+
+        content_hash: the hash of contents, if already known.
+        """
+        if content_hash is None:
+            content_hash = self.content_hash(contents)
+        try:
+            data = self.db.get(self.cache_key(path))
+            cached_hash, cached_gnx, tree = data
+            if cached_hash == content_hash and cached_gnx == root_gnx:
+                self.hits += 1
+                return tree
+        except Exception:
+            pass  # A miss, including missing or malformed entries.
+        self.misses += 1
+        return None
+    #@+node:tom.20261018090512.5: *3* at_cacher.get_hash & put_tree
+    def get_hash(self, path, root_gnx):
+        """Return the content hash of the cached tree for path and root_gnx, or None."""
+        try:
+            content_hash, cached_gnx, tree = self.db.get(self.cache_key(path))
+            return content_hash if cached_gnx == root_gnx else None
+        except Exception:
+            return None
+
+    def put_tree(self, path, contents, root_gnx, tree, content_hash=None):
+        """
+        Cache the tree created by reading contents.
+
+        tree is a nested tuple created by FastAtRead.make_tree.
+        content_hash: the hash of contents, if already known.
+        """
+        if content_hash is None:
+            content_hash = self.content_hash(contents)
+        try:
+            self.db[self.cache_key(path)] = (content_hash, root_gnx, tree)
+            self.stores += 1
+        except Exception:
+            g.es_exception()
+    #@+node:tom.20261018090512.7: *3* at_cacher.stats
+    def stats(self):
+        """Return a one-line summary of cache statistics."""
+        n = self.hits + self.misses
+        percent = 100.0 * self.hits / n if n else 0.0
+        return (
+            f"@file cache: {self.hits} hit{g.plural(self.hits)}, "
+            f"{self.misses} miss{'' if self.misses == 1 else 'es'}, "
+            f"{self.stores} stored, {percent:.1f}% hit rate")
+    #@-others
 #@+node:ekr.20100208062523.5885: ** class CommanderCacher
 class CommanderCacher:
     """A class to manage per-commander caches."""
@@ -138,6 +240,119 @@ class CommanderWrapper:
     def __setitem__(self, key, value):
         self.user_keys.add(key)
         self.db[f"{self.key}:::{key}"] = value
+#@+node:tom.20261018150322.1: ** class ContentHashCacher
+class ContentHashCacher:
+    """
+    A cache of the content hashes of files, shared by the external files
+    controllers and by AtFile.replaceFile. See get_content_hasher.
+
+    Keys are real paths. Values are tuples (size, mtime_ns, inode, hash).
+    A cached hash remains valid while the file's size, modification time
+    and inode are unchanged.
+    """
+
+    chunk_size = 1 << 20  # Read files in 1MB chunks.
+    key_suffix = 'content-hash'
+    racy_seconds = 2.0  # Don't cache hashes of files modified this recently.
+
+    def __init__(self, db=None):
+        if db is None or isinstance(db, g.NullObject):
+            db = {}  # A dummy, per-session cache.
+        self.db = db
+        self.d = {}  # An in-memory copy of the entries used in this session.
+        self.hits = 0
+        self.misses = 0
+    #@+others
+    #@+node:tom.20261018150322.2: *3* hasher.hash_bytes & hash_file
+    def hash_bytes(self, data):
+        """Return the hash of data, a bytes object."""
+        return hashlib.sha1(data).hexdigest()
+
+    def hash_file(self, path):
+        """Return the hash of the file at path, reading it in chunks."""
+        h = hashlib.sha1()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(self.chunk_size), b''):
+                h.update(chunk)
+        return h.hexdigest()
+    #@+node:tom.20261018150322.3: *3* hasher.get_hash & get_cached_hash
+    def get_hash(self, path):
+        """
+        Return the hash of the file at the given path, or None if the file
+        does not exist. Read the file only if the cached hash is stale.
+        """
+        path = g.os_path_realpath(path)
+        stamp = self.stamp(path)
+        if not stamp:
+            return None
+        content_hash = self.lookup(path, stamp)
+        if content_hash:
+            self.hits += 1
+            return content_hash
+        self.misses += 1
+        try:
+            content_hash = self.hash_file(path)
+        except OSError:
+            return None
+        self.put(path, stamp, content_hash)
+        return content_hash
+
+    def get_cached_hash(self, path):
+        """
+        Return the cached hash of the file at the given path if it is still
+        valid. Otherwise, return None without reading the file.
+        """
+        path = g.os_path_realpath(path)
+        stamp = self.stamp(path)
+        return self.lookup(path, stamp) if stamp else None
+    #@+node:tom.20261018150322.7: *3* hasher.lookup
+    def lookup(self, path, stamp):
+        """Return the hash cached for path if it matches stamp, or None."""
+        entry = self.d.get(path)
+        if entry is None:
+            try:
+                entry = self.db.get(f"{path}:::{self.key_suffix}")
+            except Exception:
+                entry = None
+        if entry and tuple(entry[:3]) == stamp:
+            self.d[path] = entry
+            return entry[3]
+        return None
+    #@+node:tom.20261018150322.4: *3* hasher.put & put_hash
+    def put(self, path, stamp, content_hash):
+        """Cache the content_hash of the file whose stamp is given."""
+        size, mtime_ns, inode = stamp
+        if time.time() - mtime_ns / 1e9 < self.racy_seconds:
+            # The file might change again without changing its stamp.
+            self.d.pop(path, None)
+            return
+        entry = (size, mtime_ns, inode, content_hash)
+        self.d[path] = entry
+        try:
+            self.db[f"{path}:::{self.key_suffix}"] = entry
+        except Exception:
+            pass
+
+    def put_hash(self, path, content_hash):
+        """
+        Cache the hash of the contents just written to the file at path.
+        The caller computes content_hash with hash_bytes.
+        """
+        path = g.os_path_realpath(path)
+        stamp = self.stamp(path)
+        if stamp:
+            self.put(path, stamp, content_hash)
+    #@+node:tom.20261018150322.5: *3* hasher.stamp
+    def stamp(self, path):
+        """Return (size, mtime_ns, inode) for the file at path, or None."""
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        if not stat.S_ISREG(st.st_mode):
+            return None
+        return st.st_size, st.st_mtime_ns, st.st_ino
+    #@-others
 #@+node:ekr.20180627041556.1: ** class GlobalCacher
 class GlobalCacher:
     """A singleton global cacher, g.app.db"""
@@ -733,6 +948,12 @@ def dump_list(heading, aList):
         else:
             print(f"{key:30}:")
             g.printObj(val)
+#@+node:tom.20261018150322.6: ** function: get_content_hasher
+def get_content_hasher():
+    """Return g.app.content_hasher, creating it if necessary."""
+    if not g.app.content_hasher:
+        g.app.content_hasher = ContentHashCacher(g.app.commander_db)
+    return g.app.content_hasher
 #@-others
 #@@language python
 #@@tabwidth -4
@@ -9,10 +9,11 @@
 
 #@+<< imports >>
 #@+node:ekr.20140827092102.18575: ** << imports >> (leoColorizer.py)
+from collections import OrderedDict
 import re
 import string
 import time
-from typing import Any, Callable, Dict, List, Tuple
+from typing import Any, Callable, Dict, List, Set, Tuple
 #
 # Third-part tools.
 try:
@@ -170,6 +171,8 @@ class BaseJEditColorizer(BaseColorizer):
                             aList.extend(rules)
                             self.rulesDict[key] = aList
             self.initModeFromBunch(savedBunch)
+        if names:
+            self.leadins_verified.clear()
     #@+node:ekr.20110605121601.18577: *3* bjc.addLeoRules
     def addLeoRules(self, theDict):
         """Put Leo-specific rules to theList."""
@@ -244,6 +247,7 @@ class BaseJEditColorizer(BaseColorizer):
     def configure_tags(self):
         """Configure all tags."""
         wrapper = self.wrapper
+        self.format_dict = {}  # Recompute all formats.
         if wrapper and hasattr(wrapper, 'start_tag_configure'):
             wrapper.start_tag_configure()
         self.configure_fonts()
@@ -673,6 +677,8 @@ class BaseJEditColorizer(BaseColorizer):
         coloring rule attributes for the mode.
         """
         language, rulesetName = self.nameToRulesetName(name)
+        # Loading a mode may add rules to any rulesDict.
+        self.leadins_verified.clear()
         if mode:
             # A hack to give modes/forth.py access to c.
             if hasattr(mode, 'pre_init_mode'):
@@ -845,6 +851,7 @@ class BaseJEditColorizer(BaseColorizer):
         """Init Style data common to JEdit and Pygments colorizers."""
         # init() properly sets these for each language.
         self.actualColorDict = {}  # Used only by setTag.
+        self.format_dict = {}  # Keys are tags, values are (format, font). Used only by setTag.
         self.hyperCount = 0
         # Attributes dict ivars: defaults are as shown...
         self.default = 'null'
@@ -879,6 +886,9 @@ class BaseJEditColorizer(BaseColorizer):
         self.modeBunch = None  # A bunch fully describing a mode.
         self.modeStack = []
         self.rulesDict = {}
+        # Ids of rulesDicts whose cached leadins jedit.compile_leadins has
+        # checked since the last mode was loaded.
+        self.leadins_verified: Set[int] = set()
         # self.defineAndExtendForthWords()
         self.word_chars = {}  # Inited by init_keywords().
         self.tags = [
@@ -990,7 +1000,7 @@ class BaseJEditColorizer(BaseColorizer):
         elif style_name != self.prev_style:
             g.es_print(f"New pygments style: {style_name}")
             self.prev_style = style_name
-    #@+node:ekr.20110605121601.18641: *3* bjc.setTag
+    #@+node:ekr.20110605121601.18641: *3* bjc.setTag & helper
     last_v = None
 
     def setTag(self, tag, s, i, j):
@@ -999,9 +1009,43 @@ class BaseJEditColorizer(BaseColorizer):
         self.n_setTag += 1
         if i == j:
             return
+        if self.recorded_tags is not None:
+            self.recorded_tags.append((tag, i, j))
+        data = self.format_dict.get(tag)
+        if data is None:
+            data = self.format_dict[tag] = self.tagToFormat(tag)
+        if not data:
+            return
+        format, font = data
+        if font:
+            self.configure_hard_tab_width(font)  # #1919.
+        self.tagCount += 1
+        if trace:
+            # A superb trace.
+            if len(repr(s[i:j])) <= 20:
+                s2 = repr(s[i:j])
+            else:
+                s2 = repr(s[i : i + 17 - 2] + '...')
+            tag = tag.lower().strip()
+            if tag.startswith('dots'):
+                tag = tag[len('dots') :]
+            kind_s = f"{self.language}.{tag}"
+            kind_s2 = f"{self.delegate_name}:" if self.delegate_name else ''
+            print(
+                f"setTag: {kind_s:25} {i:3} {j:3} {s2:>20} "
+                f"{self.rulesetName}:{kind_s2}{self.matcher_name}"
+            )
+        self.highlighter.setFormat(i, j - i, format)
+    #@+node:tom.20261018211512.3: *4* bjc.tagToFormat
+    def tagToFormat(self, tag):
+        """
+        Return (format, font) for the given tag, or False if the tag has no color.
+
+        setTag caches the result until the tags are next configured.
+        """
         wrapper = self.wrapper  # A QTextEditWrapper
         if not tag.strip():
-            return
+            return False
         tag = tag.lower().strip()
         # A hack to allow continuation dots on any tag.
         dots = tag.startswith('dots')
@@ -1010,7 +1054,7 @@ class BaseJEditColorizer(BaseColorizer):
         colorName = wrapper.configDict.get(tag)
             # This color name should already be valid.
         if not colorName:
-            return
+            return False
         #
         # New in Leo 5.8.1: allow symbolic color names here.
         # This now works because all keys in leo_color_database are normalized.
@@ -1025,13 +1069,12 @@ class BaseJEditColorizer(BaseColorizer):
                 self.actualColorDict[colorName] = color
             else:
                 g.trace('unknown color name', colorName, g.callers())
-                return
+                return False
         underline = wrapper.configUnderlineDict.get(tag)
         format = QtGui.QTextCharFormat()
         font = self.fonts.get(tag)
         if font:
             format.setFont(font)
-            self.configure_hard_tab_width(font)  # #1919.
         if tag in ('blank', 'tab'):
             if tag == 'tab' or colorName == 'black':
                 format.setFontUnderline(True)
@@ -1047,20 +1090,7 @@ class BaseJEditColorizer(BaseColorizer):
         else:
             format.setForeground(color)
             format.setUnderlineStyle(UnderlineStyle.NoUnderline)
-        self.tagCount += 1
-        if trace:
-            # A superb trace.
-            if len(repr(s[i:j])) <= 20:
-                s2 = repr(s[i:j])
-            else:
-                s2 = repr(s[i : i + 17 - 2] + '...')
-            kind_s = f"{self.language}.{tag}"
-            kind_s2 = f"{self.delegate_name}:" if self.delegate_name else ''
-            print(
-                f"setTag: {kind_s:25} {i:3} {j:3} {s2:>20} "
-                f"{self.rulesetName}:{kind_s2}{self.matcher_name}"
-            )
-        self.highlighter.setFormat(i, j - i, format)
+        return format, font
     #@-others
 #@+node:ekr.20110605121601.18569: ** class JEditColorizer(BaseJEditColorizer)
 # This is c.frame.body.colorizer
@@ -1094,6 +1124,16 @@ class JEditColorizer(BaseJEditColorizer):
         self.restartDict = {}  # Keys are state numbers, values are restart functions.
         self.stateDict = {}  # Keys are state numbers, values state names.
         self.stateNameDict = {}  # Keys are state names, values are state numbers.
+        # Compiled matcher tables. Keys are id's of rulesDicts or word_chars dicts.
+        self.leadins_dict: Dict[int, Tuple] = {}
+        self.word_pattern_dict: Dict[int, Tuple] = {}
+        # The line cache. Keys are vnodes, values are lists of line records.
+        self.line_cache: Dict[Any, List] = OrderedDict()
+        self.recorded_tags = None  # A list of (tag, i, j), used by setTag.
+        # Idle-time pre-coloring.
+        self.precolor_job = None
+        self.precolor_queue = []  # Positions to be pre-colored.
+        self.precolor_timer = None
         # #2276: Set by init_section_delims.
         self.section_delim1 = '<<'
         self.section_delim2 = '>>'
@@ -1118,7 +1158,7 @@ class JEditColorizer(BaseJEditColorizer):
         self.prev = None
         # Must be done to support per-language @font/@color settings.
         self.configure_tags()
-        self.init_section_delims()  # #2276
+        self.init_section_delims(p)  # #2276
     #@+node:ekr.20170201082248.1: *4* jedit.init_all_state
     def init_all_state(self, v):
         """Completely init all state data."""
@@ -1130,9 +1170,9 @@ class JEditColorizer(BaseJEditColorizer):
         self.stateDict = {}
         self.stateNameDict = {}
     #@+node:ekr.20211029073553.1: *4* jedit.init_section_delims
-    def init_section_delims(self):
+    def init_section_delims(self, p=None):
 
-        p = self.c.p
+        p = p or self.c.p
 
         def find_delims(v):
             for s in g.splitLines(v.b):
@@ -1157,6 +1197,11 @@ class JEditColorizer(BaseJEditColorizer):
         # Do the basic inits.
         BaseJEditColorizer.reloadSettings(self)
         # Init everything else.
+        c = self.c
+        n = c.config.getInt('colorizer-cache-size')
+        self.line_cache_size = 20 if n is None else n
+        self.precolor_flag = c.config.getBool('precolor-nodes', default=False)
+        self.line_cache.clear()
         self.init_style_ivars()
         self.defineLeoKeywordsDict()
         self.defineDefaultColorsDict()
@@ -1628,15 +1673,15 @@ class JEditColorizer(BaseJEditColorizer):
             return 0
         # Get the word as quickly as possible.
         j = i
-        n = len(s)
         chars = self.word_chars
         # Special cases...
         if self.language in ('haskell', 'clojure'):
             chars["'"] = "'"
         if self.language == 'c':
             chars['_'] = '_'
-        while j < n and s[j] in chars:
-            j += 1
+        m = self.compile_word_chars(chars).match(s, j)
+        if m:
+            j = m.end()
         word = s[i:j]
         # Fix part of #585: A kludge for css.
         if self.language == 'css' and word.endswith(':'):
@@ -2296,9 +2341,20 @@ class JEditColorizer(BaseJEditColorizer):
                 print('')
                 g.trace(f"NEW NODE: state {n} = {f_name} {p.h}\n")
         i = f(s) if f else 0
+        d = self.rulesDict
+        leadins = self.compile_leadins(d)
         while i < len(s):
             progress = i
-            functions = self.rulesDict.get(s[i], [])
+            if self.rulesDict is not d:
+                # A matcher has switched modes.
+                d = self.rulesDict
+                leadins = self.compile_leadins(d)
+            # Skip all characters that can not start a match.
+            m = leadins.search(s, i) if leadins else None
+            if not m:
+                break
+            i = m.start()
+            functions = d.get(s[i], [])
             for f in functions:
                 n = f(self, s, i)
                 if n is None:
@@ -2318,6 +2374,52 @@ class JEditColorizer(BaseJEditColorizer):
             assert i > progress
         # Don't even *think* about changing state here.
         self.tot_time += time.process_time() - t1
+    #@+node:tom.20261018211512.1: *4* jedit.compile_leadins
+    # Rules that never match. Qt shows invisibles.
+    null_rules = (match_blanks, match_tabs)
+    any_char_pattern = re.compile('.', re.DOTALL)
+
+    def compile_leadins(self, d):
+        """
+        Return a compiled regex that matches every character that might start
+        a match in d, a rulesDict, or None if no character can start a match.
+
+        mainLoop uses this regex to skip all other characters in a single scan.
+
+        The cache is keyed on d and its contents: the rules in each list.
+        mainLoop calls this method for every line, so the contents are checked
+        only the first time d is seen after a mode has been loaded.
+        """
+        key = id(d)
+        data = self.leadins_dict.get(key)
+        if data and data[0] is d and key in self.leadins_verified:
+            return data[2]
+        if not isinstance(d, dict):
+            # A rulesDict with default rules. See modes/plain.py.
+            return self.any_char_pattern
+        # Plugins may add keys, replace lists or insert rules into lists.
+        signature = tuple((ch, tuple(aList)) for ch, aList in d.items())
+        if not data or data[0] is not d or data[1] != signature:
+            chars = [
+                re.escape(ch) for ch, aList in d.items()
+                if len(ch) == 1 and aList
+                and not all(z in self.null_rules for z in aList)
+            ]
+            leadins = re.compile(f"[{''.join(chars)}]") if chars else None
+            data = self.leadins_dict[key] = d, signature, leadins
+        self.leadins_verified.add(key)
+        return data[2]
+    #@+node:tom.20261018211512.2: *4* jedit.compile_word_chars
+    def compile_word_chars(self, chars):
+        """Return a compiled regex that matches a run of characters in chars, a word_chars dict."""
+        data = self.word_pattern_dict.get(id(chars))
+        if data:
+            chars2, n, pattern = data
+            if chars2 is chars and n == len(chars):
+                return pattern
+        pattern = re.compile(f"[{''.join(re.escape(z) for z in chars)}]+")
+        self.word_pattern_dict[id(chars)] = chars, len(chars), pattern
+        return pattern
     #@+node:ekr.20110605121601.18640: *3* jedit.recolor & helpers
     def recolor(self, s):
         """
@@ -2338,12 +2440,59 @@ class JEditColorizer(BaseJEditColorizer):
             assert self.language
             self.init_all_state(p.v)
             self.init(p)
+            self.queuePrecolor(p)
         if block_n == 0:
             n = self.initBlock0()
         n = self.setState(n)  # Required.
         # Always color the line, even if colorizing is disabled.
         if s:
+            self.colorLine(p.v, block_n, n, s)
+    #@+node:tom.20261018223512.1: *4* jedit.colorLine
+    def colorLine(self, v, block_n, n, s):
+        """
+        Color s, line block_n of v.b, starting in state n.
+
+        The line cache remembers the tags and the final state of each line.
+        Records are keyed by the name of the starting state, because state
+        numbers change whenever a node is selected. If the line and starting
+        state are unchanged, replay the tags instead of calling mainLoop.
+        """
+        prev_name = self.stateDict.get(n)
+        if self.line_cache_size <= 0 or prev_name is None:
+            self.mainLoop(n, s)
+            return
+        records = self.line_cache.get(v)
+        if records is None:
+            records = self.line_cache[v] = []
+            while len(self.line_cache) > self.line_cache_size:
+                self.line_cache.popitem(last=False)
+        else:
+            self.line_cache.move_to_end(v)
+        record = records[block_n] if block_n < len(records) else None
+        if record and record[0] == prev_name and record[1] == s:
+            prev_name, s, name, f, language, tags = record
+            n2 = self.stateNameDict.get(name)
+            if n2 is None:
+                n2 = self.stateNameToStateNumber(f, name)
+                self.n2languageDict[n2] = language
+            self.setState(n2)
+            for tag, i, j in tags:
+                self.setTag(tag, s, i, j)
+            return
+        self.recorded_tags = tags = []
+        try:
             self.mainLoop(n, s)
+        finally:
+            self.recorded_tags = None
+        if self.section_delim1 in s:
+            return  # Coloring section references depends on the outline.
+        n2 = self.currentState()
+        name = self.stateDict.get(n2)
+        if name is not None:
+            while len(records) <= block_n:
+                records.append(None)
+            records[block_n] = (
+                prev_name, s, name, self.restartDict.get(n2), self.n2languageDict.get(n2), tags)
     #@+node:ekr.20170126100139.1: *4* jedit.initBlock0
     def initBlock0(self):
         """
@@ -2384,6 +2533,115 @@ class JEditColorizer(BaseJEditColorizer):
                 name = name.replace(pattern, s)
             return name
         return 'no-language'
+    #@+node:tom.20261018223512.2: *3* jedit.precolor & helpers
+    #@+node:tom.20261018223512.3: *4* jedit.queuePrecolor
+    def queuePrecolor(self, p):
+        """
+        Queue the nodes that are likely to be selected after p for pre-coloring:
+        p's siblings, parent and first child, and recently visited nodes.
+        """
+        c = self.c
+        self.precolor_job = None
+        self.precolor_queue = []
+        if not self.precolor_flag or self.line_cache_size <= 1:
+            return
+        aList = [p.back(), p.next(), p.parent(), p.firstChild()]
+        for data in reversed(c.nodeHistory.beadList[-5:]):
+            aList.append(data[0])
+        seen = {p.v}
+        for p2 in aList:
+            if p2 and p2.v not in seen and p2.b:
+                seen.add(p2.v)
+                self.precolor_queue.append(p2.copy())
+        # Don't evict p from the line cache.
+        del self.precolor_queue[self.line_cache_size - 1 :]
+        if self.precolor_queue:
+            if not self.precolor_timer:
+                self.precolor_timer = g.IdleTime(
+                    self.onPrecolorTimer, delay=100, tag='JEditColorizer.precolor')
+            if self.precolor_timer:
+                self.precolor_timer.start()
+    #@+node:tom.20261018223512.4: *4* jedit.onPrecolorTimer
+    def onPrecolorTimer(self, timer):
+        """Pre-color a few hundred lines at idle time."""
+        if not self.c.exists or not self.precolorStep():
+            timer.stop()
+    #@+node:tom.20261018223512.5: *4* jedit.precolorStep
+    def precolorStep(self, max_lines=500):
+        """
+        Color at most max_lines lines of the next queued node, filling the line cache.
+
+        Return False if there is nothing left to do.
+        """
+        c = self.c
+        job = self.precolor_job
+        while not job:
+            if not self.precolor_queue:
+                return False
+            p = self.precolor_queue.pop(0)
+            if c.positionExists(p) and p.v != c.p.v:
+                job = self.precolor_job = g.Bunch(
+                    p=p, lines=p.b.split('\n'), block_n=0, state=None)
+        p = job.p
+        if not c.positionExists(p):
+            self.precolor_job = None
+            return True
+        # Save everything that coloring another node changes.
+        saved = (
+            self.after_doc_language, self.enabled, self.highlighter,
+            self.initialStateNumber, self.blankStateNumber, self.language,
+            self.modeBunch, self.section_delim1, self.section_delim2,
+        )
+        # self.modeBunch may be None or stale, so save the mode itself.
+        saved_mode = g.Bunch(
+            attributesDict=self.attributesDict,
+            defaultColor=self.defaultColor,
+            keywordsDict=self.keywordsDict,
+            language=self.language,
+            mode=self.mode,
+            properties=self.properties,
+            rulesDict=self.rulesDict,
+            rulesetName=self.rulesetName,
+            word_chars=self.word_chars,
+        )
+        try:
+            self.highlighter = highlighter = PrecolorHighlighter()
+            self.updateSyntaxColorer(p)
+            self.init_section_delims(p)
+            if job.state:
+                name, f, self.language = job.state
+                n = self.stateNameDict.get(name)
+                if n is None:
+                    n = self.stateNameToStateNumber(f, name)
+                    self.n2languageDict[n] = self.language
+            self.init_mode(self.language)
+            self.setInitialStateNumber()
+            if job.block_n == 0:
+                n = self.initBlock0()
+            for block_n in range(job.block_n, min(len(job.lines), job.block_n + max_lines)):
+                # Do what recolor does.
+                new_language = self.n2languageDict.get(n)
+                if new_language != self.language:
+                    self.language = new_language
+                    self.init_mode(new_language)
+                    self.setInitialStateNumber()
+                n = self.setState(n)
+                s = job.lines[block_n]
+                if s:
+                    self.colorLine(p.v, block_n, n, s)
+                n = highlighter.state
+            job.block_n += max_lines
+            job.state = self.stateDict.get(n), self.restartDict.get(n), self.n2languageDict.get(n)
+            if job.block_n >= len(job.lines) or job.state[0] is None:
+                self.precolor_job = None
+        finally:
+            self.initModeFromBunch(saved_mode)
+            (
+                self.after_doc_language, self.enabled, self.highlighter,
+                self.initialStateNumber, self.blankStateNumber, self.language,
+                self.modeBunch, self.section_delim1, self.section_delim2,
+            ) = saved
+        return True
     #@+node:ekr.20170205055743.1: *3* jedit.set_wikiview_patterns
     def set_wikiview_patterns(self, leadins, patterns):
         """
@@ -2403,7 +2661,33 @@ class JEditColorizer(BaseJEditColorizer):
                     aList.insert(0, wiki_rule)
                     d[ch] = aList
         self.rulesDict = d
+        self.leadins_verified.clear()
+        self.line_cache.clear()
     #@-others
+#@+node:tom.20261018223512.6: ** class PrecolorHighlighter
+class PrecolorHighlighter:
+    """
+    A stand-in for LeoHighlighter, used by jedit.precolorStep to color lines
+    of nodes that are not visible. It remembers only the current state.
+    """
+
+    def __init__(self):
+        self.state = -1
+
+    def currentBlock(self):
+        return None
+
+    def currentBlockState(self):
+        return self.state
+
+    def previousBlockState(self):
+        return self.state
+
+    def setCurrentBlockState(self, n):
+        self.state = n
+
+    def setFormat(self, i, n, format):
+        pass
 #@+node:ekr.20110605121601.18565: ** class LeoHighlighter (QSyntaxHighlighter)
 # Careful: we may be running from the bridge.
 
@@ -128,6 +128,7 @@ class Commands:
         self.expansionNode = None  # The last node we expanded or contracted.
         self.nodeConflictList = []  # List of nodes with conflicting read-time data.
         self.nodeConflictFileName: Optional[str] = None  # The fileName for c.nodeConflictList.
+        self.unl_index = None  # A g.UnlIndex, created by g.getUnlIndex.
         self.user_dict = {}  # Non-persistent dictionary for free use by scripts and plugins.
     #@+node:ekr.20120217070122.10467: *5* c.initEventIvars
     def initEventIvars(self):
@@ -820,10 +821,23 @@ class Commands:
             yield p.v
 
     def all_unique_nodes(self):
-        """A generator returning each vnode of the outline."""
+        """
+        A generator returning each vnode of the outline, in outline order.
+
+        Walk the vnodes directly: creating positions is much slower.
+        """
         c = self
-        for p in c.all_unique_positions(copy=False):
-            yield p.v
+        seen = set()
+        stack = [iter(c.hiddenRootNode.children)]
+        while stack:
+            for v in stack[-1]:
+                if v not in seen:
+                    seen.add(v)
+                    yield v
+                    stack.append(iter(v.children))
+                    break
+            else:
+                stack.pop()
 
     # Compatibility with old code...
 
@@ -1444,12 +1458,13 @@ class Commands:
     #@+node:ekr.20141024211256.22: *4* c.checkGnxs
     def checkGnxs(self):
         """
-        Check the consistency of all gnx's and remove any tnodeLists.
+        Check the consistency of all gnx's.
         Reallocate gnx's for duplicates or empty gnx's.
         Return the number of structure_errors found.
         """
         c = self
-        d: Dict[str, Set["leoNodes.VNode"]] = {}  # Keys are gnx's; values are sets of vnodes with that gnx.
+        d: Dict[str, "leoNodes.VNode"] = {}  # Keys are gnx's; values are the first vnode with that gnx.
+        duplicates: Dict[str, Set["leoNodes.VNode"]] = {}  # Keys are gnx's; values are sets of vnodes with that gnx.
         ni = g.app.nodeIndices
         t1 = time.time()
 
@@ -1458,30 +1473,28 @@ class Commands:
             v.fileIndex = ni.getNewIndex(v)
 
         count, gnx_errors = 0, 0
-        for p in c.safe_all_positions(copy=False):
+        # Clones share vnodes, so checking each vnode once suffices.
+        # all_unique_nodes is safe even if a vnode is its own ancestor.
+        # VNode has __slots__, so old tnodeLists can no longer exist.
+        for v in c.all_unique_nodes():
             count += 1
-            v = p.v
-            if hasattr(v, "tnodeList"):
-                delattr(v, "tnodeList")
-                v._p_changed = True
             gnx = v.fileIndex
             if gnx:  # gnx must be a string.
-                aSet: Set["leoNodes.VNode"] = d.get(gnx, set())
-                aSet.add(v)
-                d[gnx] = aSet
+                v2 = d.setdefault(gnx, v)
+                if v2 is not v:
+                    duplicates.setdefault(gnx, {v2}).add(v)
             else:
                 gnx_errors += 1
                 new_gnx(v)
-                g.es_print(f"empty v.fileIndex: {v} new: {p.v.gnx!r}", color='red')
-        for gnx in sorted(d.keys()):
-            aList = list(d.get(gnx))
-            if len(aList) != 1:
-                print('\nc.checkGnxs...')
-                g.es_print(f"multiple vnodes with gnx: {gnx!r}", color='red')
-                for v in aList:
-                    gnx_errors += 1
-                    g.es_print(f"id(v): {id(v)} gnx: {v.fileIndex} {v.h}", color='red')
-                    new_gnx(v)
+                g.es_print(f"empty v.fileIndex: {v} new: {v.gnx!r}", color='red')
+        for gnx in sorted(duplicates.keys()):
+            aList = list(duplicates.get(gnx))
+            print('\nc.checkGnxs...')
+            g.es_print(f"multiple vnodes with gnx: {gnx!r}", color='red')
+            for v in aList:
+                gnx_errors += 1
+                g.es_print(f"id(v): {id(v)} gnx: {v.fileIndex} {v.h}", color='red')
+                new_gnx(v)
         ok = not gnx_errors and not g.app.structure_errors
         t2 = time.time()
         if not ok:
@@ -988,7 +988,8 @@ class ActiveSettingsOutline:
         Open hidden commanders for leoSettings.leo, myLeoSettings.leo and theme.leo.
         """
         lm = g.app.loadManager
-        lm.readGlobalSettingsFiles()
+        lm.readGlobalSettingsFiles(use_snapshot=False)
+            # The hidden commanders must exist.
         # Make sure to reload the local file.
         c = g.app.commanders()[0]
         fn = c.fileName()
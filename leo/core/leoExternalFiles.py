@@ -6,7 +6,14 @@ import getpass
 import os
 import subprocess
 import tempfile
+import threading
+# Third-party.
+try:
+    from watchdog.observers import Observer
+except Exception:
+    Observer = None
 from leo.core import leoGlobals as g
+from leo.core import leoCache
 #@+others
 #@+node:ekr.20160306110233.1: ** class ExternalFile
 class ExternalFile:
@@ -35,6 +42,104 @@ class ExternalFile:
         """Return True if the external file still exists."""
         return g.os_path_exists(self.path)
     #@-others
+#@+node:tom.20261018140512.1: ** class ExternalFileWatcher
+class ExternalFileWatcher:
+    """
+    A class that reports changes to external files using the watchdog
+    package, which uses inotify, FSEvents or ReadDirectoryChangesW.
+
+    watchdog's observer thread calls dispatch.
+    All other methods run in Leo's main thread.
+    """
+
+    def __init__(self):
+        """Ctor for ExternalFileWatcher class."""
+        self.active = False  # True if the observer is running.
+        self.changed = set()  # Real paths of watched files that have changed.
+        self.dirs = set()  # Watched directories.
+        self.lock = threading.Lock()  # Protects self.changed and self.paths.
+        self.observer = None
+        self.paths = set()  # Real paths of watched files.
+
+    #@+others
+    #@+node:tom.20261018140512.2: *3* watcher.start & stop
+    def start(self):
+        """Start the observer thread. Return True if it is running."""
+        if Observer is None:
+            return False
+        try:
+            self.observer = Observer()
+            self.observer.daemon = True
+            self.observer.start()
+            self.active = True
+        except Exception:
+            g.es_exception()
+            self.observer = None
+        return self.active
+
+    def stop(self):
+        """Stop the observer thread."""
+        if self.observer:
+            try:
+                self.observer.stop()
+            except Exception:
+                pass
+        self.active = False
+        self.observer = None
+    #@+node:tom.20261018140512.3: *3* watcher.dispatch
+    def dispatch(self, event):
+        """
+        Remember changes to watched files.
+
+        Called from watchdog's observer thread for all events in watched
+        directories. Moves report both their source and destination paths.
+        """
+        if getattr(event, 'event_type', None) in ('opened', 'closed_no_write'):
+            return  # Leo's own reads cause these events.
+        for path in (event.src_path, getattr(event, 'dest_path', None)):
+            if path:
+                path = os.path.realpath(os.fsdecode(path))
+                with self.lock:
+                    if path in self.paths:
+                        self.changed.add(path)
+    #@+node:tom.20261018140512.4: *3* watcher.discard & is_changed
+    def discard(self, real_path):
+        """Forget any reported change to real_path."""
+        with self.lock:
+            self.changed.discard(real_path)
+
+    def get_changed(self):
+        """Return a copy of the set of real paths that have changed."""
+        with self.lock:
+            return set(self.changed)
+
+    def is_changed(self, real_path):
+        """Return True if the observer has reported a change to real_path."""
+        with self.lock:
+            return real_path in self.changed
+    #@+node:tom.20261018140512.5: *3* watcher.watch
+    def watch(self, path):
+        """
+        Start watching path, a real path.
+
+        Return True if the caller must check path itself because
+        path was not already being watched.
+        """
+        with self.lock:
+            if path in self.paths:
+                return False
+        directory = os.path.dirname(path)
+        if directory not in self.dirs:
+            try:
+                self.observer.schedule(self, directory, recursive=False)
+            except Exception:
+                # The directory does not exist yet. Try again later.
+                return True
+            self.dirs.add(directory)
+        with self.lock:
+            self.paths.add(path)
+        return True
+    #@-others
 #@+node:ekr.20150405073203.1: ** class ExternalFilesController
 class ExternalFilesController:
     """
@@ -56,6 +161,10 @@ class ExternalFilesController:
     #@+node:ekr.20150404083533.1: *3* efc.ctor
     def __init__(self, c=None):
         """Ctor for ExternalFiles class."""
+        self.at_file_nodes_d = {}
+            # Keys are commanders.
+            # Values are g.Bunches describing c's @<file> nodes.
+            # See efc.get_at_file_nodes.
         self.checksum_d = {}
             # Keys are full paths, values are file checksums.
         self.enabled_d = {}
@@ -67,10 +176,17 @@ class ExternalFilesController:
         self.has_changed_d = {}
             # Keys are commanders. Values are bools.
             # Used only to limit traces.
+        self.real_path_d = {}
+            # Keys are paths, values are g.os_path_realpath(path).
         self.unchecked_commanders = []
             # Copy of g.app.commanders()
         self.unchecked_files = []
             # Copy of self file. Only one files is checked at idle time.
+        self.watch_d = {}
+            # Keys are commanders.
+            # Values are cached @bool watch-external-files settings.
+        self.watcher = None
+            # An ExternalFileWatcher, created by efc.get_watcher.
         self._time_d = {}
             # Keys are full paths, values are modification times.
             # DO NOT alter directly, use set_time(path) and
@@ -168,10 +284,7 @@ class ExternalFilesController:
         # #1100: always scan the entire file for @<file> nodes.
         # #1134: Nested @<file> nodes are no longer valid, but this will do no harm.
         state = 'no'
-        for p in c.all_unique_positions():
-            if not p.isAnyAtFileNode():
-                continue
-            path = g.fullPath(c, p)
+        for p, path in self.get_at_file_nodes_to_check(c):
             if not self.has_changed(path):
                 continue
             # Prevent further checks for path.
@@ -192,6 +305,8 @@ class ExternalFilesController:
     def idle_check_leo_file(self, c):
         """Check c's .leo file for external changes."""
         path = c.fileName()
+        if not self.must_check(c, path):
+            return
         if not self.has_changed(path):
             return
         # Always update the path & time to prevent future warnings.
@@ -482,6 +597,8 @@ class ExternalFilesController:
         for ef in self.files[:]:
             self.destroy_temp_file(ef)
         self.files = []
+        if self.watcher:
+            self.watcher.stop()
     #@+node:ekr.20150405110219.1: *3* efc.utilities
     # pylint: disable=no-value-for-parameter
     #@+node:ekr.20150405200212.1: *4* efc.ask
@@ -527,12 +644,13 @@ class ExternalFilesController:
         return result.lower() if result else 'no'
     #@+node:ekr.20150404052819.1: *4* efc.checksum
     def checksum(self, path):
-        """Return the checksum of the file at the given path."""
-        import hashlib
-        # #1454: Explicitly close the file.
-        with open(path, 'rb') as f:
-            s = f.read()
-        return hashlib.md5(s).hexdigest()
+        """
+        Return the checksum of the file at the given path.
+
+        The shared content-hash cache reads the file only if its size,
+        modification time or inode have changed.
+        """
+        return leoCache.get_content_hasher().get_hash(path)
     #@+node:ekr.20031218072017.2614: *4* efc.destroy_temp_file
     def destroy_temp_file(self, ef):
         """Destroy the *temp* file corresponding to ef, an ExternalFile instance."""
@@ -542,6 +660,78 @@ class ExternalFilesController:
                 os.remove(ef.path)
             except Exception:
                 pass
+    #@+node:tom.20261018140512.6: *4* efc.get_at_file_nodes & get_at_file_nodes_to_check
+    def get_at_file_nodes(self, c):
+        """
+        Return a list of tuples (p, path) for all @<file> nodes p in c.
+
+        Recompute the list only if c's outline, any @<file> headline or any
+        @path directive may have changed since the last call. Low-level vnode
+        methods bump c.frame.tree.generation in the first two cases and
+        c.frame.tree.directive_generation in the last.
+        """
+        return self.get_at_file_data(c).aList
+
+    def get_at_file_nodes_to_check(self, c):
+        """
+        Return a list of tuples (p, path) for all @<file> nodes p in c
+        whose external files may have changed.
+        """
+        data = self.get_at_file_data(c)
+        watcher = self.get_watcher(c)
+        if not watcher:
+            return data.aList
+        # Check new paths, and paths whose directories can not yet be watched.
+        result, pending = [], []
+        for real_path in data.pending:
+            if watcher.watch(real_path):
+                result.extend(data.real_d[real_path])
+                pending.append(real_path)
+        data.pending = [z for z in pending if z not in watcher.paths]
+        # Check only the paths that the watcher says have changed.
+        for real_path in watcher.get_changed():
+            if real_path not in pending:
+                result.extend(data.real_d.get(real_path, []))
+        return result
+    #@+node:tom.20261019031012.34: *5* efc.get_at_file_data & real_path
+    def get_at_file_data(self, c):
+        """
+        Return a g.Bunch describing c's @<file> nodes, recomputing it only
+        when the outline or its directives have changed:
+
+        aList:   a list of tuples (p, path) for all @<file> nodes p in c.
+        real_d:  keys are real paths, values are lists of tuples (p, path).
+        pending: real paths that the watcher is not yet watching.
+        """
+        tree = c.frame.tree
+        key = (tree.generation, tree.directive_generation, c.mFileName)
+        data = self.at_file_nodes_d.get(c)
+        if data and data.key == key:
+            return data
+        aList = [
+            (p, g.fullPath(c, p)) for p in c.all_unique_positions()
+                if p.isAnyAtFileNode()
+        ]
+        real_d = {}
+        for p, path in aList:
+            if path:
+                real_d.setdefault(self.real_path(path), []).append((p, path))
+        watcher = self.watcher
+        data = g.Bunch(
+            key=key,
+            aList=aList,
+            real_d=real_d,
+            pending=[z for z in real_d if not watcher or z not in watcher.paths],
+        )
+        self.at_file_nodes_d[c] = data
+        return data
+
+    def real_path(self, path):
+        """Return the cached real path of the given path."""
+        real_path = self.real_path_d.get(path)
+        if real_path is None:
+            real_path = self.real_path_d[path] = g.os_path_realpath(path)
+        return real_path
     #@+node:ekr.20150407204201.1: *4* efc.get_mtime
     def get_mtime(self, path):
         """Return the modification time for the path."""
@@ -559,6 +749,8 @@ class ExternalFilesController:
         """Return True if the file at path has changed outside of Leo."""
         if not path:
             return False
+        if self.watcher:
+            self.watcher.discard(self.real_path(path))
         if not g.os_path_exists(path):
             return False
         if g.os_path_isdir(path):
@@ -596,6 +788,34 @@ class ExternalFilesController:
             val = c.config.getBool('check-for-changed-external-files', default=False)
             d[c] = val
         return val
+    #@+node:tom.20261018140512.7: *4* efc.get_watcher & must_check
+    def get_watcher(self, c):
+        """
+        Return the ExternalFileWatcher, or None if c should poll external
+        files: @bool watch-external-files is False or watchdog is not installed.
+        """
+        d = self.watch_d
+        val = d.get(c)
+        if val is None:
+            val = c.config.getBool('watch-external-files', default=True)
+            d[c] = val
+        if not val:
+            return None
+        if not self.watcher:
+            self.watcher = ExternalFileWatcher()
+            self.watcher.start()
+        return self.watcher if self.watcher.active else None
+
+    def must_check(self, c, path):
+        """
+        Return True unless the watcher vouches that the file at the given
+        path has not changed since it was last checked.
+        """
+        watcher = path and self.get_watcher(c)
+        if not watcher:
+            return True
+        real_path = self.real_path(path)
+        return watcher.watch(real_path) or watcher.is_changed(real_path)
     #@+node:ekr.20150404083049.1: *4* efc.join
     def join(self, s1, s2):
         """Return s1 + ' ' + s2"""
@@ -4,7 +4,8 @@
 #@+<< imports >>
 #@+node:ekr.20050405141130: ** << imports >> (leoFileCommands)
 import binascii
-from collections import defaultdict
+from collections import defaultdict, OrderedDict
+import concurrent.futures
 from contextlib import contextmanager
 import difflib
 import hashlib
@@ -12,16 +13,18 @@ import io
 import json
 import os
 import pickle
+import re
 import shutil
 import sqlite3
 import tempfile
 import time
-from typing import Dict
+from typing import BinaryIO, Dict, Optional, Tuple
 import zipfile
 import xml.etree.ElementTree as ElementTree
 import xml.sax
 import xml.sax.saxutils
 from leo.core import leoGlobals as g
+from leo.core import leoCache
 from leo.core import leoNodes
 #@-<< imports >>
 PRIVAREA = '---begin-private-area---'
@@ -54,6 +57,86 @@ def dump_gnx_dict(event):
         return
     d = c.fileCommands.gnxDict
     g.printObj(d, tag='gnxDict')
+#@+node:tom.20261019031012.10: ** class BackgroundSaver
+class BackgroundSaver:
+    """
+    Write .leo files in a worker thread, so that saving doesn't block Leo.
+
+    The main thread takes a snapshot of the outline with
+    fc.outline_to_xml_snapshot. The worker thread generates the xml from the
+    snapshot, writes the file and swaps it in. An idle-time handler reports
+    completed saves.
+
+    get_background_saver() returns the singleton BackgroundSaver.
+    """
+
+    def __init__(self):
+        """Ctor for BackgroundSaver class."""
+        self.executor = None
+        self.saves = []  # g.Bunches describing pending saves.
+        if g.app.idleTimeManager:
+            g.app.idleTimeManager.add_callback(self.on_idle)
+
+    #@+others
+    #@+node:tom.20261019031012.11: *3* saver.finish
+    def finish(self, save):
+        """
+        Report the result of one completed save.
+
+        Clear the outline's changed flag only if the outline has not changed
+        since the snapshot was taken.
+        """
+        c = save.c
+        try:
+            save.future.result()
+        except Exception:
+            g.es_print("exception writing:", save.fileName)
+            g.es_exception(full=True)
+            if c.exists:
+                c.setChanged()  # The outline has not been saved.
+            return
+        if not c.exists:
+            return
+        c.setFileTimeStamp(save.fileName)
+        if not save.silent:
+            c.fileCommands.putSavedMessage(save.fileName)
+        if c.fileCommands.snapshot_is_current(save.snapshot):
+            c.fileCommands.clearChangedAfterSave()
+            c.redraw_after_icons_changed()
+    #@+node:tom.20261019031012.12: *3* saver.on_idle
+    def on_idle(self):
+        """Report all completed saves."""
+        for save in [z for z in self.saves if z.future.done()]:
+            self.saves.remove(save)
+            self.finish(save)
+    #@+node:tom.20261019031012.13: *3* saver.start
+    def start(self, c, fileName, path, snapshot, silent=False):
+        """
+        Write snapshot, created by fc.outline_to_xml_snapshot, to path in a
+        worker thread. fileName is the outline's name, which may be a symlink
+        to path.
+        """
+        if not self.executor:
+            # A single worker writes the files in the order they were saved.
+            self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+        encoding = c.fileCommands.leo_file_encoding
+        future = self.executor.submit(write_xml_snapshot, snapshot, path, encoding)
+        self.saves.append(g.Bunch(
+            c=c, fileName=fileName, future=future, silent=silent, snapshot=snapshot))
+        itm = g.app.idleTimeManager
+        if g.unitTesting or not itm or not itm.timer:
+            # There are no idle-time events: wait for the result.
+            self.wait(c)
+    #@+node:tom.20261019031012.14: *3* saver.wait
+    def wait(self, c):
+        """Wait for all pending saves of c to complete, then report them."""
+        saves = [z for z in self.saves if z.c == c]
+        if saves:
+            concurrent.futures.wait([z.future for z in saves])
+            for save in saves:
+                self.saves.remove(save)
+                self.finish(save)
+    #@-others
 #@+node:ekr.20060918164811: ** class BadLeoFile
 class BadLeoFile(Exception):
 
@@ -73,15 +156,18 @@ class FastRead:
         'expanded', 'marks', 't', 'tnodeList',
     )
 
-    def __init__(self, c, gnx2vnode):
+    def __init__(self, c, gnx2vnode, loader=None):
         self.c = c
         self.gnx2vnode = gnx2vnode
+        self.loader = loader  # A LazyBodyLoader or None.
 
     #@+others
     #@+node:ekr.20180604110143.1: *3* fast.readFile
     def readFile(self, theFile, path):
         """Read the file, change splitter ratiors, and return its hidden vnode."""
         s = theFile.read()
+        if self.loader:
+            s = self.loader.strip_bodies(s)
         v, g_element = self.readWithElementTree(path, s)
         if not v:  # #1510.
             return None
@@ -296,6 +382,7 @@ class FastRead:
     def scanVnodes(self, gnx2body, gnx2vnode, gnx2ua, v_elements):
 
         c, fc = self.c, self.c.fileCommands
+        lazy_d = self.loader.index if self.loader else {}
         #@+<< define v_element_visitor >>
         #@+node:ekr.20180605102822.1: *5* << define v_element_visitor >>
         def v_element_visitor(parent_e, parent_v):
@@ -317,10 +404,11 @@ class FastRead:
                     # A clone
                     parent_v.children.append(v)
                     v.parents.append(parent_v)
-                    # The body overrides any previous body text.
-                    body = g.toUnicode(gnx2body.get(gnx) or '')
-                    assert isinstance(body, str), body.__class__.__name__
-                    v._bodyString = body
+                    if gnx not in lazy_d:
+                        # The body overrides any previous body text.
+                        body = g.toUnicode(gnx2body.get(gnx) or '')
+                        assert isinstance(body, str), body.__class__.__name__
+                        v._bodyString = body
                 else:
                     #@+<< Make a new vnode, linked to the parent >>
                     #@+node:ekr.20180605075042.1: *6* << Make a new vnode, linked to the parent >>
@@ -328,9 +416,13 @@ class FastRead:
                     gnx2vnode[gnx] = v
                     parent_v.children.append(v)
                     v.parents.append(parent_v)
-                    body = g.toUnicode(gnx2body.get(gnx) or '')
-                    assert isinstance(body, str), body.__class__.__name__
-                    v._bodyString = body
+                    if gnx in lazy_d:
+                        del v._bodyString  # v.__getattr__ loads the body.
+                        self.loader.vnodes[gnx] = v
+                    else:
+                        body = g.toUnicode(gnx2body.get(gnx) or '')
+                        assert isinstance(body, str), body.__class__.__name__
+                        v._bodyString = body
                     v._headString = 'PLACE HOLDER'
                     #@-<< Make a new vnode, linked to the parent >>
                     #@+<< handle all other v attributes >>
@@ -382,6 +474,149 @@ class FastRead:
         v_element_visitor(v_elements, hidden_v)
         return hidden_v
     #@-others
+#@+node:tom.20261018170012.1: ** class LazyBodyLoader
+class LazyBodyLoader:
+    """
+    Read the body text of vnodes from a .leo or .db file on first use.
+
+    Unloaded vnodes have no v._bodyString ivar, so v.__getattr__ calls
+    loader.load. At most max_bodies loaded bodies stay resident: loading
+    another body drops the least recently loaded body unless it has changed.
+    """
+
+    # Leo escapes '<' in body text, so '</t>' always ends a <t> element.
+    t_pattern = re.compile(rb'<t tx="([^"]*)"(?:\s+[^\s=]+="[^"]*")*\s*>')
+    control_bytes = bytes(z for z in range(20) if chr(z) not in '\t\r\n')
+    # Matches entities other than &amp;, &lt; and &gt;.
+    entity_pattern = re.compile(r'&(?!(?:amp|lt|gt);)')
+
+    def __init__(self, c, path, max_bodies=1000):
+        self.c = c
+        self.path = path
+        self.max_bodies = max_bodies  # <= 0: no limit.
+        self.index: Dict[str, Optional[Tuple[int, int]]] = {}
+            # Keys are the gnxs of all bodies read lazily.
+            # Values are (start, end) offsets in .leo files, None in .db files.
+        self.resident: Dict[leoNodes.VNode, str] = OrderedDict()
+            # Keys are vnodes, values are their loaded body text.
+        self.vnodes: Dict[str, leoNodes.VNode] = {}
+            # Keys are gnxs, values are all vnodes read without their bodies,
+            # including deleted vnodes that undo may restore.
+        self.conn: Optional[sqlite3.Connection] = None  # For .db files.
+        self.theFile: Optional[BinaryIO] = None  # For .leo files.
+        self.loads = 0
+
+    #@+others
+    #@+node:tom.20261018170012.2: *3* loader.close
+    def close(self):
+        """Close the outline file and forget all bodies."""
+        if self.conn:
+            self.conn.close()
+            self.conn = None
+        if self.theFile:
+            self.theFile.close()
+            self.theFile = None
+        self.index.clear()
+        self.resident.clear()
+        self.vnodes.clear()
+    #@+node:tom.20261018170012.3: *3* loader.is_loaded
+    def is_loaded(self, v):
+        """Return True if v._bodyString exists, without loading it."""
+        try:
+            leoNodes.VNode._bodyString.__get__(v)  # Does not call v.__getattr__.
+            return True
+        except AttributeError:
+            return False
+    #@+node:tom.20261018170012.4: *3* loader.load & load_all & load_deleted
+    def load(self, v):
+        """Set and return v._bodyString, dropping old bodies as needed."""
+        s = v._bodyString = self.read_body(v.fileIndex)
+        self.loads += 1
+        if self.max_bodies > 0:
+            resident = self.resident
+            resident.pop(v, None)
+            resident[v] = s
+            while len(resident) > self.max_bodies:
+                v2, s2 = resident.popitem(last=False)
+                if v2._bodyString is s2:  # Nobody has changed the body.
+                    del v2._bodyString
+        return s
+
+    def load_all(self):
+        """
+        Load all unloaded bodies, then close the outline file.
+
+        Use self.vnodes, not fc.gnxDict: deleted vnodes may exist only in
+        the undo stack, and v.__getattr__ can't load them after closing.
+        """
+        for gnx, v in self.vnodes.items():
+            if not self.is_loaded(v):
+                v._bodyString = self.read_body(gnx)
+        self.close()
+
+    def load_deleted(self):
+        """
+        Load the unloaded bodies of deleted vnodes, which undo may restore,
+        before saving the outline file deletes their bodies.
+        """
+        for gnx, v in list(self.vnodes.items()):
+            if not v.parents:
+                if not self.is_loaded(v):
+                    v._bodyString = self.read_body(gnx)
+                # The body is no longer in self.resident, so it stays loaded.
+                self.resident.pop(v, None)
+                del self.vnodes[gnx]
+    #@+node:tom.20261018170012.5: *3* loader.open_db & open_leo_file
+    def open_db(self):
+        """Open a separate connection to the .db file."""
+        self.conn = sqlite3.connect(self.path)
+
+    def open_leo_file(self):
+        """Reopen the .leo file for reading unloaded bodies."""
+        self.theFile = open(self.path, 'rb')
+    #@+node:tom.20261018170012.6: *3* loader.read_body
+    def read_body(self, gnx):
+        """Read the body text of the given gnx from the outline file."""
+        if gnx not in self.index:
+            return ''
+        if self.conn:
+            row = self.conn.execute('select body from vnodes where gnx=?', (gnx,)).fetchone()
+            return (row[0] or '') if row else ''
+        if not self.theFile:
+            raise BadLeoFile(f"body of {gnx} was never read")
+        start, end = self.index[gnx]
+        self.theFile.seek(start)
+        b = self.theFile.read(end - start + 4)
+        if not b.endswith(b'</t>'):
+            raise BadLeoFile(f"{self.path} has changed: can not read the body of {gnx}")
+        # Like FastRead.translate_table. All the deleted bytes are ascii.
+        s = g.toUnicode(b[:-4].translate(None, self.control_bytes))
+        if '\r' not in s:
+            if '&' not in s:
+                return s
+            if not self.entity_pattern.search(s):
+                # Only the entities that xml.sax.saxutils.escape creates.
+                return xml.sax.saxutils.unescape(s)
+        # Resolve entities and line endings exactly as FastRead does.
+        return ElementTree.fromstring(f"<t>{s}</t>").text or ''
+    #@+node:tom.20261018170012.7: *3* loader.strip_bodies
+    def strip_bodies(self, s):
+        """
+        Index the non-empty <t> elements in s, the contents of a .leo file.
+        Return s without their body text.
+        """
+        find, index = s.find, self.index
+        i, result = 0, []
+        for m in self.t_pattern.finditer(s):
+            start = m.end()
+            end = find(b'</t>', start)
+            if end > start:
+                index[m.group(1).decode('utf-8')] = (start, end)
+                result.append(s[i:start])
+                i = end
+        result.append(s[i:])
+        return b''.join(result)
+    #@-others
 #@+node:ekr.20160514120347.1: ** class FileCommands
 class FileCommands:
     """A class creating the FileCommands subcommander."""
@@ -411,6 +646,7 @@ class FileCommands:
         self.leo_file_encoding = c.config.new_leo_file_encoding
         # For reading...
         self.checking = False  # True: checking only: do *not* alter the outline.
+        self.bodyLoader = None  # A LazyBodyLoader, set by fc.getLeoFile.
         self.descendentExpandedList = []
         self.descendentMarksList = []
         self.forbiddenTnodes = []
@@ -422,6 +658,8 @@ class FileCommands:
         self.read_only = False
         self.rootPosition = None
         self.outputFile = None
+        self.db_cache = None
+            # A g.Bunch describing the vnodes table of the last .db file read or written.
         self.openDirectory = None
         self.usingClipboard = False
         self.currentPosition = None
@@ -703,13 +941,14 @@ class FileCommands:
                 g.app.checkForOpenFile(c, fileName)
             #
             # Read the .leo file and create the outline.
+            loader = fc.createBodyLoader(theFile, fileName)
             if fileName.endswith('.db'):
-                v = fc.retrieveVnodesFromDb(theFile) or fc.initNewDb(theFile)
+                v = fc.retrieveVnodesFromDb(theFile, loader, fileName) or fc.initNewDb(theFile)
             elif fileName.endswith('.leojs'):
                 v = fc.read_leojs(theFile, fileName)
                 readAtFileNodesFlag = False  # Suppress post-processing.
             else:
-                v = FastRead(c, self.gnxDict).readFile(theFile, fileName)
+                v = FastRead(c, self.gnxDict, loader).readFile(theFile, fileName)
                 if v:
                     c.hiddenRootNode = v
             if v:
@@ -743,6 +982,38 @@ class FileCommands:
         t2 = time.time()
         g.es(f"read outline in {t2 - t1:2.2f} seconds")
         return v, c.frame.ratio
+    #@+node:tom.20261018170012.8: *5* fc.createBodyLoader
+    def createBodyLoader(self, theFile, fileName):
+        """
+        Return a LazyBodyLoader for fileName if @bool lazy-body-loading is True.
+        Return None for .leojs files and zipped .leo files.
+        """
+        c = self.c
+        if self.bodyLoader:
+            # Don't strand any bodies of the previous outline.
+            self.bodyLoader.load_all()
+            self.bodyLoader = None
+        if not c.config.getBool('lazy-body-loading', default=False):
+            return None
+        max_bodies = c.config.getInt('lazy-body-cache-size')
+        if max_bodies is None:
+            max_bodies = 1000
+        if fileName.endswith('.db'):
+            loader = LazyBodyLoader(c, fileName, max_bodies)
+            loader.open_db()
+        else:
+            path = getattr(theFile, 'name', None)
+            if (
+                fileName.endswith('.leojs')
+                or not isinstance(path, str)
+                or not g.os_path_exists(path)
+                or g.app.loadManager.isZippedFile(path)
+            ):
+                return None
+            loader = LazyBodyLoader(c, path, max_bodies)
+            loader.open_leo_file()
+        self.bodyLoader = loader
+        return loader
     #@+node:ekr.20031218072017.2297: *5* fc.openLeoFile
     def openLeoFile(self, theFile, fileName, readAtFileNodesFlag=True, silent=False):
         """
@@ -855,32 +1126,44 @@ class FileCommands:
         c.frame.resizePanesToRatio(ratio, secondary_ratio)
         return ok
     #@+node:vitalije.20170630152841.1: *5* fc.retrieveVnodesFromDb & helpers
-    def retrieveVnodesFromDb(self, conn):
+    def retrieveVnodesFromDb(self, conn, loader=None, fileName=None):
         """
         Recreates tree from the data contained in table vnodes.
 
         This method follows behavior of readSaxFile.
+
+        loader: A LazyBodyLoader. Read only the length of each body.
+        fileName: The name of the .db file. Remember its rows for exportToSqlite.
         """
 
         c, fc = self.c, self
-        sql = '''select gnx, head,
-             body,
+        sql = f'''select gnx, head,
+             {'length(body)' if loader else 'body'},
              children,
              parents,
              iconVal,
              statusBits,
              ua from vnodes'''
         vnodes = []
+        rows = {}
         try:
             for row in conn.execute(sql):
                 (gnx, h, b, children, parents, iconVal, statusBits, ua) = row
+                # Unloaded bodies have no digest: exportToSqlite doesn't write them.
+                digest = fc.bodyDigest(b) if loader is None else None if b else ''
+                rows[gnx] = (gnx, h, digest, children, parents, iconVal, statusBits, ua)
                 try:
                     ua = pickle.loads(g.toEncodedString(ua))
                 except ValueError:
                     ua = None
                 v = leoNodes.VNode(context=c, gnx=gnx)
                 v._headString = h
-                v._bodyString = b
+                if loader is None:
+                    v._bodyString = b
+                elif b:
+                    loader.index[gnx] = None
+                    loader.vnodes[gnx] = v
+                    del v._bodyString  # v.__getattr__ loads the body.
                 v.children = children.split()
                 v.parents = parents.split()
                 v.iconVal = iconVal
@@ -906,6 +1189,10 @@ class FileCommands:
             v.children = [findNode(x) for x in v.children]
             v.parents = [findNode(x) for x in v.parents]
         c.hiddenRootNode.children = rootChildren
+        fc.db_cache = None
+        if fileName:
+            top_gnxs = [v.gnx for v in rootChildren]
+            fc.db_cache = g.Bunch(path=fileName, rows=rows, top_gnxs=top_gnxs)
         (w, h, x, y, r1, r2, encp) = fc.getWindowGeometryFromDb(conn)
         c.frame.setTopGeometry(w, h, x, y)
         c.frame.resizePanesToRatio(r1, r2)
@@ -1365,19 +1652,23 @@ class FileCommands:
             c.endEditing()  # Set the current headline text.
             self.setDefaultDirectoryForNewFiles(fileName)
             g.app.commander_cacher.save(c, fileName)
+            # Complete any background save first: it sets the file's time stamp.
+            self.finishBackgroundSaves()
             ok = c.checkFileTimeStamp(fileName)
+            background = (
+                c.config.getBool('background-save', default=False)
+                and not fileName.endswith(('.db', '.leojs')))
             if ok:
                 if c.sqlite_connection:
                     c.sqlite_connection.close()
                     c.sqlite_connection = None
-                ok = self.write_Leo_file(fileName)
-            if ok:
+                ok = self.write_Leo_file(fileName, background=background, silent=silent)
+            if ok and not background:
                 if not silent:
                     self.putSavedMessage(fileName)
-                c.clearChanged()  # Clears all dirty bits.
-                if c.config.save_clears_undo_buffer:
-                    g.es("clearing undo")
-                    c.undoer.clearUndoState()
+                self.clearChangedAfterSave()
+            # Otherwise, BackgroundSaver.finish clears the changed flag
+            # when the write succeeds.
             c.redraw_after_icons_changed()
         g.doHook("save2", c=c, p=p, fileName=fileName)
         return ok
@@ -1484,7 +1775,12 @@ class FileCommands:
     #@+node:ekr.20210316034237.1: *4* fc: Writing top-level
     #@+node:vitalije.20170630172118.1: *5* fc.exportToSqlite & helpers
     def exportToSqlite(self, fileName):
-        """Dump all vnodes to sqlite database. Returns True on success."""
+        """
+        Dump all vnodes to sqlite database. Returns True on success.
+
+        Write only changed rows if fc.db_cache describes the file. Rows whose
+        bodies have not been loaded lazily keep the body already in the file.
+        """
         c, fc = self.c, self
         if c.sqlite_connection is None:
             c.sqlite_connection = sqlite3.connect(fileName, isolation_level='DEFERRED')
@@ -1498,28 +1794,86 @@ class FileCommands:
                 g.trace('unpickleable value', repr(v.u))
             return s
 
-        dbrow = lambda v: (
+        loader = fc.bodyLoader
+        cache, fc.db_cache = fc.db_cache, None
+        old_rows = cache.rows if cache and cache.path == fileName else {}
+        vnodes = {}  # Keys are gnxs, values are vnodes.
+        unloaded = set()  # The gnxs of vnodes whose bodies have never been read.
+
+        def dbrow(v):
+            """Return v's row, with a digest of v's body in place of the body."""
+            vnodes[v.gnx] = v
+            if loader and not loader.is_loaded(v):
+                # Don't read the body: it can't have changed.
+                unloaded.add(v.gnx)
+                old_row = old_rows.get(v.gnx)
+                digest = old_row[2] if old_row else None
+            else:
+                digest = fc.bodyDigest(v.b)
+            return (
                 v.gnx,
                 v.h,
-                v.b,
+                digest,
                 ' '.join(x.gnx for x in v.children),
                 ' '.join(x.gnx for x in v.parents),
                 v.iconVal,
                 v.statusBits,
                 dump_u(v)
             )
+
+        def body(gnx):
+            """Return the body of the given gnx, without keeping unloaded bodies."""
+            if gnx in unloaded:
+                return loader.read_body(gnx)
+            return vnodes[gnx].b
+
         ok = False
+        rows = {v.gnx: dbrow(v) for v in c.all_unique_nodes()}
+        top_gnxs = [v.gnx for v in c.hiddenRootNode.children]
         try:
-            fc.prepareDbTables(conn)
+            # All changes happen in a single transaction.
+            if fc.canUpdateDb(conn, fileName, cache, top_gnxs):
+                fc.updateVnodesInSqlite(conn, cache.rows, rows, body, unloaded)
+            else:
+                # Read all bodies before dropping the vnodes table.
+                full_rows = [row[:2] + (body(row[0]),) + row[3:] for row in rows.values()]
+                fc.prepareDbTables(conn)
+                fc.exportVnodesToSqlite(conn, full_rows)
             fc.exportDbVersion(conn)
-            fc.exportVnodesToSqlite(conn, (dbrow(v) for v in c.all_unique_nodes()))
             fc.exportGeomToSqlite(conn)
             fc.exportHashesToSqlite(conn)
             conn.commit()
+            fc.db_cache = g.Bunch(path=fileName, rows=rows, top_gnxs=top_gnxs)
             ok = True
         except sqlite3.Error as e:
+            conn.rollback()
             g.internalError(e)
         return ok
+    #@+node:tom.20261020090000.1: *6* fc.bodyDigest
+    def bodyDigest(self, s):
+        """
+        Return a digest of body text s.
+
+        fc.db_cache stores digests, not body text, so that it doesn't keep
+        bodies in memory.
+        """
+        return hashlib.sha1(s.encode('utf-8', 'surrogatepass')).hexdigest() if s else ''
+    #@+node:tom.20261019031012.21: *6* fc.canUpdateDb
+    def canUpdateDb(self, conn, fileName, cache, top_gnxs):
+        """
+        Return True if cache describes the vnodes table of fileName, so that
+        exportToSqlite need only write changed rows.
+        """
+        if not cache or cache.path != fileName:
+            return False
+        # Only the order of the rows records the order of top-level nodes.
+        if cache.top_gnxs != top_gnxs:
+            return False
+        try:
+            n = conn.execute('select count(*) from vnodes').fetchone()[0]
+        except sqlite3.Error:
+            return False  # There is no vnodes table.
+        return n == len(cache.rows)
     #@+node:vitalije.20170705075107.1: *6* fc.decodePosition
     def decodePosition(self, s):
         """Creates position from its string representation encoded by fc.encodePosition."""
@@ -1567,6 +1921,36 @@ class FileCommands:
             values(?,?,?,?,?,?,?,?);''',
             rows,
         )
+    #@+node:tom.20261019031012.22: *6* fc.updateVnodesInSqlite
+    def updateVnodesInSqlite(self, conn, old_rows, rows, body, unloaded):
+        """
+        Update the vnodes table, whose rows are old_rows, to contain rows.
+        Both are dicts whose keys are gnxs. Rows contain body digests.
+
+        body(gnx) returns the body text of gnx.
+        unloaded is the set of gnxs whose bodies are unchanged in the file.
+        """
+        conn.executemany(
+            'delete from vnodes where gnx=?',
+            [(gnx,) for gnx in old_rows if gnx not in rows])
+        changed = [row for gnx, row in rows.items() if old_rows.get(gnx) != row]
+        # Update rows in place: moving top-level nodes to the end of the
+        # table would change their order.
+        conn.executemany(
+            '''update vnodes set
+            head=?, body=?, children=?, parents=?, iconVal=?, statusBits=?, ua=?
+            where gnx=?;''',
+            [row[1:2] + (body(row[0]),) + row[3:] + row[:1]
+                for row in changed if row[0] in old_rows and row[0] not in unloaded])
+        conn.executemany(
+            '''update vnodes set
+            head=?, children=?, parents=?, iconVal=?, statusBits=?, ua=?
+            where gnx=?;''',
+            [row[1:2] + row[3:] + row[:1]
+                for row in changed if row[0] in old_rows and row[0] in unloaded])
+        self.exportVnodesToSqlite(conn, [
+            row[:2] + (body(row[0]),) + row[3:]
+                for row in changed if row[0] not in old_rows])
     #@+node:vitalije.20170701162052.1: *6* fc.exportGeomToSqlite
     def exportGeomToSqlite(self, conn):
         c = self.c
@@ -1590,20 +1974,31 @@ class FileCommands:
     #@+node:vitalije.20170701162204.1: *6* fc.exportHashesToSqlite
     def exportHashesToSqlite(self, conn):
         c = self.c
+        hasher = leoCache.get_content_hasher()
+        loader = self.bodyLoader
+        # The gnxs of rows whose bodies contain @ignore directives.
+        # The file contains the bodies of all unloaded vnodes.
+        ignored = set()
+        if loader:
+            for gnx, b in conn.execute("select gnx, body from vnodes where body like '%@ignore%'"):
+                if g.is_special(b or '', '@ignore')[0]:
+                    ignored.add(gnx)
+
+        def isAtIgnoreNode(p):
+            if loader and not loader.is_loaded(p.v):
+                # Don't load the body.
+                return g.match_word(p.h, 0, '@ignore') or p.gnx in ignored
+            return p.isAtIgnoreNode()
 
         def md5(x):
-            try:
-                s = open(x, 'rb').read()
-            except Exception:
-                return ''
-            s = s.replace(b'\r\n', b'\n')
-            return hashlib.md5(s).hexdigest()
+            # The shared hasher rereads only files that have changed.
+            return hasher.get_hash(x) or ''
 
         files = set()
 
         p = c.rootPosition()
         while p:
-            if p.isAtIgnoreNode():
+            if isAtIgnoreNode(p):
                 p.moveToNodeAfterTree()
             elif p.isAtAutoNode() or p.isAtFileNode():
                 fn = c.getNodeFileName(p)
@@ -1647,28 +2042,136 @@ class FileCommands:
     def outline_to_xml_string(self):
         """Return the file xml format as a string."""
         self.outputFile = io.StringIO()
-        self.putProlog()
-        self.putHeader()
-        self.putGlobals()
-        self.putPrefs()
-        self.putFindSettings()
-        self.putVnodes()
-        self.putTnodes()
-        self.putPostlog()
+        self.putOutline()
         s = self.outputFile.getvalue()
         self.outputFile = None
         return s
+    #@+node:tom.20261019031012.15: *5* fc.outline_to_xml_snapshot
+    def outline_to_xml_snapshot(self):
+        """
+        Return a snapshot of the outline from which write_xml_snapshot can
+        write the .leo file, in any thread.
+
+        The snapshot holds references to the outline's (immutable) headline
+        and body strings and copies of the children lists, not xml. Only the
+        choices that depend on Leo's state are made here: which vnodes to
+        write, and the pickled unknownAttributes.
+
+        The snapshot is a g.Bunch with these ivars:
+
+        header: The xml before the <vnodes> element.
+        nodes:  Keys are all vnodes, values are (headline, body, children).
+        vnodes: The <v> elements, in order, as (gnx, attrs, headline, has_children).
+                headline is None for clones already written. None ends an element.
+        tnodes: The <t> elements, as (gnx, attrs, body).
+        """
+        c, fc = self.c, self
+        # Put everything before the <vnodes> element, as putOutline does.
+        fc.outputFile = io.StringIO()
+        try:
+            fc.putProlog()
+            fc.putHeader()
+            fc.putGlobals()
+            fc.putPrefs()
+            fc.putFindSettings()
+            header = fc.outputFile.getvalue()
+        finally:
+            fc.outputFile = None
+        # Capture all vnodes, and cache the expanded and marked bits.
+        nodes = {}
+        expanded, marked = [], []
+        for v in c.all_unique_nodes():
+            nodes[v] = (v._headString, v._bodyString, tuple(v.children))
+            if v.isExpanded():
+                expanded.append(v.gnx)
+            if v.isMarked():
+                marked.append(v.gnx)
+        fc.currentPosition = c.p
+        fc.setCachedBits(expanded, marked)
+        # Choose the <v> and <t> elements, as putVnodes and putTnodes do.
+        vnodes, written, seen = [], {}, set()
+
+        def put_vnode(v, childIndex, stack, isIgnore):
+            h, b, children = nodes[v]
+            gnx = v.fileIndex
+            # Only @<file> nodes may have unwritten bodies and children.
+            forceWrite = (
+                isIgnore
+                or not h.startswith('@')
+                or not fc.isAtFileTree(v, children)
+                or v.isAtIgnoreNode())
+            attrs = ''
+            if forceWrite:
+                written[v] = True
+            elif children:
+                p = leoNodes.Position(v, childIndex, stack[:])
+                attrs = fc.putDescendentVnodeUas(p)
+            if gnx in seen:
+                vnodes.append((gnx, attrs, None, False))
+            elif children and forceWrite:
+                seen.add(gnx)
+                vnodes.append((gnx, attrs, h, True))
+                stack.append((v, childIndex))
+                for i, child in enumerate(children):
+                    put_vnode(child, i, stack, isIgnore)
+                stack.pop()
+                vnodes.append(None)
+            else:
+                seen.add(gnx)
+                vnodes.append((gnx, attrs, h, False))
+
+        for i, v in enumerate(c.hiddenRootNode.children):
+            put_vnode(v, i, [], v.isAtIgnoreNode())
+        tnodes = [
+            (v.fileIndex, fc.putUnknownAttributes(v) if hasattr(v, 'unknownAttributes') else '', nodes[v][1])
+                for v in written]
+        return g.Bunch(header=header, nodes=nodes, tnodes=tnodes, vnodes=vnodes)
+    #@+node:tom.20261019031012.47: *6* fc.isAtFileTree
+    def isAtFileTree(self, v, children):
+        """
+        Return True if v is an @<file> node whose body and children
+        fc.putVnode need not write. children is v's list of children.
+        """
+        return bool(
+            v.isAtAutoNode() and v.atAutoNodeName().strip()
+            or v.isAtEditNode() and v.atEditNodeName().strip() and not children
+            or v.isAtFileNode()
+            or v.isAtShadowFileNode()
+            or v.isAtThinFileNode())
+    #@+node:tom.20261019031012.48: *6* fc.snapshot_is_current
+    def snapshot_is_current(self, snapshot):
+        """
+        Return True if the outline's headlines, bodies and structure are
+        exactly those captured by fc.outline_to_xml_snapshot.
+        """
+        nodes = snapshot.nodes
+        n = 0
+        for v in self.c.all_unique_nodes():
+            data = nodes.get(v)
+            if not data:
+                return False
+            h, b, children = data
+            if v._headString is not h or v._bodyString is not b or tuple(v.children) != children:
+                return False
+            n += 1
+        return n == len(nodes)
     #@+node:ekr.20031218072017.3046: *5* fc.write_Leo_file
-    def write_Leo_file(self, fileName):
+    def write_Leo_file(self, fileName, background=False, silent=False):
+        """
+        Write all external files and the .leo file itself.
+
+        background: write the .leo file in a worker thread.
         """
-        Write all external files and the .leo file itself."""
         c, fc = self.c, self
         if c.checkOutline():
             g.error('Structural errors in outline! outline not written')
             return False
         g.app.recentFilesManager.writeRecentFilesFile(c)
         fc.writeAllAtFileNodes()  # Ignore any errors.
-        return fc.writeOutline(fileName)
+        ok = fc.writeOutline(fileName, background=background, silent=silent)
+        if ok:
+            c.findCommands.save_find_index()
+        return ok
 
     write_LEO_file = write_Leo_file  # For compatibility with old plugins.
     #@+node:ekr.20210316050301.1: *5* fc.write_leojs & helpers
@@ -1751,28 +2254,31 @@ class FileCommands:
             'children': [self.leojs_vnode(child) for child in v.children]
         }
     #@+node:ekr.20100119145629.6111: *5* fc.write_xml_file
-    def write_xml_file(self, fileName):
-        """Write the .leo file as xml."""
+    def write_xml_file(self, fileName, background=False, silent=False):
+        """
+        Write the .leo file as xml.
+
+        Stream the encoded xml to a temp file in the same directory, then
+        replace fileName with the temp file. The old file stays intact until
+        the new file is complete.
+
+        background: write the file in a worker thread.
+        """
         c = self.c
-        ok, backupName = self.createBackupFile(fileName)
-        if not ok:
-            return False
-        f = self.openOutlineForWriting(fileName)
-        if not f:
-            return False
+        # Replace the target of a symlink, not the symlink itself.
+        path = os.path.realpath(fileName)
         self.mFileName = fileName
         try:
-            s = self.outline_to_xml_string()
-            s = bytes(s, self.leo_file_encoding, 'replace')
-            f.write(s)
-            f.close()
+            snapshot = self.outline_to_xml_snapshot()
+            if background:
+                get_background_saver().start(c, fileName, path, snapshot, silent=silent)
+                return True
+            write_xml_snapshot(snapshot, path, self.leo_file_encoding)
             c.setFileTimeStamp(fileName)
-            # Delete backup file.
-            if backupName and g.os_path_exists(backupName):
-                self.deleteBackupFile(backupName)
             return True
         except Exception:
-            self.handleWriteLeoFileException(fileName, backupName, f)
+            g.es("exception writing:", fileName)
+            g.es_exception(full=True)
             return False
     #@+node:ekr.20100119145629.6114: *5* fc.writeAllAtFileNodes
     def writeAllAtFileNodes(self):
@@ -1793,7 +2299,7 @@ class FileCommands:
             g.es('can save each changed file.', color='red')
             return False
     #@+node:ekr.20210316041806.1: *5* fc.writeOutline (write switch)
-    def writeOutline(self, fileName):
+    def writeOutline(self, fileName, background=False, silent=False):
 
         c = self.c
         if c.checkOutline():
@@ -1801,11 +2307,21 @@ class FileCommands:
             return False
         if self.isReadOnly(fileName):
             return False
+        loader = self.bodyLoader
+        if loader and g.os_path_exists(fileName) and os.path.samefile(fileName, loader.path):
+            if fileName.endswith('.db'):
+                # exportToSqlite leaves unloaded bodies in the file,
+                # so the loader can still read them lazily.
+                loader.load_deleted()
+            else:
+                # Don't overwrite bodies that haven't been read yet.
+                loader.load_all()
+                self.bodyLoader = None
         if fileName.endswith('.db'):
             return self.exportToSqlite(fileName)
         if fileName.endswith('.leojs'):
             return self.write_leojs(fileName)
-        return self.write_xml_file(fileName)
+        return self.write_xml_file(fileName, background=background, silent=silent)
     #@+node:ekr.20070412095520: *5* fc.writeZipFile
     def writeZipFile(self, s):
         """Write string s as a .zip file."""
@@ -1823,6 +2339,19 @@ class FileCommands:
         theFile.writestr(contentsName, s)  # type:ignore
         theFile.close()
     #@+node:ekr.20210316034532.1: *4* fc.Writing Utils
+    #@+node:tom.20261019031012.49: *5* fc.clearChangedAfterSave
+    def clearChangedAfterSave(self):
+        """Clear the changed flag and all dirty bits after a successful save."""
+        c = self.c
+        c.clearChanged()  # Clears all dirty bits.
+        if c.config.save_clears_undo_buffer:
+            g.es("clearing undo")
+            c.undoer.clearUndoState()
+    #@+node:tom.20261019031012.16: *5* fc.finishBackgroundSaves
+    def finishBackgroundSaves(self):
+        """Wait for all background saves of this outline, then report them."""
+        if background_saver:
+            background_saver.wait(self.c)
     #@+node:ekr.20080805085257.2: *5* fc.pickle
     def pickle(self, torv, val, tag):
         """Pickle val and return the hexlified result."""
@@ -1922,6 +2451,17 @@ class FileCommands:
     #@+node:ekr.20031218072017.3042: *5* fc.putPostlog
     def putPostlog(self):
         self.put("</leo_file>\n")
+    #@+node:tom.20261019031012.8: *5* fc.putOutline
+    def putOutline(self):
+        """Put the entire outline in .leo file format to self.outputFile."""
+        self.putProlog()
+        self.putHeader()
+        self.putGlobals()
+        self.putPrefs()
+        self.putFindSettings()
+        self.putVnodes()
+        self.putTnodes()
+        self.putPostlog()
     #@+node:ekr.20031218072017.2066: *5* fc.putPrefs
     def putPrefs(self):
         # New in 4.3:  These settings never get written to the .leo file.
@@ -1966,7 +2506,6 @@ class FileCommands:
 
     #@+node:ekr.20031218072017.1577: *5* fc.putTnode
     def putTnode(self, v):
-        # Call put just once.
         gnx = v.fileIndex
         # pylint: disable=consider-using-ternary
         ua = hasattr(v, 'unknownAttributes') and self.putUnknownAttributes(v) or ''
@@ -2116,18 +2655,23 @@ class FileCommands:
             self.setCachedBits()
         self.put("</vnodes>\n")
     #@+node:ekr.20190328160622.1: *6* fc.setCachedBits
-    def setCachedBits(self):
+    def setCachedBits(self, expanded=None, marked=None):
         """
         Set the cached expanded and marked bits for *all* nodes.
         Also cache the current position.
+
+        expanded and marked are lists of the gnx's of expanded and marked
+        nodes, in outline order, or None.
         """
         trace = 'cache' in g.app.debug
         c = self.c
         if not c.mFileName:
             return  # New.
         current = [str(z) for z in self.currentPosition.archivedPosition()]
-        expanded = [v.gnx for v in c.all_unique_nodes() if v.isExpanded()]
-        marked = [v.gnx for v in c.all_unique_nodes() if v.isMarked()]
+        if expanded is None:
+            expanded = [v.gnx for v in c.all_unique_nodes() if v.isExpanded()]
+        if marked is None:
+            marked = [v.gnx for v in c.all_unique_nodes() if v.isMarked()]
         c.db['expanded'] = ','.join(expanded)
         c.db['marked'] = ','.join(marked)
         c.db['current_position'] = ','.join(current)
@@ -2146,6 +2690,82 @@ class FileCommands:
             f'"{self.leo_file_encoding}"'
             f"{g.app.prolog_postfix_string}\n")
     #@-others
+#@+node:tom.20261019031012.17: ** function: get_background_saver
+background_saver = None
+
+def get_background_saver():
+    """Return the singleton BackgroundSaver, creating it if necessary."""
+    global background_saver
+    if not background_saver:
+        background_saver = BackgroundSaver()
+    return background_saver
+#@+node:tom.20261019031012.7: ** function: open_temp_file
+def open_temp_file(path, encoding, buffer_size=1 << 16):
+    """
+    Create a temp file in the directory containing path.
+
+    Return (f, tempName), where f is a text file that encodes its output
+    with the given encoding.
+    """
+    theDir, name = os.path.split(os.path.abspath(path))
+    fd, tempName = tempfile.mkstemp(prefix=f".{name}.", suffix='.tmp', dir=theDir)
+    try:
+        # mkstemp makes the file private. Use the mode of the file being replaced.
+        if os.path.exists(path):
+            shutil.copymode(path, tempName)
+        else:
+            umask = os.umask(0)
+            os.umask(umask)
+            os.chmod(tempName, 0o666 & ~umask)
+    except Exception:
+        pass  # os.chmod may fail on some file systems.
+    # newline='' writes newlines exactly as given.
+    f = open(fd, 'w', encoding=encoding, errors='replace',
+        newline='', buffering=buffer_size)
+    return f, tempName
+#@+node:tom.20261019031012.18: ** function: write_xml_snapshot
+def write_xml_snapshot(snapshot, path, encoding):
+    """
+    Write snapshot, created by fc.outline_to_xml_snapshot, to a temp file
+    as xml. Replace path with the temp file when it is complete.
+
+    The xml is streamed to the file: it is never held in memory.
+    This function may run in a worker thread.
+    """
+    escape = xml.sax.saxutils.escape
+    f, tempName = open_temp_file(path, encoding)
+    try:
+        with f:
+            put = f.write
+            put(snapshot.header)
+            put("<vnodes>\n")
+            for item in snapshot.vnodes:
+                if item is None:
+                    put('</v>\n')
+                    continue
+                gnx, attrs, h, has_children = item
+                if h is None:
+                    put(f'<v t="{gnx}"{attrs}></v>\n')
+                elif has_children:
+                    put(f'<v t="{gnx}"{attrs}><vh>{escape(h or "")}</vh>\n')
+                else:
+                    put(f'<v t="{gnx}"{attrs}><vh>{escape(h or "")}</vh></v>\n')
+            put("</vnodes>\n")
+            put("<tnodes>\n")
+            for gnx, ua, b in sorted(snapshot.tnodes):
+                put(f'<t tx="{gnx}"{ua}>')
+                if b:
+                    put(escape(b))
+                put('</t>\n')
+            put("</tnodes>\n")
+            put("</leo_file>\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tempName, path)
+    except BaseException:
+        if os.path.exists(tempName):
+            os.remove(tempName)
+        raise
 #@-others
 #@@language python
 #@@tabwidth -4
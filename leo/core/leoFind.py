@@ -1,12 +1,23 @@
 #@+leo-ver=5-thin
 #@+node:ekr.20060123151617: * @file leoFind.py
 """Leo's gui-independent find classes."""
+import concurrent.futures
+import hashlib
 import keyword
+import multiprocessing
+import os
 import re
 import sys
 import time
+from typing import Any, Dict, Tuple, TYPE_CHECKING
+import zlib
 from leo.core import leoGlobals as g
 
+if TYPE_CHECKING:  # Always False at runtime.
+    from leo.core.leoNodes import VNode
+else:
+    VNode = Any
+
 #@+<< Theory of operation of find/change >>
 #@+node:ekr.20031218072017.2414: ** << Theory of operation of find/change >>
 #@@language rest
@@ -117,8 +128,12 @@ class LeoFind:
         self.request_whole_word = False
         # Internal state...
         self.changeAllFlag = False
+        self.change_all_min_nodes = 1000  # Smaller searches are done in this process.
+        self.change_all_report = ''  # A timing report for the last change-all.
         self.findAllUniqueFlag = False
+        self.find_candidates = None  # None or a set of vnodes that might match.
         self.find_def_data = None
+        self.find_index = None  # A FindIndex, created on first use.
         self.in_headline = False
         self.match_obj = None
         self.reverse = False
@@ -203,6 +218,11 @@ class LeoFind:
         c = self.c
         self.minibuffer_mode = c.config.getBool('minibuffer-find-mode', default=False)
         self.reverse_find_defs = c.config.getBool('reverse-find-defs', default=False)
+        self.use_find_index = c.config.getBool('use-find-index', default=False)
+        # Off by default: workers have not been measured to be faster.
+        # More workers than cpus would only add overhead.
+        self.change_all_workers = min(
+            c.config.getInt('change-all-workers') or 0, os.cpu_count() or 1)
     #@+node:ekr.20210108053422.1: *3* find.batch_change (script helper) & helpers
     def batch_change(self, root, replacements, settings=None):
         #@+<< docstring: find.batch_change >>
@@ -267,17 +287,26 @@ class LeoFind:
         self.work_sel = (0, 0, 0)
         # The main loop.
         u.beforeChangeGroup(p1, undoType)
+        positions = self._unique_vnode_positions(positions)
+        changes = self._change_all_in_processes(positions)
         count = 0
         for p in positions:
             count_h, count_b = 0, 0
+            if changes is not None:
+                # The changes have already been computed.
+                if p.v.gnx not in changes:
+                    continue
+                count_h, new_h, count_b, new_b = changes.pop(p.v.gnx)
             undoData = u.beforeChangeNodeContents(p)
             if self.search_headline:
-                count_h, new_h = self._change_all_search_and_replace(p.h)
+                if changes is None:
+                    count_h, new_h = self._change_all_search_and_replace(p.h)
                 if count_h:
                     count += count_h
                     p.h = new_h
             if self.search_body:
-                count_b, new_b = self._change_all_search_and_replace(p.b)
+                if changes is None:
+                    count_b, new_b = self._change_all_search_and_replace(p.b)
                 if count_b:
                     count += count_b
                     p.b = new_b
@@ -285,7 +314,7 @@ class LeoFind:
                 u.afterChangeNodeContents(p1, 'Replace All', undoData)
         u.afterChangeGroup(p1, undoType, reportFlag=True)
         if not g.unitTesting:  # pragma: no cover
-            print(f"{count:3}: {find_text:>30} => {change_text}")
+            print(f"{count:3}: {find_text:>30} => {change_text}{self.change_all_report}")
         return count
     #@+node:ekr.20210108083003.1: *4* find._init_from_dict
     def _init_from_dict(self, settings):
@@ -1038,7 +1067,7 @@ class LeoFind:
 
         c, current, u = self.c, self.c.p, self.c.undoer
         undoType = 'Replace All'
-        t1 = time.process_time()
+        t1 = time.perf_counter()
         if not self.check_args('change-all'):  # pragma: no cover
             return 0
         self.init_in_headline()
@@ -1071,17 +1100,26 @@ class LeoFind:
             positions = c.p.self_and_subtree()
         else:
             positions = c.all_unique_positions()
+        positions = self._unique_vnode_positions(positions)
+        changes = self._change_all_in_processes(positions)
         count = 0
         for p in positions:
             count_h, count_b = 0, 0
+            if changes is not None:
+                # The changes have already been computed.
+                if p.v.gnx not in changes:
+                    continue
+                count_h, new_h, count_b, new_b = changes.pop(p.v.gnx)
             undoData = u.beforeChangeNodeContents(p)
             if self.search_headline:
-                count_h, new_h = self._change_all_search_and_replace(p.h)
+                if changes is None:
+                    count_h, new_h = self._change_all_search_and_replace(p.h)
                 if count_h:
                     count += count_h
                     p.h = new_h
             if self.search_body:
-                count_b, new_b = self._change_all_search_and_replace(p.b)
+                if changes is None:
+                    count_b, new_b = self._change_all_search_and_replace(p.b)
                 if count_b:
                     count += count_b
                     p.b = new_b
@@ -1093,15 +1131,73 @@ class LeoFind:
         self.node_only = self.suboutline_only = False
         p = c.p
         u.afterChangeGroup(p, undoType, reportFlag=True)
-        t2 = time.process_time()
+        t2 = time.perf_counter()
         if not g.unitTesting:  # pragma: no cover
             g.es_print(
                 f"changed {count} instances{g.plural(count)} "
-                f"in {t2 - t1:4.2f} sec.")
+                f"in {t2 - t1:4.2f} sec.{self.change_all_report}")
         c.recolor()
         c.redraw(p)
         self.restore(saveData)
         return count
+    #@+node:tom.20261018201012.1: *6* find._change_all_in_processes
+    def _change_all_in_processes(self, positions):
+        """
+        Compute all changes to the given positions in a pool of worker processes.
+
+        Return None if the changes should be computed in this process.
+        Otherwise, return a dict: keys are gnx's of changed nodes; values are
+        tuples (count_h, new_h, count_b, new_b).
+        """
+        self.change_all_report = ''
+        n = self.change_all_workers
+        if n < 2 or len(positions) < max(1, self.change_all_min_nodes):
+            return None
+        t1 = time.perf_counter()
+        items = [
+            (
+                p.v.gnx,
+                p.h if self.search_headline else None,
+                p.b if self.search_body else None,
+            ) for p in positions
+        ]
+        ivars = {
+            z: getattr(self, z) for z in (
+                'change_text', 'find_text', 'ignore_case', 'pattern_match', 'whole_word')
+        }
+        # Several chunks per worker balance the load.
+        size = max(1, len(items) // (4 * n) + 1)
+        chunks = [items[i : i + size] for i in range(0, len(items), size)]
+        changes = {}
+        try:
+            context = multiprocessing.get_context('spawn')
+            with concurrent.futures.ProcessPoolExecutor(
+                max_workers=n, mp_context=context,
+            ) as executor:
+                futures = [
+                    executor.submit(change_all_worker, ivars, chunk) for chunk in chunks]
+                for future in futures:
+                    for gnx, count_h, new_h, count_b, new_b in future.result():
+                        changes[gnx] = (count_h, new_h, count_b, new_b)
+        except Exception:
+            g.es_exception()
+            return None  # Fall back to the serial code.
+        t2 = time.perf_counter()
+        self.change_all_report = (
+            f" ({len(items)} nodes searched in {t2 - t1:4.2f} sec. by {n} processes)")
+        return changes
+    #@+node:tom.20261019031012.36: *6* find._unique_vnode_positions
+    def _unique_vnode_positions(self, positions):
+        """
+        Return a list of the given positions, keeping only the first position
+        of each vnode, so that change-all changes cloned nodes only once.
+        """
+        result, seen = [], set()
+        for p in positions:
+            if p.v not in seen:
+                seen.add(p.v)
+                result.append(p.copy())
+        return result
     #@+node:ekr.20190602134414.1: *6* find._change_all_search_and_replace & helpers
     def _change_all_search_and_replace(self, s):
         """
@@ -1602,10 +1698,12 @@ class LeoFind:
         old_sparse_find = c.sparse_find
         try:
             c.sparse_find = False
+            self.find_candidates = self.get_find_candidates()
             count = self._find_all_helper(after, data, p, 'Find All')
             c.contractAllHeadlines()
         finally:
             c.sparse_find = old_sparse_find
+            self.find_candidates = None
             self.root = None
         if count:
             c.redraw()
@@ -1626,7 +1724,7 @@ class LeoFind:
                 line_number = 1
             log.put(line.strip() + '\n', nodeLink=f"{unl},{line_number}")
 
-        seen = []  # List of (vnode, pos).
+        seen = set()  # Set of (vnode, pos).
         both = self.search_body and self.search_headline
         count, found, result = 0, None, []
         while 1:
@@ -1635,7 +1733,7 @@ class LeoFind:
                 break
             if (p.v, pos) in seen:  # 2076
                 continue  # pragma: no cover
-            seen.append((p.v, pos))
+            seen.add((p.v, pos))
             count += 1
             s = self.work_s
             i, j = g.getLine(s, pos)
@@ -1984,10 +2082,14 @@ class LeoFind:
             after = None
         count, found = 0, None
         clones, skip = [], set()
+        candidates = self.get_find_candidates()
         while p and p != after:
             progress = p.copy()
             if p.v in skip:  # pragma: no cover (minor)
                 p.moveToThreadNext()
+            elif candidates is not None and p.v not in candidates:
+                # p can't match, but its descendants might.
+                p.moveToThreadNext()
             elif g.inAtNosearch(p):
                 p.moveToNodeAfterTree()
             elif self._cfa_find_next_match(p):
@@ -2149,6 +2251,24 @@ class LeoFind:
             if not g.unitTesting:  # pragma: no cover (skip)
                 g.warning('invalid regular expression:', self.find_text)
             return False
+    #@+node:tom.20261018181512.6: *4* find.get_find_candidates & save_find_index
+    def get_find_candidates(self):
+        """
+        Return the set of vnodes that might match a plain search for
+        self.find_text, or None if all nodes must be searched.
+        """
+        if not self.use_find_index or self.pattern_match:
+            return None
+        if not self.find_index:
+            self.find_index = FindIndex(self.c)
+        pattern = self.replace_back_slashes(self.find_text)
+        return self.find_index.candidates(pattern,
+            headline=self.search_headline, body=self.search_body)
+
+    def save_find_index(self):
+        """Save the find index in the commander's cache."""
+        if self.find_index:
+            self.find_index.save()
     #@+node:ekr.20031218072017.3075: *4* find.find_next_match & helpers
     def find_next_match(self, p):
         """
@@ -2166,8 +2286,12 @@ class LeoFind:
             ok = self.precompile_pattern()
             if not ok:
                 return None, None, None
+        candidates = self.find_candidates
         while p:
-            pos, newpos = self._fnm_search(p)
+            if candidates is None or p.v in candidates:
+                pos, newpos = self._fnm_search(p)
+            else:
+                pos = None  # Neither pane can match.
             if pos is not None:
                 # Success.
                 if self.mark_finds:  # pragma: no cover
@@ -2188,6 +2312,8 @@ class LeoFind:
                 # Switch to the next/prev node, if possible.
                 attempts += 1
                 p = self._fnm_next_after_fail(p)
+                while p and candidates is not None and p.v not in candidates:
+                    p = self._fnm_next_after_fail(p)  # Skip nodes that can't match.
                 if p:  # Found another node: select the proper pane.
                     self.in_headline = self._fnm_first_search_pane()
                     s = p.h if self.in_headline else p.b
@@ -3010,6 +3136,211 @@ class LeoFind:
         if s not in self.findTextList:
             self.findTextList.append(s)
     #@-others
+#@+node:tom.20261018181512.1: ** class FindIndex
+class FindIndex:
+    """
+    A token index of the headlines and body text of all vnodes.
+
+    The index holds two signatures for each vnode: Bloom filters, stored
+    as ints, of the words in v.h and v.b, ignoring case. The words of a
+    plain search pattern tell which words any matching text must contain:
+    the pattern's inner words exactly, its first and last words as the
+    end or start of some word. The index narrows the search to vnodes
+    whose signatures might contain such words. These vnodes are only
+    candidates: the find commands search them as usual, so the results
+    never change.
+
+    The index remembers the strings it has indexed, and recomputes
+    signatures only for vnodes whose text has changed since.
+    """
+
+    cache_key = 'find-index'
+    cache_version = 1
+    max_expansions = 32  # Ignore partial words that start, end or occur in more words.
+    word_pattern = re.compile(r'\w+')
+
+    def __init__(self, c):
+        self.c = c
+        self.cached: Dict[str, Tuple[bytes, int, int]] = {}
+            # Signatures from c.db. Keys are gnxs, values are (digest, h_sig, b_sig).
+        self.d: Dict[VNode, Tuple[str, str, bytes, int, int]] = {}
+            # Keys are vnodes, values are (h, b, digest, h_sig, b_sig).
+        self.loaded = False  # True: self.cached has been read from c.db.
+        self.updates = 0  # The number of (h_sig, b_sig) pairs computed.
+        self.words: Dict[str, Tuple[int, int]] = {}
+            # Keys are all indexed words, values are their two hashes.
+
+    #@+others
+    #@+node:tom.20261018181512.2: *3* index.candidates
+    def candidates(self, pattern, headline=True, body=True):
+        """
+        Return the set of vnodes whose headline or body might contain the
+        plain search pattern, or None if the index can't narrow the search.
+        """
+        if '\r' in pattern:
+            return None  # The find code may remove '\r' from the searched text.
+        text = pattern.casefold()
+        matches = list(self.word_pattern.finditer(text))
+        if not matches:
+            return None
+        self.update()
+        words = self.words
+        exact, alternatives = [], []
+        for m in matches:
+            word = m.group(0)
+            at_start, at_end = m.start() == 0, m.end() == len(text)
+            if not at_start and not at_end:
+                if word not in words:
+                    return set()
+                exact.append(word)
+                continue
+            if at_start and at_end:
+                aList = [z for z in words if word in z]
+            elif at_start:
+                aList = [z for z in words if z.endswith(word)]
+            else:
+                aList = [z for z in words if z.startswith(word)]
+            if not aList:
+                return set()
+            if len(aList) <= self.max_expansions:
+                alternatives.append(aList)
+        if not exact and not alternatives:
+            return None
+        masks: Dict[int, Tuple[int, list]] = {}  # Keys are signature sizes.
+
+        def might_match(sig):
+            n = sig.bit_length() - 1
+            if n < 0:
+                return False  # No words.
+            data = masks.get(n)
+            if data is None:
+                data = masks[n] = (
+                    self.signature_of(exact, n),
+                    [[self.signature_of([z], n) for z in aList] for aList in alternatives],
+                )
+            mask, alt_masks = data
+            if sig & mask != mask:
+                return False
+            return all(any(sig & z == z for z in aList) for aList in alt_masks)
+
+        return {
+            v for v, (h, b, digest, h_sig, b_sig) in self.d.items()
+                if headline and might_match(h_sig) or body and might_match(b_sig)
+        }
+    #@+node:tom.20261018181512.3: *3* index.load & save
+    def load(self):
+        """Load the cached signatures and words from c.db."""
+        self.loaded = True
+        try:
+            data = self.c.db.get(self.cache_key)
+        except Exception:
+            data = None
+        if isinstance(data, dict) and data.get('version') == self.cache_version:
+            # The cached signatures are valid only with all the cached words.
+            for word in data.get('words', []):
+                self.words[word] = self.hash_word(word)
+            self.cached = data.get('nodes', {})
+
+    def save(self):
+        """Save all signatures and words in c.db."""
+        c = self.c
+        if not c.mFileName or not self.d:
+            return
+        try:
+            c.db[self.cache_key] = {
+                'version': self.cache_version,
+                'words': list(self.words),
+                'nodes': {
+                    v.fileIndex: (digest, h_sig, b_sig)
+                        for v, (h, b, digest, h_sig, b_sig) in self.d.items()
+                },
+            }
+        except Exception:
+            g.es_exception()
+    #@+node:tom.20261018181512.4: *3* index.signature & helpers
+    def signature(self, s):
+        """
+        Return the signature of s: an int whose highest bit is bit n, where
+        n is a power of two at least 16 times the number of s's distinct
+        words. Three hashes of each word set the other bits.
+        """
+        words = set(self.word_pattern.findall(s.replace('\r', '').casefold()))
+        if not words:
+            return 0
+        n = 64
+        while n < 16 * len(words):
+            n *= 2
+        return self.signature_of(words, n)
+
+    def signature_of(self, words, n):
+        """Return the signature of the given words for size n."""
+        d, mask = self.words, n - 1
+        bits = bytearray(n >> 3)
+        for word in words:
+            codes = d.get(word)
+            if codes is None:
+                codes = d[word] = self.hash_word(word)
+            a, b = codes
+            for code in (a, a + b, a + b + b):
+                code &= mask
+                bits[code >> 3] |= 1 << (code & 7)
+        return int.from_bytes(bits, 'little') | (1 << n)
+
+    def hash_word(self, word):
+        """Return two hashes of word that are the same in every process."""
+        s = word.encode('utf-8', 'surrogatepass')
+        return zlib.crc32(s), zlib.crc32(s, 0x9e3779b9) | 1
+    #@+node:tom.20261018181512.5: *3* index.update
+    def update(self):
+        """Recompute the signatures of all new or changed vnodes."""
+        if not self.loaded:
+            self.load()
+        cached, d = self.cached, self.d
+        n = 0
+        for v in self.c.all_unique_nodes():
+            n += 1
+            h, b = v._headString, v._bodyString
+            entry = d.get(v)
+            if entry and entry[0] is h and entry[1] is b:
+                continue
+            sha = hashlib.sha1(h.encode('utf-8', 'surrogatepass'))
+            sha.update(b'\0')
+            sha.update(b.encode('utf-8', 'surrogatepass'))
+            digest = sha.digest()
+            if entry and entry[2] == digest:
+                d[v] = (h, b, digest, entry[3], entry[4])
+                continue
+            data = cached.pop(v.fileIndex, None)
+            if data and data[0] == digest:
+                d[v] = (h, b, digest, data[1], data[2])
+                continue
+            self.updates += 1
+            d[v] = (h, b, digest, self.signature(h), self.signature(b))
+        if len(d) > n:
+            # Forget deleted vnodes.
+            self.d = {v: d[v] for v in self.c.all_unique_nodes()}
+    #@-others
+#@+node:tom.20261018201012.2: ** function: change_all_worker
+def change_all_worker(ivars: Dict[str, Any], items: list) -> list:
+    """
+    Compute change-all results in a worker process.
+
+    ivars: a dict of LeoFind ivars describing the find and change patterns.
+    items: a list of tuples (gnx, h, b). h or b is None if it is not searched.
+
+    Return a list of tuples (gnx, count_h, new_h, count_b, new_b),
+    one for each changed node.
+    """
+    # The search methods use only these ivars, so no commander is needed.
+    find = LeoFind.__new__(LeoFind)
+    find.__dict__.update(ivars)
+    result = []
+    for gnx, h, b in items:
+        count_h, new_h = find._change_all_search_and_replace(h) if h else (0, None)
+        count_b, new_b = find._change_all_search_and_replace(b) if b else (0, None)
+        if count_h or count_b:
+            result.append((gnx, count_h, new_h, count_b, new_b))
+    return result
 #@-others
 #@@language python
 #@@tabwidth -4
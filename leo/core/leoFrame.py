@@ -1311,6 +1311,8 @@ class LeoTree:
         self.generation = 0
             # Leo 5.6: low-level vnode methods increment
             # this count whenever the tree changes.
+        self.directive_generation = 0
+            # v.setBodyString increments this count whenever an @path directive may have changed.
         self.redrawCount = 0  # For traces
         self.use_chapters = False  # May be overridden in subclasses.
         # Define these here to keep pylint happy.
@@ -46,8 +46,9 @@ import webbrowser
 if TYPE_CHECKING:  # Always False at runtime.
     from leo.core.leoCommands import Commands as Cmdr
     from leo.core.leoNodes import Position as Pos
+    from leo.core.leoNodes import VNode
 else:
-    Cmdr = Pos = Any
+    Cmdr = Pos = VNode = Any
 #
 # Abbreviations...
 StringIO = io.StringIO
@@ -2510,6 +2511,188 @@ class UiTypeException(Exception):
 def assertUi(uitype):
     if not g.app.gui.guiName() == uitype:
         raise UiTypeException
+#@+node:tom.20261019031012.28: *3* class g.UnlIndex & g.getUnlIndex
+class UnlIndex:
+    """
+    An index of the vnodes of one outline, keyed by headline.
+
+    The index holds each vnode once. Lookups build positions by walking up
+    v.parents, so they always reflect the outline's current structure. The
+    index is rebuilt lazily whenever tree.generation changes, and
+    v.setHeadString updates it when a headline changes.
+
+    Some code sets headlines directly, without calling v.setHeadString, so
+    headlines are checked before positions are returned.
+    g.recursiveUNLFind falls back to searching the outline when the index
+    finds nothing.
+    """
+
+    def __init__(self, c: Cmdr):
+        self.c = c
+        self.builds = 0  # Statistics.
+        self.enabled = True  # False: g.recursiveUNLFind ignores the index.
+        self.key: Optional[int] = None  # The tree's generation when the index was built.
+        self.heads_d: Dict[str, Set[VNode]] = {}  # Keys are headlines, values are sets of vnodes.
+    #@+others
+    #@+node:tom.20261019031012.29: *4* ui.build
+    def build(self) -> None:
+        """Build the index with a single traversal of the outline's vnodes."""
+        heads_d: Dict[str, Set[VNode]] = {}
+        for v in self.c.all_unique_nodes():
+            aSet = heads_d.get(v.h)
+            if aSet is None:
+                aSet = heads_d[v.h] = set()
+            aSet.add(v)
+        self.key = self.c.frame.tree.generation
+        self.heads_d = heads_d
+        self.builds += 1
+    #@+node:tom.20261019031012.30: *4* ui.find
+    def find(self, unlList: List[str]) -> Optional[Pos]:
+        """
+        Return the position whose headlines match all elements of unlList,
+        or None.
+
+        Like g.recursiveUNLFind, prefer the nth like-named sibling when an
+        element specifies a count, and otherwise the first match in outline
+        order.
+        """
+        aList = self.positions(tuple(self.target(z) for z in unlList))
+        if not aList:
+            return None
+        nths = [recursiveUNLParts(z)[1] for z in unlList]
+        if len(aList) == 1 or not any(nths):
+            return aList[0]
+        hidden_v = self.c.hiddenRootNode
+
+        def key(p: Pos) -> List[Tuple[int, int]]:
+            result = []
+            parent_v = hidden_v
+            for (v, n), nth in zip(p.stack + [(p.v, p._childIndex)], nths):
+                rank = sum(1 for z in parent_v.children[:n] if z.h == v.h)
+                result.append((0 if nth and rank == nth else 1, n))
+                parent_v = v
+            return result
+
+        return min(aList, key=key)
+    #@+node:tom.20261019031012.31: *4* ui.find_tail
+    def find_tail(self, unlList: List[str]) -> Tuple[int, Optional[Pos]]:
+        """
+        Return (n, p), where p is the only node whose headline path ends with
+        the longest possible tail of unlList, and n is the length of that tail.
+
+        Return (0, None) if no such node exists.
+        """
+        targets = tuple(self.target(z) for z in unlList)
+        best_n, best_vnodes = 0, []
+        for v in self.vnodes(targets[-1]):
+            n = self.tail_length(v, targets)
+            if n > best_n:
+                best_n, best_vnodes = n, [v]
+            elif n == best_n:
+                best_vnodes.append(v)
+        if len(best_vnodes) != 1:
+            return 0, None
+        stacks = self.stacks(best_vnodes[0], targets[-best_n:], top=False)
+        aList = self.to_positions(stacks)
+        return (best_n, aList[0]) if aList else (0, None)
+    #@+node:tom.20261019031012.32: *4* ui.positions & helpers
+    def positions(self, path: Tuple[str, ...]) -> List[Pos]:
+        """Return the list of all positions whose headline path is path, in outline order."""
+        # Start with the element of path that has the fewest vnodes.
+        i = min(range(len(path)), key=lambda i: len(self.vnodes(path[i])))
+        stacks: List[List[Tuple[VNode, int]]] = []
+        for v in self.vnodes(path[i]):
+            for stack in self.stacks(v, path[: i + 1], top=True):
+                stacks.extend(self.descend(stack, path[i + 1 :]))
+        return self.to_positions(stacks)
+
+    def descend(self, stack: List[Tuple[VNode, int]], path: Tuple[str, ...]) -> List[List[Tuple[VNode, int]]]:
+        """
+        Return the list of stacks that extend stack with descendants whose
+        headlines match path.
+        """
+        stacks = [stack]
+        for h in path:
+            stacks = [
+                stack + [(child, n)]
+                    for stack in stacks
+                        for n, child in enumerate(stack[-1][0].children) if child.h == h]
+            if not stacks:
+                break
+        return stacks
+
+    def stacks(self, v: VNode, path: Tuple[str, ...], top: bool) -> List[List[Tuple[VNode, int]]]:
+        """
+        Return a list of stacks, lists of (vnode, childIndex) pairs, one for
+        each position of v whose headline path ends with path.
+
+        top: the path must start at a top-level node.
+        """
+        if v.h != path[-1]:
+            return []
+        hidden_v = self.c.hiddenRootNode
+        result = []
+        for parent_v in dict.fromkeys(v.parents):  # Clones may appear twice.
+            if parent_v is hidden_v:
+                if len(path) > 1:
+                    continue  # path is too long.
+                parent_stacks = [[]]
+            elif len(path) > 1:
+                parent_stacks = self.stacks(parent_v, path[:-1], top)
+            elif top:
+                continue  # path is too short.
+            else:
+                # Any headline path of parent_v will do.
+                parent_stacks = self.stacks(parent_v, (parent_v.h,), top=False)
+            if parent_stacks:
+                indices = [i for i, z in enumerate(parent_v.children) if z is v]
+                result.extend(stack + [(v, i)] for stack in parent_stacks for i in indices)
+        return result
+
+    def tail_length(self, v: VNode, path: Tuple[str, ...]) -> int:
+        """Return the length of the longest tail of path that is a headline path of v."""
+        if len(path) == 1:
+            return 1
+        hidden_v = self.c.hiddenRootNode
+        n = 0
+        for parent_v in dict.fromkeys(v.parents):
+            if parent_v is not hidden_v and parent_v.h == path[-2]:
+                n = max(n, self.tail_length(parent_v, path[:-1]))
+        return n + 1
+
+    def to_positions(self, stacks: List[List[Tuple[VNode, int]]]) -> List[Pos]:
+        """Return the positions corresponding to stacks, in outline order."""
+        from leo.core import leoNodes
+        stacks.sort(key=lambda stack: [n for v, n in stack])
+        return [leoNodes.Position(stack[-1][0], stack[-1][1], stack[:-1]) for stack in stacks]
+
+    def vnodes(self, h: str) -> Set[VNode]:
+        """Return the set of all vnodes whose headline is h."""
+        if self.key != self.c.frame.tree.generation:
+            self.build()
+        return self.heads_d.get(h, set())
+
+    def target(self, s: str) -> str:
+        """Return the headline part of s, an element of a UNL."""
+        return g_pos_pattern.sub('', s).replace('--%3E', '-->')
+    #@+node:tom.20261019031012.50: *4* ui.update_headline
+    def update_headline(self, v: VNode, old: str) -> None:
+        """Called by v.setHeadString: index v by its new headline."""
+        if self.key is None:
+            return  # Not built yet.
+        aSet = self.heads_d.get(old)
+        if aSet:
+            aSet.discard(v)
+            if not aSet:
+                del self.heads_d[old]
+        self.heads_d.setdefault(v.h, set()).add(v)
+    #@-others
+
+def getUnlIndex(c: Cmdr) -> UnlIndex:
+    """Return c's UnlIndex, creating it if necessary."""
+    if c.unl_index is None:
+        c.unl_index = UnlIndex(c)
+    return c.unl_index
 #@+node:ekr.20200219071828.1: *3* class TestLeoGlobals (leoGlobals.py)
 class TestLeoGlobals(unittest.TestCase):
     """Tests for leoGlobals.py."""
@@ -4375,11 +4558,22 @@ def recursiveUNLFind(unlList, c: Cmdr, depth=0, p: Pos=None, maxdepth=0, maxp=No
     - `p`: part of recursion, don't set explicitly
     - `maxdepth`: part of recursion, don't set explicitly
     - `maxp`: part of recursion, don't set explicitly
+
+    g.getUnlIndex(c) resolves UNLs matching all their headlines without
+    searching the outline. With soft_idx, the index also finds a node
+    that has moved, if it is the only node matching the longest tail of
+    unlList.
     """
     if depth == 0:
-        nds = list(c.rootPosition().self_and_siblings())
         unlList = [i.replace('--%3E', '-->') for i in unlList if i.strip()]
         # drop empty parts so "-->node name" works
+        index = g.getUnlIndex(c)
+        if index.enabled and unlList and not hard_idx:
+            # Most links match all their headlines: try the index first.
+            p = index.find(unlList)
+            if p:
+                return True, len(unlList) - 1, p.copy()
+        nds = list(c.rootPosition().self_and_siblings())
     else:
         nds = list(p.children())  # type:ignore
     heads = [i.h for i in nds]
@@ -4442,32 +4636,11 @@ def recursiveUNLFind(unlList, c: Cmdr, depth=0, p: Pos=None, maxdepth=0, maxp=No
             # else keep looking through nds
     if depth == 0 and maxp:  # inexact match
         g.es('Partial UNL match')
-    if soft_idx and depth + 2 < len(unlList):
-        aList = []
-        for p in c.all_unique_positions():
-            if any(p.h.replace('--%3E', '-->') in unl for unl in unlList):  # type:ignore
-                aList.append((p.copy(), p.get_UNL(False, False, True)))  # type:ignore
-        maxcount = 0
-        singleMatch = True
-        for iter_unl in aList:
-            count = 0
-            compare_list = unlList[:]
-            for header in reversed(iter_unl[1].split('-->')):
-                if (re.sub(g_pos_pattern, "", header).replace('--%3E', '-->') ==
-                     compare_list[-1]
-                ):
-                    count = count + 1
-                    compare_list.pop(-1)
-                else:
-                    break
-            if count > maxcount:
-                p = iter_unl[0]
-                singleMatch = True
-            elif count == maxcount:
-                singleMatch = False
-        if maxcount and singleMatch:
-            maxp = p
-            maxdepth = p.level()  # type:ignore
+    if soft_idx and depth == 0 and len(unlList) > 2 and index.enabled:
+        # The node may have moved: look for the longest matching tail.
+        n, p = index.find_tail(unlList)
+        if n:
+            maxdepth, maxp = n, p.copy()  # type:ignore
     return False, maxdepth, maxp
 #@+node:tbrown.20171221094755.1: *4* g.recursiveUNLParts
 def recursiveUNLParts(text):
@@ -4837,6 +5010,8 @@ def find_on_line(s: str, i: int, pattern):
 def is_special(s: str, directive):
     """Return True if the body text contains the @ directive."""
     assert(directive and directive[0] == '@')
+    if directive not in s:
+        return False, -1  # An optimization: most bodies contain no directives.
     lws = directive in ("@others", "@all")
         # Most directives must start the line.
     pattern_s = r'^\s*(%s\b)' if lws else r'^(%s\b)'
@@ -4,9 +4,11 @@
 #@@first
 #@+<< imports >>
 #@+node:ekr.20091224155043.6539: ** << imports >> (leoImport)
+import concurrent.futures
 import csv
 import io
 import json
+import multiprocessing
 import os
 import re
 import textwrap
@@ -1657,6 +1659,7 @@ class RecursiveImportController:
         safe_at_file=True,
         theTypes=None,
         ignore_pattern=None,
+        workers=None,  # Override setting only if not None.
     ):
         """Ctor for RecursiveImportController class."""
         self.c = c
@@ -1668,6 +1671,14 @@ class RecursiveImportController:
         self.safe_at_file = safe_at_file
         self.theTypes = theTypes
         self.ignore_pattern = ignore_pattern or re.compile(r'\.git|node_modules')
+        # Parallel imports...
+        if workers is None:
+            workers = c.config.getInt('recursive-import-workers') or 0
+        self.workers = workers
+        self.min_parallel_files = 20  # Import fewer files in this process.
+        self.parsed = {}  # Keys are paths, values are trees created by import_files_worker.
+        self.serial_importers = ('JSON_Scanner',)  # Importers that must run in this process.
+        self.timings = {}  # Keys are importer names, values are [n_files, seconds].
         # #1605:
 
         def set_bool(setting, val):
@@ -1697,6 +1708,8 @@ class RecursiveImportController:
             parent.v.h = 'imported files'
             # Leo 5.6: Special case for a single file.
             self.n_files = 0
+            self.timings = {}
+            self.parse_in_processes(dir_)
             if g.os_path_isfile(dir_):
                 g.es_print('\nimporting file:', dir_)
                 self.import_one_file(dir_, parent)
@@ -1719,13 +1732,36 @@ class RecursiveImportController:
             f"imported {n} node{g.plural(n)} "
             f"in {self.n_files} file{g.plural(self.n_files)} "
             f"in {t2 - t1:2.2f} seconds")
-    #@+node:ekr.20130823083943.12597: *4* ric.import_dir
+        for name, (n, seconds) in sorted(self.timings.items()):
+            g.es_print(f"{name:>20}: {n:4} file{g.plural(n)} in {seconds:5.2f} sec.")
+    #@+node:ekr.20130823083943.12597: *4* ric.import_dir & helper
     def import_dir(self, dir_, parent):
         """Import selected files from dir_, a directory."""
+        if not g.os_path_isfile(dir_):
+            g.es_print('importing directory:', dir_)
+        files, files2, dirs = self.scan_dir(dir_)
+        if files or dirs:
+            assert parent and parent.v != self.root.v, g.callers()
+            parent = parent.insertAsLastChild()
+            parent.v.h = dir_
+            if files2:
+                for f in files2:
+                    if not self.ignore_pattern.search(f):
+                        self.import_one_file(f, parent=parent)
+            if dirs:
+                assert self.recursive
+                for dir_ in sorted(dirs):
+                    self.import_dir(dir_, parent)
+    #@+node:tom.20261019001012.1: *5* ric.scan_dir
+    def scan_dir(self, dir_):
+        """
+        Return (files, files2, dirs) for dir_: all the names in dir_, the
+        paths of the files to import and the paths of the directories to
+        import.
+        """
         if g.os_path_isfile(dir_):
             files = [dir_]
         else:
-            g.es_print('importing directory:', dir_)
             files = os.listdir(dir_)
         dirs, files2 = [], []
         for path in files:
@@ -1743,19 +1779,8 @@ class RecursiveImportController:
             except OSError:
                 g.es_print('Exception computing', path)
                 g.es_exception()
-        if files or dirs:
-            assert parent and parent.v != self.root.v, g.callers()
-            parent = parent.insertAsLastChild()
-            parent.v.h = dir_
-            if files2:
-                for f in files2:
-                    if not self.ignore_pattern.search(f):
-                        self.import_one_file(f, parent=parent)
-            if dirs:
-                assert self.recursive
-                for dir_ in sorted(dirs):
-                    self.import_dir(dir_, parent)
-    #@+node:ekr.20170404103953.1: *4* ric.import_one_file
+        return files, files2, dirs
+    #@+node:ekr.20170404103953.1: *4* ric.import_one_file & helpers
     def import_one_file(self, path, parent):
         """Import one file to the last top-level node."""
         c = self.c
@@ -1767,19 +1792,122 @@ class RecursiveImportController:
             s, e = g.readFileIntoString(path, kind=self.kind)
             p.v.b = s
             return
-        # #1484: Use this for @auto as well.
-        c.importCommands.importFilesCommand(
-            files=[path],
-            parent=parent,
-            redrawFlag=False,
-            shortFn=True,
-            treeType='@file',  # '@auto','@clean','@nosent' cause problems.
-        )
+        tree = self.parsed.pop(path, None)
+        if tree:
+            self.create_imported_file(path, parent, tree)
+        else:
+            t1 = time.perf_counter()
+            # #1484: Use this for @auto as well.
+            c.importCommands.importFilesCommand(
+                files=[path],
+                parent=parent,
+                redrawFlag=False,
+                shortFn=True,
+                treeType='@file',  # '@auto','@clean','@nosent' cause problems.
+            )
+            self.add_timing(importer_name(path), time.perf_counter() - t1)
         p = parent.lastChild()
         p.h = self.kind + p.h[5:]
             # Bug fix 2017/10/27: honor the requested kind.
         if self.safe_at_file:
             p.v.h = '@' + p.v.h
+    #@+node:tom.20261019001012.2: *5* ric.add_timing
+    def add_timing(self, name, seconds):
+        """Add the time taken by one file to the totals for the named importer."""
+        aList = self.timings.setdefault(name, [0, 0.0])
+        aList[0] += 1
+        aList[1] += seconds
+    #@+node:tom.20261019001012.3: *5* ric.create_imported_file
+    def create_imported_file(self, path, parent, tree):
+        """
+        Create the last child of parent from tree, a description of the file's
+        outline created by import_files_worker.
+
+        This does what ic.importFilesCommand does for a single file.
+        """
+        c, u = self.c, self.c.undoer
+        undoData = u.beforeInsertNode(parent)
+        p = parent.insertAsLastChild()
+        p.h = f"@file {path}"
+        u.afterInsertNode(p, 'Import', undoData)
+
+        def create(p, tree):
+            h, b, uA, children = tree
+            p.v.h, p.v.b = h, b
+            if uA is not None:
+                p.v.u = uA
+            for child_tree in children:
+                create(p.insertAsLastChild(), child_tree)
+
+        create(p, tree)
+        if not g.unitTesting:
+            g.blue("imported", g.shortFileName(path))
+            c.atFileCommands.rememberReadPath(g.fullPath(c, p), p)
+        p.contract()
+        p.setDirty()
+        c.setChanged()
+        parent.expand()
+    #@+node:tom.20261019001012.4: *4* ric.parse_in_processes & helper
+    def parse_in_processes(self, dir_):
+        """
+        Import all files in dir_ in a pool of worker processes, setting
+        self.parsed. Keys are paths; values are descriptions of the imported
+        outlines. Files not in self.parsed are imported in this process.
+        """
+        c = self.c
+        self.parsed = {}
+        n = self.workers
+        if n < 2 or self.kind == '@edit':
+            return
+        paths = [
+            z for z in self.collect_files(dir_)
+                if importer_name(z) not in self.serial_importers]
+        if len(paths) < max(1, self.min_parallel_files):
+            return
+        t1 = time.perf_counter()
+        # Workers resolve paths exactly as ic.createOutline does in this process.
+        base = c.scanAtPathDirectives([])
+        # Several chunks per worker balance the load.
+        size = max(1, len(paths) // (4 * n) + 1)
+        chunks = [paths[i : i + size] for i in range(0, len(paths), size)]
+        try:
+            context = multiprocessing.get_context('spawn')
+            with concurrent.futures.ProcessPoolExecutor(
+                max_workers=n,
+                mp_context=context,
+                initializer=init_import_worker,
+                initargs=(c.config.settingsDict, c.config.shortcutsDict, base),
+            ) as executor:
+                futures = [executor.submit(import_files_worker, chunk) for chunk in chunks]
+                for future in futures:
+                    try:
+                        results = future.result()
+                    except Exception:
+                        # Import these files in this process.
+                        g.es_exception()
+                        continue
+                    for path, tree, name, seconds in results:
+                        if tree:
+                            self.parsed[path] = tree
+                            self.add_timing(name, seconds)
+        except Exception:
+            g.es_exception()
+            self.parsed = {}  # Fall back to the serial code.
+            return
+        t2 = time.perf_counter()
+        g.es_print(
+            f"parsed {len(self.parsed)} file{g.plural(len(self.parsed))} "
+            f"in {t2 - t1:2.2f} seconds using {n} processes")
+    #@+node:tom.20261019001012.5: *5* ric.collect_files
+    def collect_files(self, dir_):
+        """Return the paths of all files that import_dir will import, in order."""
+        if g.os_path_isfile(dir_):
+            return [dir_]
+        files, files2, dirs = self.scan_dir(dir_)
+        result = [z for z in files2 if not self.ignore_pattern.search(z)]
+        for dir_ in sorted(dirs):
+            result.extend(self.collect_files(dir_))
+        return result
     #@+node:ekr.20130823083943.12607: *4* ric.post_process & helpers
     def post_process(self, p, prefix):
         """
@@ -2608,6 +2736,62 @@ def parse_body_command(event):
     c = event.get('c')
     if c and c.p:
         c.importCommands.parse_body(c.p)
+#@+node:tom.20261019001012.6: ** recursive import workers
+# The commander used by import_files_worker.
+import_worker_commander = None
+
+def init_import_worker(settingsDict, shortcutsDict, openDirectory):
+    """Create the commander for imports in a worker process."""
+    global import_worker_commander
+    from leo.core import leoApp, leoBridge
+    leoBridge.controller(gui='nullGui',
+        loadPlugins=False, readSettings=False, silent=True, verbose=False)
+    c = g.app.newCommander('',
+        previousSettings=leoApp.PreviousSettings(settingsDict, shortcutsDict))
+    c.frame.createFirstTreeNode()
+    c.openDirectory = openDirectory
+    import_worker_commander = c
+
+def import_files_worker(paths):
+    """
+    Import files into a scratch outline in a worker process.
+
+    Return a list of tuples (path, tree, importer, seconds), where tree
+    describes the imported @file node: a tuple (h, b, u, children) in which
+    children is a list of such tuples. u is None if the node has no
+    unknownAttributes. tree is None if the import created clones.
+    """
+    c = import_worker_commander
+    result = []
+    for path in paths:
+        t1 = time.perf_counter()
+        parent = c.lastTopLevel().insertAfter()
+        c.importCommands.importFilesCommand(
+            files=[path],
+            parent=parent,
+            redrawFlag=False,
+            shortFn=True,
+            treeType='@file',
+        )
+        p = parent.lastChild()
+        tree = None
+        if p and not any(z.isCloned() for z in p.self_and_subtree(copy=False)):
+            tree = describe_tree(p.v)
+        result.append((path, tree, importer_name(path), time.perf_counter() - t1))
+        parent.doDelete()
+        c.undoer.clearUndoState()
+    return result
+
+def describe_tree(v):
+    """Return a tuple (h, b, u, children) describing v and its descendants."""
+    uA = getattr(v, 'unknownAttributes', None)
+    return (v.h, v.b, uA or None, [describe_tree(z) for z in v.children])
+
+def importer_name(path):
+    """Return the name of the importer class for path."""
+    junk, ext = g.os_path_splitext(path)
+    aClass = g.app.classDispatchDict.get(ext.lower())
+    return aClass.__name__ if aClass else 'no importer'
 #@-others
 #@@language python
 #@@tabwidth -4
@@ -10,7 +10,7 @@ import copy
 import itertools
 import time
 import re
-from typing import Dict, List, Optional, Tuple  # Any, Callable, Generator, Sequence, Union
+from typing import List, Optional, Tuple  # Any, Callable, Generator, Sequence, Union
 from leo.core import leoGlobals as g
 from leo.core import signal_manager
 from leo.core.leoCommands import Commands as Cmdr
@@ -2039,8 +2039,8 @@ class VNode:
         self.context: Cmdr = context  # The context containing context.hiddenRootNode.
             # Required so we can compute top-level siblings.
             # It is named .context rather than .c to emphasize its limited usage.
-        self.expandedPositions: List[Position] = []
-            # Positions that should be expanded.
+        # v.expandedPositions: Positions that should be expanded.
+            # v.__getattr__ allocates this list on first use.
         self.insertSpot: Optional[int] = None
             # Location of previous insert point.
         self.scrollBarSpot: Optional[int] = None
@@ -2050,8 +2050,8 @@ class VNode:
         self.selectionStart = 0
             # The start of the selected body text.
         #
-        # For at.read logic.
-        self.at_read: Dict[str, set] = {}
+        # v.at_read: For at.read logic.
+            # at.rememberReadPath allocates this dict on first use.
         #
         # To make VNode's independent of Leo's core,
         # wrap all calls to the VNode ctor::
@@ -2061,6 +2061,28 @@ class VNode:
         #       g.app.nodeIndices.new_vnode_helper(c,gnx,v)
         g.app.nodeIndices.new_vnode_helper(context, gnx, self)
         assert self.fileIndex, g.callers()
+    #@+node:tom.20261018111203.1: *4* v.__getattr__
+    def __getattr__(self, attr):
+        """
+        Allocate rarely-used mutable attributes on first use.
+
+        Python calls this method only for unset slots and unknown attributes,
+        so allocating v.expandedPositions lazily saves an empty list per node.
+
+        v._bodyString is unset only when @bool lazy-body-loading is in effect:
+        fc.bodyLoader reads the body text from the outline file on first use.
+        """
+        if attr == 'expandedPositions':
+            self.expandedPositions = []
+            return self.expandedPositions
+        if attr == '_bodyString':
+            fc = getattr(self.context, 'fileCommands', None)
+            loader = getattr(fc, 'bodyLoader', None)
+            if loader:
+                return loader.load(self)
+            self._bodyString = ''
+            return self._bodyString
+        raise AttributeError(f"{self.__class__.__name__!r} object has no attribute {attr!r}")
     #@+node:ekr.20031218072017.3345: *4* v.__repr__ & v.__str__
     def __repr__(self):
         return f"<VNode {self.gnx} {self.headString()}>"
@@ -2522,23 +2544,39 @@ class VNode:
     #@+node:ekr.20040315032144: *4* v.setBodyString & v.setHeadString
     def setBodyString(self, s):
         v = self
+        try:
+            old = VNode._bodyString.__get__(v)  # Does not load a lazy body.
+            old_path = '@path' in old
+        except AttributeError:
+            old_path = True  # The unloaded body may contain @path.
         if isinstance(s, str):
             v._bodyString = s
-            return
-        v._bodyString = g.toUnicode(s, reportErrors=True)
-        self.contentModified()  # #1413.
-        signal_manager.emit(self.context, 'body_changed', self)
+        else:
+            v._bodyString = g.toUnicode(s, reportErrors=True)
+            self.contentModified()  # #1413.
+            signal_manager.emit(self.context, 'body_changed', self)
+        if (old_path or '@path' in v._bodyString) and v.context.frame:
+            # The paths of @<file> nodes may have changed.
+            v.context.frame.tree.directive_generation += 1
 
     def setHeadString(self, s):
         # Fix bug: https://bugs.launchpad.net/leo-editor/+bug/1245535
         # API allows headlines to contain newlines.
         v = self
+        old = v._headString
         if isinstance(s, str):
             v._headString = s.replace('\n', '')
-            return
-        s = g.toUnicode(s, reportErrors=True)
-        v._headString = s.replace('\n', '')  # type:ignore
-        self.contentModified()  # #1413.
+        else:
+            s = g.toUnicode(s, reportErrors=True)
+            v._headString = s.replace('\n', '')  # type:ignore
+            self.contentModified()  # #1413.
+        if v._headString != old and v.context.frame:
+            tree = v.context.frame.tree
+            if old.startswith('@') or v._headString.startswith('@'):
+                # The set of @<file> nodes may have changed.
+                tree.generation += 1
+            if v.context.unl_index:
+                v.context.unl_index.update_headline(v, old)
 
     initBodyString = setBodyString
     initHeadString = setHeadString
@@ -42,6 +42,7 @@
 #
 # I first saw this model of unlimited undo in the documentation for Apple's Yellow Box classes.
 #@-<< How Leo implements unlimited undo >>
+import sys
 from leo.core import leoGlobals as g
 # pylint: disable=unpacking-non-sequence
 #@+others
@@ -49,6 +50,10 @@ from leo.core import leoGlobals as g
 def cmd(name):
     """Command decorator for the Undoer class."""
     return g.new_cmd_decorator(name, ['c', 'undoer',])
+#@+node:tom.20261019031012.40: ** class BodyDeltaError
+class BodyDeltaError(Exception):
+    """A body delta does not fit the node's present body text."""
+    pass
 #@+node:ekr.20031218072017.3605: ** class Undoer
 class Undoer:
     """A class that implements unlimited undo and redo."""
@@ -79,6 +84,7 @@ class Undoer:
         # Set the following ivars to keep pylint happy.
         self.afterTree = None
         self.beforeTree = None
+        self.bodyDelta = None
         self.children = None
         self.deleteMarkedNodesData = None
         self.followingSibs = None
@@ -125,14 +131,135 @@ class Undoer:
             self.granularity = self.granularity.lower()
         if self.granularity not in ('node', 'line', 'word', 'char'):
             self.granularity = 'line'
+        # The budget for the entire undo stack, in bytes. 0: no limit.
+        self.max_undo_memory = (c.config.getInt('max-undo-memory') or 0) * 1024 * 1024
     #@+node:ekr.20050416092908.1: *3* u.Internal helpers
+    #@+node:tom.20261018233012.1: *4* u.beadSize & undoMemory
+    def beadSize(self, bunch):
+        """
+        Return the approximate number of bytes used by the strings in bunch,
+        including the strings in group items and saved trees.
+        """
+        size = bunch.get('undoSize')
+        if size is None:
+            size = self.textSize(list(bunch.__dict__.values()))
+            # The items of a group are still being accumulated.
+            if bunch.get('kind') != 'beforeGroup':
+                bunch.undoSize = size
+        return size
+
+    def textSize(self, obj):
+        if isinstance(obj, str):
+            return sys.getsizeof(obj)
+        if isinstance(obj, (list, tuple)):
+            return sum(self.textSize(z) for z in obj if not isinstance(z, (int, float)))
+        if isinstance(obj, g.Bunch):
+            return sum(self.textSize(z) for key, z in obj.__dict__.items() if key != 'undoSize')
+        return 0
+
+    def undoMemory(self):
+        """Return the approximate number of bytes used by the undo stack."""
+        return sum(self.beadSize(z) for z in self.beads)
+    #@+node:tom.20261018233012.2: *4* u.compressBodies & helpers
+    def compressBodies(self, bunch):
+        """
+        Replace bunch.oldBody and bunch.newBody by a line-level delta if doing
+        so saves space. u.expandBody recreates the body that undo or redo
+        needs from the node's present body text.
+        """
+        old_body, new_body = bunch.get('oldBody'), bunch.get('newBody')
+        if old_body is None or new_body is None or old_body == new_body:
+            return
+        delta = self.diffBodies(old_body, new_body)
+        if len(delta[2]) + len(delta[3]) < len(old_body):
+            bunch.bodyDelta = delta
+            bunch.oldBody = bunch.newBody = None
+
+    def compressTree(self, treeInfo):
+        """
+        Replace the saved body text of all nodes in treeInfo by line-level
+        deltas against the node's present body text.
+        """
+        seen = set()
+        for v, vInfo, tInfo in treeInfo:
+            if v in seen:
+                # Restore the body only once: deltas do not compose.
+                tInfo.bodyString = None
+                continue
+            seen.add(v)
+            body = tInfo.bodyString
+            if body is None or body == v.b:
+                continue
+            delta = self.diffBodies(body, v.b)
+            if len(delta[2]) + len(delta[3]) < len(body):
+                tInfo.bodyDelta = delta
+                tInfo.bodyString = None
+    #@+node:tom.20261018233012.3: *5* u.diffBodies
+    def diffBodies(self, old_body, new_body):
+        """
+        Return a line-level delta that recreates old_body from new_body,
+        or new_body from old_body:
+
+        (leading, trailing, old_middle, new_middle, old_key, new_key)
+
+        leading and trailing are the numbers of matching leading and trailing
+        lines. old_middle and new_middle are the unmatched lines, as strings.
+        old_key and new_key are the length and hash of each body. u.patchBody
+        uses them to verify the body it patches.
+        """
+        old_lines, new_lines = g.splitLines(old_body), g.splitLines(new_body)
+        n = min(len(old_lines), len(new_lines))
+        leading = 0
+        while leading < n and old_lines[leading] == new_lines[leading]:
+            leading += 1
+        trailing = 0
+        while (
+            trailing < n - leading and
+            old_lines[-1 - trailing] == new_lines[-1 - trailing]
+        ):
+            trailing += 1
+        return (
+            leading, trailing,
+            ''.join(old_lines[leading : len(old_lines) - trailing]),
+            ''.join(new_lines[leading : len(new_lines) - trailing]),
+            (len(old_body), hash(old_body)), (len(new_body), hash(new_body)),
+        )
+    #@+node:tom.20261018233012.4: *5* u.expandBody
+    def expandBody(self, oldOrNew):
+        """
+        Return u.oldBody or u.newBody, recreating it from u.bodyDelta and the
+        present body text if necessary.
+        """
+        u = self
+        body = u.oldBody if oldOrNew == 'old' else u.newBody
+        if body is None and u.bodyDelta:
+            body = u.patchBody(u.p.b, u.bodyDelta, oldOrNew)
+        return body
+    #@+node:tom.20261018233012.5: *5* u.patchBody
+    def patchBody(self, body, delta, oldOrNew):
+        """
+        Use a delta created by u.diffBodies to convert the new body to the old
+        body (oldOrNew == 'old') or the old body to the new body.
+
+        Raise BodyDeltaError if body is not the body the delta was made from.
+        """
+        leading, trailing, old_middle, new_middle, old_key, new_key = delta
+        isOld = oldOrNew == 'old'
+        if (len(body), hash(body)) != (new_key if isOld else old_key):
+            raise BodyDeltaError('body text changed outside of undo')
+        lines = g.splitLines(body)
+        return ''.join([
+            ''.join(lines[:leading]),
+            old_middle if isOld else new_middle,
+            ''.join(lines[len(lines) - trailing :]),
+        ])
     #@+node:ekr.20031218072017.3607: *4* u.clearOptionalIvars
     def clearOptionalIvars(self):
         u = self
         u.p = None  # The position/node being operated upon for undo and redo.
         for ivar in u.optionalIvars:
             setattr(u, ivar, None)
-    #@+node:ekr.20060127052111.1: *4* u.cutStack
+    #@+node:ekr.20060127052111.1: *4* u.cutStack & helper
     def cutStack(self):
         u = self
         n = u.max_undo_stack_size
@@ -148,8 +275,30 @@ class Undoer:
                 # g.trace('Cutting undo stack to %d entries' % (n))
             u.beads = u.beads[-n :]
             u.bead = n - 1
+        if u.max_undo_memory > 0:
+            u.cutStackToBudget()
         if 'undo' in g.app.debug and 'verbose' in g.app.debug:
             print(f"u.cutStack: {len(u.beads):3}")
+    #@+node:tom.20261018233012.6: *5* u.cutStackToBudget
+    def cutStackToBudget(self):
+        """
+        Remove the oldest beads until the undo stack uses at most
+        u.max_undo_memory bytes. The present bead always remains.
+        """
+        u = self
+        # Do nothing if we are in the middle of creating a group.
+        if any(z.get('kind') == 'beforeGroup' for z in u.beads):
+            return
+        sizes = [u.beadSize(z) for z in u.beads]
+        total, n = sum(sizes), 0
+        while total > u.max_undo_memory and n < u.bead:
+            total -= sizes[n]
+            n += 1
+        if n > 0:
+            u.beads = u.beads[n:]
+            u.bead -= n
+            if 'undo' in g.app.debug:
+                print(f"u.cutStackToBudget: removed {n} beads. {total} bytes remain")
     #@+node:ekr.20080623083646.10: *4* u.dumpBead
     def dumpBead(self, n):
         u = self
@@ -321,7 +470,11 @@ class Undoer:
     def restoreTnodeUndoInfo(self, bunch):
         v = bunch.v
         v.h = bunch.headString
-        v.b = bunch.bodyString
+        delta = bunch.get('bodyDelta')
+        if delta:
+            v.b = self.patchBody(v.b, delta, 'old')
+        elif bunch.bodyString is not None:
+            v.b = bunch.bodyString
         v.statusBits = bunch.statusBits
         uA = bunch.get('unknownAttributes')
         if uA is not None:
@@ -434,6 +587,7 @@ class Undoer:
         bunch.newHead = p.h
         bunch.newIns = w.getInsertPoint()
         bunch.newMarked = p.isMarked()
+        u.compressBodies(bunch)
         # Careful: don't use ternary operator.
         if w:
             bunch.newSel = w.getSelectionRange()
@@ -502,6 +656,7 @@ class Undoer:
         bunch.newBody = p.b
         bunch.newHead = p.h
         bunch.newMarked = p.isMarked()
+        u.compressBodies(bunch)
         # Bug fix 2017/11/12: don't use ternary operator.
         if w:
             bunch.newSel = w.getSelectionRange()
@@ -541,6 +696,7 @@ class Undoer:
         bunch.newSel = w.getSelectionRange()
         bunch.newText = w.getAllText()
         bunch.newTree = u.saveTree(p)
+        u.compressTree(bunch.oldTree)
         u.pushBead(bunch)
     #@+node:ekr.20050424161505: *5* u.afterClearRecentFiles
     def afterClearRecentFiles(self, bunch):
@@ -902,6 +1058,17 @@ class Undoer:
     def canUndo(self):
         u = self
         return u.undoMenuLabel != "Can't Undo"
+    #@+node:tom.20261019031012.41: *4* u.abandonUndoState
+    def abandonUndoState(self, command, exception):
+        """
+        Clear the undo state after undo or redo found that a body delta no
+        longer fits the node's body text. The text is left as it is.
+        """
+        c, u = self.c, self
+        g.error(f"{command}: {exception}. Clearing undo state.")
+        u.clearUndoState()
+        c.checkOutline()
+        u.update_status()
     #@+node:ekr.20031218072017.3609: *4* u.clearUndoState
     def clearUndoState(self):
         """Clears then entire Undo state.
@@ -1288,22 +1455,29 @@ class Undoer:
         c.endEditing()
         if not u.canRedo():
             return
-        if not u.getBead(u.bead + 1):
+        bunch = u.getBead(u.bead + 1)
+        if not bunch:
             return
         #
         # Init status.
         u.redoing = True
         u.groupCount = 0
-        if u.redoHelper:
-            u.redoHelper()
-        else:
-            g.trace(f"no redo helper for {u.kind} {u.undoType}")
+        try:
+            if u.redoHelper:
+                u.redoHelper()
+            else:
+                g.trace(f"no redo helper for {u.kind} {u.undoType}")
+        except BodyDeltaError as e:
+            u.redoing = False
+            u.abandonUndoState('redo', e)
+            return
         #
         # Finish.
         c.checkOutline()
         u.update_status()
         u.redoing = False
         u.bead += 1
+        bunch.undoSize = None  # The helpers may have compressed the bead.
         u.setUndoTypes()
     #@+node:ekr.20110519074734.6092: *3* u.redo helpers
     #@+node:ekr.20191213085226.1: *4*  u.reloadHelper (do nothing)
@@ -1317,7 +1491,8 @@ class Undoer:
         if c.p != u.p:  # #1333.
             c.selectPosition(u.p)
         u.p.setDirty()
-        u.p.b = u.newBody
+        body = u.expandBody('new')
+        u.p.b = body
         u.p.h = u.newHead
         # This is required so. Otherwise redraw will revert the change!
         c.frame.tree.setHeadline(u.p, u.newHead)
@@ -1326,7 +1501,7 @@ class Undoer:
         else:
             u.p.clearMarked()
         if u.groupCount == 0:
-            w.setAllText(u.newBody)
+            w.setAllText(body)
             i, j = u.newSel
             w.setSelectionRange(i, j, insert=u.newIns)
             w.setYScrollPosition(u.newYScroll)
@@ -1520,8 +1695,9 @@ class Undoer:
             c.selectPosition(u.p)
         u.p.setDirty()
         # Restore the body.
-        u.p.setBodyString(u.newBody)
-        w.setAllText(u.newBody)
+        body = u.expandBody('new')
+        u.p.setBodyString(body)
+        w.setAllText(body)
         c.frame.body.recolor(u.p)
         # Restore the headline.
         u.p.initHeadString(u.newHead)
@@ -1600,6 +1776,17 @@ class Undoer:
         if u.yview:
             c.bodyWantsFocus()
             w.setYScrollPosition(u.yview)
+    #@+node:tom.20261018233012.7: *3* u.showUndoMemory
+    @cmd('show-undo-memory')
+    def showUndoMemory(self, event=None):
+        """Report the approximate memory used by the undo stack."""
+        u = self
+        n = len(u.beads)
+        kb = u.undoMemory() / 1024
+        budget = (
+            f"{u.max_undo_memory // (1024 * 1024)} MB" if u.max_undo_memory > 0
+            else 'no limit')
+        g.es_print(f"undo stack: {n} bead{g.plural(n)}, {kb:.1f} KB. Budget: {budget}")
     #@+node:ekr.20031218072017.2039: *3* u.undo
     @cmd('undo')
     def undo(self, event=None):
@@ -1615,7 +1802,8 @@ class Undoer:
             u.setIvarsFromVnode(c.p)
         if not u.canUndo():
             return
-        if not u.getBead(u.bead):
+        bunch = u.getBead(u.bead)
+        if not bunch:
             return
         #
         # Init status.
@@ -1623,16 +1811,22 @@ class Undoer:
         u.groupCount = 0
         #
         # Dispatch.
-        if u.undoHelper:
-            u.undoHelper()
-        else:
-            g.trace(f"no undo helper for {u.kind} {u.undoType}")
+        try:
+            if u.undoHelper:
+                u.undoHelper()
+            else:
+                g.trace(f"no undo helper for {u.kind} {u.undoType}")
+        except BodyDeltaError as e:
+            u.undoing = False
+            u.abandonUndoState('undo', e)
+            return
         #
         # Finish.
         c.checkOutline()
         u.update_status()
         u.undoing = False
         u.bead -= 1
+        bunch.undoSize = None  # The helpers may have compressed the bead.
         u.setUndoTypes()
     #@+node:ekr.20110519074734.6093: *3* u.undo helpers
     #@+node:ekr.20191213085246.1: *4*  u.undoHelper
@@ -1650,7 +1844,8 @@ class Undoer:
         if c.p != u.p:
             c.selectPosition(u.p)
         u.p.setDirty()
-        u.p.b = u.oldBody
+        body = u.expandBody('old')
+        u.p.b = body
         u.p.h = u.oldHead
         # This is required.  Otherwise c.redraw will revert the change!
         c.frame.tree.setHeadline(u.p, u.oldHead)
@@ -1659,7 +1854,7 @@ class Undoer:
         else:
             u.p.clearMarked()
         if u.groupCount == 0:
-            w.setAllText(u.oldBody)
+            w.setAllText(body)
             i, j = u.oldSel
             w.setSelectionRange(i, j, insert=u.oldIns)
             w.setYScrollPosition(u.oldYScroll)
@@ -1869,8 +2064,9 @@ class Undoer:
         if c.p != u.p:  # #1333.
             c.selectPosition(u.p)
         u.p.setDirty()
-        u.p.b = u.oldBody
-        w.setAllText(u.oldBody)
+        body = u.expandBody('old')
+        u.p.b = body
+        w.setAllText(body)
         c.frame.body.recolor(u.p)
         u.p.h = u.oldHead
         # This is required.  Otherwise c.redraw will revert the change!
@@ -1962,6 +2158,8 @@ class Undoer:
             u.beads[u.bead] = bunch
         # Replace data in tree with old data.
         u.restoreTree(old_data)
+        # The bodies in new_data are now out of date.
+        u.compressTree(new_data or u.beads[u.bead].newTree)
         c.setBodyString(p, p.b)  # This is not a do-nothing.
         return p  # Nothing really changes.
     #@+node:ekr.20080425060424.5: *4* u.undoSort
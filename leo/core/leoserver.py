@@ -54,6 +54,24 @@ wsPersist = False
 wsSkipDirty = False
 wsHost = "localhost"
 wsPort = 32125
+# Server methods that never change the shape of an outline.
+# All other requests invalidate the server's position index.
+structure_safe_commands = frozenset([
+    'do_nothing', 'error',
+    'contract_node', 'expand_node',
+    'find_next', 'find_previous',
+    'get_all_gnx', 'get_all_leo_commands', 'get_all_open_commanders',
+    'get_all_positions', 'get_all_server_commands', 'get_body',
+    'get_body_length', 'get_body_states', 'get_children', 'get_focus',
+    'get_outline_changes', 'get_parent', 'get_position_data', 'get_request_latency',
+    'get_search_settings', 'get_ua', 'get_ui_states', 'get_version',
+    'mark_node', 'unmark_node', 'toggle_mark',
+    'page_down', 'page_up',
+    'set_body', 'set_config', 'set_current_position', 'set_headline',
+    'set_search_settings', 'set_selection',
+])
+# Upper bounds (in milliseconds) of the request latency histogram.
+latency_buckets = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)
 
 #@+others
 #@+node:felix.20210712224107.1: ** setup JSON encoder
@@ -130,6 +148,7 @@ class ServerExternalFilesController(ExternalFilesController):
             if bool(p_result and 'yes' in p_result.lower()):
                 self.lastCommander.selectPosition(self.lastPNode)
                 self.lastCommander.refreshFromDisk()
+                g.leoServer.position_index.invalidate()
         elif self.lastCommander:
             path = self.lastCommander.fileName()
             # 6- Same but for Leo file commander (close and reopen .leo file)
@@ -198,11 +217,10 @@ class ServerExternalFilesController(ExternalFilesController):
         #
         # #1100: always scan the entire file for @<file> nodes.
         # #1134: Nested @<file> nodes are no longer valid, but this will do no harm.
-        for p in c.all_unique_positions():
+        for p, path in self.get_at_file_nodes_to_check(c):
             if self.waitingForAnswer:
                 break
-            if p.isAnyAtFileNode():
-                self.idle_check_at_file_node(c, p)
+            self.idle_check_at_file_node(c, p)
 
         # if yesAll/noAll forced, then just show info message
         if self.infoMessage:
@@ -212,6 +230,8 @@ class ServerExternalFilesController(ExternalFilesController):
     def idle_check_leo_file(self, c):
         """Check c's .leo file for external changes."""
         path = c.fileName()
+        if not self.must_check(c, path):
+            return
         if not self.has_changed(path):
             return
         # Always update the path & time to prevent future warnings.
@@ -240,6 +260,7 @@ class ServerExternalFilesController(ExternalFilesController):
                 old_p = c.p # To restore selection if refresh option set to yes-all & is descendant of at-file
                 c.selectPosition(self.lastPNode)
                 c.refreshFromDisk() # Ends with selection on new c.p which is the at-file node
+                g.leoServer.position_index.invalidate()
                 # check with leoServer's config first, and if new c.p is ancestor of old_p
                 if g.leoServer.leoServerConfig:
                     if g.leoServer.leoServerConfig["defaultReloadIgnore"].lower()=='yes-all':
@@ -352,6 +373,254 @@ class ServerExternalFilesController(ExternalFilesController):
         g.leoServer._send_async_output(package, True)
         self.waitingForAnswer = True
     #@-others
+#@+node:tom.20261018120501.1: ** class ServerPositionIndex
+class ServerPositionIndex:
+    """
+    A generation-stamped index of the positions in one commander.
+
+    The server bumps the generation (and clears the index) whenever a
+    request might have changed the shape of the outline. Between
+    mutations, lookups by gnx are O(1), archived positions already
+    resolved need not be re-checked by c.positionExists, and the archived
+    positions sent to the client are computed once per position.
+    """
+    #@+others
+    #@+node:tom.20261018120501.2: *3* spi.__init__
+    def __init__(self):
+        self.c = None  # The commander for which the index was built.
+        self.generation = 0  # Bumped by invalidate.
+        self.gnx_d = None  # Keys are gnx's, values are the first position with that gnx.
+        self.aps_d = {}  # Keys are position keys, values are archived positions.
+        self.positions_d = {}  # Keys are ap keys, values are positions known to exist.
+        self.known = set()  # Position keys of positions known to exist.
+        self.at_file_d = {}  # Keys are vnodes, values are (headline, p.isAnyAtFileNode()).
+        self.enabled = True  # False while a request may be changing the outline.
+        self.builds = 0  # Statistics.
+    #@+node:tom.20261018120501.3: *3* spi.invalidate
+    def invalidate(self):
+        """Forget all cached positions. Called after outline mutations."""
+        self.generation += 1
+        self.c = None
+        self.gnx_d = None
+        self.aps_d = {}
+        self.positions_d = {}
+        self.known = set()
+        self.at_file_d = {}
+    #@+node:tom.20261018120501.4: *3* spi.check_c
+    def check_c(self, c):
+        """Invalidate the index if it was built for another commander."""
+        if c is not self.c:
+            self.invalidate()
+            self.c = c
+    #@+node:tom.20261018120501.5: *3* spi.ap_key & position_key
+    def ap_key(self, ap):
+        """Return a hashable key for ap, an archived position, or None."""
+        try:
+            stack = tuple((z['gnx'], int(z['childIndex'])) for z in ap['stack'])
+            return (ap['gnx'], int(ap['childIndex']), stack)
+        except Exception:
+            return None
+
+    def position_key(self, p):
+        """
+        Return a hashable key for position p.
+
+        Unlike p.key(), this key is built without a Python-level loop.
+        """
+        return (p.v, p._childIndex, tuple(p.stack))
+    #@+node:tom.20261018120501.6: *3* spi.get_ap & remember_ap
+    def get_ap(self, c, key):
+        """Return the cached archived position for the given position key, or None."""
+        self.check_c(c)
+        return self.aps_d.get(key) if self.enabled else None
+
+    def remember_ap(self, c, key, ap):
+        """Cache ap, the archived position for the given position key."""
+        self.check_c(c)
+        if self.enabled:
+            self.aps_d[key] = ap
+    #@+node:tom.20261020090000.5: *3* spi.get_position & remember_position
+    def get_position(self, c, key):
+        """
+        Return a copy of the position for the given ap key, or None.
+        The position is known to exist in c.
+        """
+        self.check_c(c)
+        p = self.positions_d.get(key) if self.enabled and key is not None else None
+        return p.copy() if p else None
+
+    def remember_position(self, c, key, p):
+        """Remember that position p (with the given ap key) exists in c."""
+        self.check_c(c)
+        if self.enabled:
+            p = p.copy()
+            if key is not None:
+                self.positions_d[key] = p
+            self.known.add(self.position_key(p))
+    #@+node:tom.20261020090000.6: *3* spi.is_known
+    def is_known(self, c, p):
+        """Return True if position p is known to exist in c."""
+        self.check_c(c)
+        return self.enabled and self.position_key(p) in self.known
+    #@+node:tom.20261020090000.7: *3* spi.is_at_file
+    def is_at_file(self, c, p):
+        """
+        Return p.isAnyAtFileNode(), computing it once per headline.
+
+        Safe requests may change headlines, so each entry remembers the
+        headline from which it was computed.
+        """
+        self.check_c(c)
+        v, h = p.v, p.v._headString
+        data = self.at_file_d.get(v)
+        if data and data[0] == h:
+            return data[1]
+        val = p.isAnyAtFileNode()
+        if self.enabled:
+            self.at_file_d[v] = (h, val)
+        return val
+    #@+node:tom.20261018120501.7: *3* spi.first_position
+    def first_position(self, c, gnx):
+        """
+        Return the first position of c (in outline order) whose vnode has the
+        given gnx, or None. Rebuild the index in a single traversal as needed.
+        """
+        self.check_c(c)
+        if self.gnx_d is None or not self.enabled:
+            self.build(c)
+        p = self.gnx_d.get(gnx)
+        if p and (p.v.gnx != gnx or not c.positionExists(p)):
+            # Something changed the outline behind the server's back.
+            self.invalidate()
+            self.c = c
+            self.build(c)
+            p = self.gnx_d.get(gnx)
+        return p.copy() if p else None
+    #@+node:tom.20261018120501.8: *3* spi.build
+    def build(self, c):
+        """Build gnx_d with one traversal of c's outline."""
+        self.gnx_d = {p.v.gnx: p for p in c.all_unique_positions()}
+        self.builds += 1
+    #@-others
+#@+node:tom.20261018131207.1: ** class ServerChangeLog
+class ServerChangeLog:
+    """
+    A log of the changes to one commander's outline, numbered by revision.
+
+    update compares the outline with a snapshot taken at the previous
+    revision. Snapshots share strings with the vnodes, but taking one
+    visits every node, so the server only marks the log stale after each
+    request. get_outline_changes calls update when a client asks.
+    changes_since merges the retained entries after a client's revision.
+    """
+    max_entries = 200  # Older clients must re-fetch the whole outline.
+    #@+others
+    #@+node:tom.20261018131207.2: *3* scl.__init__
+    def __init__(self, c):
+        self.c = c
+        self.entries = []  # List of (revision, change dict), oldest first.
+        self.revision = 0
+        self.snapshot = self.take_snapshot()
+        self.stale = False  # True: a request may have changed the outline since the last update.
+    #@+node:tom.20261018131207.3: *3* scl.take_snapshot
+    def take_snapshot(self):
+        """
+        Return a dict whose keys are gnx's and whose values are tuples
+        (child gnx's, headline, body, statusBits).
+        """
+        c = self.c
+        root = c.hiddenRootNode
+        d = {root.gnx: (tuple(z.gnx for z in root.children), None, None, 0)}
+        for v in c.all_unique_nodes():
+            d[v.gnx] = (
+                tuple(z.gnx for z in v.children), v._headString, v._bodyString, v.statusBits)
+        return d
+    #@+node:tom.20261018131207.4: *3* scl.update
+    def update(self):
+        """
+        Compare the outline with the last snapshot.
+        Add an entry and bump the revision if anything changed.
+        Return True if the revision changed.
+        """
+        old, new = self.snapshot, self.take_snapshot()
+        self.stale = False
+        inserted = [gnx for gnx in new if gnx not in old]
+        deleted = [gnx for gnx in old if gnx not in new]
+        changed, moved, children = [], set(), {}
+        for gnx, new_data in new.items():
+            old_data = old.get(gnx)
+            if old_data is None:
+                if new_data[0]:
+                    children[gnx] = list(new_data[0])
+                continue
+            if old_data == new_data:
+                continue
+            old_children, new_children = old_data[0], new_data[0]
+            if old_children != new_children:
+                children[gnx] = list(new_children)
+                moved |= set(old_children) ^ set(new_children)
+            if old_data[1:] != new_data[1:]:
+                changed.append(gnx)
+        self.snapshot = new
+        if not (inserted or deleted or changed or children):
+            return False
+        moved -= set(inserted)
+        moved -= set(deleted)
+        self.revision += 1
+        self.entries.append((self.revision, {
+            'inserted': inserted,
+            'deleted': deleted,
+            'moved': sorted(moved),
+            'changed': changed,
+            'children': children,
+        }))
+        del self.entries[: -self.max_entries]
+        return True
+    #@+node:tom.20261018131207.5: *3* scl.changes_since
+    def changes_since(self, revision):
+        """
+        Return the merged changes made after the given revision,
+        or None if the log no longer covers that revision.
+        """
+        if revision > self.revision:
+            return None
+        if revision < self.revision and (
+            not self.entries or self.entries[0][0] > revision + 1
+        ):
+            return None
+        inserted, deleted, moved, changed, children = set(), set(), set(), set(), {}
+        for n, d in self.entries:
+            if n <= revision:
+                continue
+            for gnx in d['inserted']:
+                if gnx in deleted:
+                    # Deleted and re-inserted: the client still knows the node.
+                    deleted.discard(gnx)
+                    changed.add(gnx)
+                else:
+                    inserted.add(gnx)
+            for gnx in d['deleted']:
+                if gnx in inserted:
+                    inserted.discard(gnx)
+                else:
+                    deleted.add(gnx)
+                changed.discard(gnx)
+                moved.discard(gnx)
+                children.pop(gnx, None)
+            moved.update(d['moved'])
+            changed.update(d['changed'])
+            children.update(d['children'])
+        # The client gets all the data for inserted nodes.
+        moved -= inserted
+        changed -= inserted
+        return {
+            'inserted': sorted(inserted),
+            'deleted': sorted(deleted),
+            'moved': sorted(moved),
+            'changed': sorted(changed),
+            'children': children,
+        }
+    #@-others
 #@+node:felix.20210621233316.4: ** class LeoServer
 class LeoServer:
     """Leo Server Controller"""
@@ -374,6 +643,11 @@ class LeoServer:
         # Debug utilities
         self.current_id = 0  # Id of action being processed.
         self.log_flag = False  # set by "log" key
+        self.latency_d = {}  # Keys are actions, values are latency statistics.
+        self.change_logs = {}  # Keys are c.hash(), values are ServerChangeLogs.
+        #
+        # Resolves gnx's and archived positions between outline mutations.
+        self.position_index = ServerPositionIndex()
         #
         # Start the bridge.
         self.bridge = leoBridge.controller(
@@ -664,6 +938,7 @@ class LeoServer:
         c.selectPosition(c.rootPosition())  # Required.
         # Check the outline!
         c.recreateGnxDict() # refresh c.fileCommands.gnxDict used in ap_to_p
+        self.position_index.invalidate()
         self._check_outline(c)
         if self.log_flag:  # pragma: no cover
             self._dump_outline(c)
@@ -725,6 +1000,7 @@ class LeoServer:
             if forced or not c.changed:
                 # c.close() # Stops too much if last file closed
                 g.app.closeLeoWindow(c.frame, finish_quit=False)
+                self.change_logs.pop(c.hash(), None)
             else:
                 # Cannot close, return empty response without 'total' (ask to save, ignore or cancel)
                 return self._make_response()
@@ -1299,6 +1575,41 @@ class LeoServer:
         one of ("body", "tree", "headline", repr(the_widget)).
         """
         return self._make_minimal_response({"focus": self._get_focus()})
+    #@+node:tom.20261018131207.6: *5* server.get_outline_changes
+    def get_outline_changes(self, param):
+        """
+        Return the changes to the outline since param["revision"], so that
+        clients can patch their tree models instead of re-fetching them.
+
+        The response always contains the current "revision". It contains
+        "reset": True if the client must re-fetch the whole outline, either
+        because param["revision"] is missing or because the server no longer
+        remembers changes that old. Otherwise "changes" contains:
+
+        "inserted", "deleted", "moved", "changed": lists of gnx's.
+        "children": the new child gnx's of nodes whose children changed.
+        "nodes": the node data for all inserted and changed nodes.
+
+        The hidden root's gnx is the key for the top-level nodes.
+        """
+        c = self._check_c()
+        log = self._get_change_log(c)
+        log.update()
+        revision = param.get('revision')
+        changes = None if revision is None else log.changes_since(int(revision))
+        package = {"revision": log.revision}
+        if changes is None:
+            package["reset"] = True
+        else:
+            gnx_d = c.fileCommands.gnxDict
+            nodes = {}
+            for gnx in changes['inserted'] + changes['changed']:
+                v = gnx_d.get(gnx)
+                if v:
+                    nodes[gnx] = self._get_node_d(v)
+            changes['nodes'] = nodes
+            package["changes"] = changes
+        return self._make_response(package)
     #@+node:felix.20210621233316.44: *5* server.get_parent
     def get_parent(self, param):
         """Return the node data for the parent of position p, where p is c.p if param["ap"] is missing."""
@@ -1561,20 +1872,19 @@ class LeoServer:
         """Select position p. Or try to get p with gnx if not found."""
         tag = "set_current_position"
         c = self._check_c()
-        p = self._get_p(param)
+        p = self._get_p(param, strict=True)
         if p:
-            if c.positionExists(p):
-                # set this node as selection
-                c.selectPosition(p)
-            else:
-                ap = param.get('ap')
-                foundPNode = self._positionFromGnx(ap.get('gnx', ""))
-                if foundPNode:
-                    c.selectPosition(foundPNode)
-                else:
-                    print(
-                        f"{tag}: node does not exist! "
-                        f"ap was: {json.dumps(ap, cls=SetEncoder)}", flush=True)
+            # set this node as selection
+            c.selectPosition(p)
+        else:
+            ap = param.get('ap')
+            foundPNode = ap and self._positionFromGnx(ap.get('gnx', ""))
+            if foundPNode:
+                c.selectPosition(foundPNode)
+            elif ap:
+                print(
+                    f"{tag}: node does not exist! "
+                    f"ap was: {json.dumps(ap, cls=SetEncoder)}", flush=True)
 
         return self._make_response()
     #@+node:felix.20210621233316.62: *5* server.set_headline
@@ -1704,6 +2014,34 @@ class LeoServer:
         # uses the __version__ global constant and the v1, v2, v3 global version numbers
         result = {"version": __version__ , "major": v1, "minor": v2, "patch": v3}
         return self._make_minimal_response(result)
+    #@+node:tom.20261018120501.10: *5* server.get_request_latency
+    def get_request_latency(self, param):
+        """
+        Return per-request latency statistics, in milliseconds, keyed by action.
+
+        Each entry has 'count', 'mean', 'max' and 'buckets', a histogram
+        whose i'th entry counts requests that took at most latency_buckets[i]
+        milliseconds. The last entry counts slower requests.
+
+        Clear the statistics afterwards if param["reset"] is True.
+        """
+        result = {}
+        for action, d in sorted(self.latency_d.items()):
+            result[action] = {
+                'count': d['count'],
+                'mean': round(d['total'] / d['count'], 3),
+                'max': round(d['max'], 3),
+                'buckets': list(d['buckets']),
+            }
+        if param.get('reset'):
+            self.latency_d = {}
+        index = self.position_index
+        package = {
+            "latency": result,
+            "buckets": list(latency_buckets),
+            "index": {"generation": index.generation, "builds": index.builds},
+        }
+        return self._make_minimal_response(package)
     #@+node:felix.20210818012827.1: *5* server.do_nothing
     def do_nothing(self, param):
         """Simply return states from _make_response"""
@@ -2949,6 +3287,11 @@ class LeoServer:
         tag = '_ap_to_p'
         c = self._check_c()
         gnx_d = c.fileCommands.gnxDict
+        index = self.position_index
+        key = index.ap_key(ap)
+        p = index.get_position(c, key)
+        if p:
+            return p
         try:
             outer_stack = ap.get('stack')
             if outer_stack is None:  # pragma: no cover.
@@ -2986,6 +3329,7 @@ class LeoServer:
             p = Position(v, childIndex, stack)
             if not c.positionExists(p):  # pragma: no cover.
                 raise ServerError(f"{tag}: p does not exist in {c.shortFileName()}")
+            index.remember_position(c, key, p)
         except Exception:
             if self.log_flag or traces:
                 print(
@@ -3175,6 +3519,8 @@ class LeoServer:
         self.action = action
 
         # Execute the requested action.
+        t1 = time.perf_counter()
+        stat_key = action
         if action[0] == "!":
             action = action[1:] # Remove exclamation point "!"
             func = self._do_server_command  # Server has this method.
@@ -3183,7 +3529,21 @@ class LeoServer:
             func = self._do_leo_command_by_name  # It's a command name.
         else:
             func = self._do_leo_function_by_name  # It's the name of a method in some commander.
-        result = func(action, param)
+        # Only server methods are known not to change the shape of the outline.
+        safe = stat_key[0] == '!' and action in structure_safe_commands
+        index = self.position_index
+        if not safe:
+            index.invalidate()
+            index.enabled = False
+        try:
+            result = func(action, param)
+        finally:
+            if not safe:
+                index.invalidate()
+                index.enabled = True
+            self._record_latency(stat_key, time.perf_counter() - t1)
+        if not action.startswith('get_'):
+            self._mark_change_log()
         if result is None:  # pragma: no cover
             raise ServerError(f"{tag}: no response: {action!r}")
         return result
@@ -3267,6 +3627,29 @@ class LeoServer:
                 if func:
                     return func
         return None
+    #@+node:tom.20261018131207.8: *4* server._get_change_log & _mark_change_log
+    def _get_change_log(self, c):
+        """Return the ServerChangeLog for c, creating it if necessary."""
+        log = self.change_logs.get(c.hash())
+        if not log or log.c is not c:
+            log = self.change_logs[c.hash()] = ServerChangeLog(c)
+        return log
+
+    def _mark_change_log(self):
+        """
+        Mark the change log of self.c stale, if clients have asked for one.
+
+        The first time the log becomes stale, tell clients that the outline
+        may have changed since log.revision. get_outline_changes compares
+        the outline with the log's snapshot, so edits don't visit every node.
+        """
+        c = self.c
+        log = c and self.change_logs.get(c.hash())
+        if log and log.c is c and not log.stale:
+            log.stale = True
+            if self.loop:
+                package = {"async": "outline-changed", "revision": log.revision}
+                self._send_async_output(package, True)
     #@+node:felix.20210621233316.91: *4* server._get_focus
     def _get_focus(self):
         """Server helper method to get the focused panel name string"""
@@ -3277,6 +3660,26 @@ class LeoServer:
         except Exception as e:
             raise ServerError(f"{tag}: exception trying to get the focused widget: {e}")
         return focus
+    #@+node:tom.20261018131207.7: *4* server._get_node_d
+    def _get_node_d(self, v):
+        """
+        Return a python dict describing vnode v, for get_outline_changes.
+        Like _get_position_d, but without position-related data.
+        """
+        d = {'gnx': v.gnx, 'headline': v.h}
+        if v.u:
+            d['u'] = v.u
+        if v.b:
+            d['hasBody'] = True
+        if len(v.parents) > 1:
+            d['cloned'] = True
+        if v.isDirty():
+            d['dirty'] = True
+        if v.isMarked():
+            d['marked'] = True
+        if v.isAnyAtFileNode():
+            d['atFile'] = True
+        return d
     #@+node:felix.20210621233316.90: *4* server._get_p
     def _get_p(self, param, strict = False):
         """
@@ -3290,10 +3693,8 @@ class LeoServer:
 
         ap = param.get("ap")
         if ap:
-            p = self._ap_to_p(ap)  # Convertion
+            p = self._ap_to_p(ap)  # Convertion. _ap_to_p checks that p exists.
             if p:
-                if not c.positionExists(p):  # pragma: no cover
-                    raise ServerError(f"{tag}: position does not exist. ap: {ap!r}")
                 return p  # Return the position
         if strict:
             return False
@@ -3329,7 +3730,7 @@ class LeoServer:
             d['expanded'] = True
         if p.isMarked():
             d['marked'] = True
-        if p.isAnyAtFileNode():
+        if self.position_index.is_at_file(self.c, p):
             d['atFile'] = True
         if p == self.c.p:
             d['selected'] = True
@@ -3403,8 +3804,10 @@ class LeoServer:
             raise InternalServerError(f"{tag}: bad p kwarg: {p!r}")
         if p and not c:  # pragma: no cover
             raise InternalServerError(f"{tag}: p but not c")
-        if p and not c.positionExists(p):  # pragma: no cover
-            raise InternalServerError(f"{tag}: p does not exist: {p!r}")
+        if p and not self.position_index.is_known(c, p):
+            if not c.positionExists(p):  # pragma: no cover
+                raise InternalServerError(f"{tag}: p does not exist: {p!r}")
+            self.position_index.remember_position(c, None, p)
         if c and not c.p:  # pragma: no cover
             raise InternalServerError(f"{tag}: empty c.p")
 
@@ -3445,22 +3848,45 @@ class LeoServer:
         This returns only position-related data.
         get_position_data returns all data needed to redraw the screen.
         """
-        self._check_c()
-        stack = [{'gnx': v.gnx, 'childIndex': childIndex}
-            for (v, childIndex) in p.stack]
-        return {
-            'childIndex': p._childIndex,
-            'gnx': p.v.gnx,
-            'stack': stack,
-        }
+        c = self._check_c()
+        index = self.position_index
+        key = index.position_key(p)
+        ap = index.get_ap(c, key)
+        if ap is None:
+            stack = [{'gnx': v.gnx, 'childIndex': childIndex}
+                for (v, childIndex) in p.stack]
+            ap = {
+                'childIndex': p._childIndex,
+                'gnx': p.v.gnx,
+                'stack': stack,
+            }
+            index.remember_ap(c, key, ap)
+        # Callers add keys to the result, so never return the cached dict.
+        return dict(ap)
     #@+node:felix.20210621233316.96: *4* server._positionFromGnx
     def _positionFromGnx(self, gnx):
         """Return first p node with this gnx or false"""
         c = self._check_c()
-        for p in c.all_unique_positions():
-            if p.v.gnx == gnx:
-                return p
-        return False
+        return self.position_index.first_position(c, gnx) or False
+    #@+node:tom.20261018120501.9: *4* server._record_latency
+    def _record_latency(self, action, delta):
+        """Add delta (in seconds) to the latency statistics for action."""
+        d = self.latency_d.get(action)
+        if d is None:
+            d = self.latency_d[action] = {
+                'count': 0, 'total': 0.0, 'max': 0.0,
+                'buckets': [0] * (len(latency_buckets) + 1),
+            }
+        ms = delta * 1000.0
+        d['count'] += 1
+        d['total'] += ms
+        d['max'] = max(d['max'], ms)
+        for i, limit in enumerate(latency_buckets):
+            if ms <= limit:
+                break
+        else:
+            i = len(latency_buckets)
+        d['buckets'][i] += 1
     #@+node:felix.20210622232409.1: *4* server._send_async_output & helper
     def _send_async_output(self, package, toAll = False):
         """
@@ -27,6 +27,9 @@ the following API::
         remove the tag 'baz' from p if it is in the tag list
 
 Internally, tags are stored in `p.v.unknownAttributes['__node_tags']` as a set.
+The controller also keeps an index of all tags: add_tag and remove_tag update
+the index. Code that changes `__node_tags` directly should call
+`tc.initialize_taglist()` to rebuild the index.
 
 UI
 ==
@@ -95,10 +98,16 @@ whitespace (calling .strip()).
 """
 #@-<< docstring >>
 import re
+from typing import Dict, Set
 from leo.core import leoGlobals as g
 from leo.core import leoNodes
 from leo.core.leoQt import QtCore, QtWidgets
-from leo.core.leoQt import MouseButton
+#
+# leoQt defines MouseButton only if Qt exists.
+try:
+    from leo.core.leoQt import MouseButton
+except ImportError:
+    MouseButton = None
 #@+others
 #@+node:peckj.20140804103733.9244: ** init (nodetags.py)
 def init():
@@ -136,6 +145,8 @@ class TagController:
 
         self.c = c
         self.taglist = []
+        self.tag_index: Dict[str, Set[str]] = {}
+            # Keys are tags, values are the gnxs of all nodes having the tag.
         self.initialize_taglist()
         c.theTagController = self
         # #2031: Init the widgets only if we are using Qt.
@@ -145,12 +156,13 @@ class TagController:
             self.ui.update_all()
     #@+node:peckj.20140804103733.9263: *3* tag_c.initialize_taglist
     def initialize_taglist(self):
-        taglist = []
-        for p in self.c.all_unique_positions():
-            for tag in self.get_tags(p):
-                if tag not in taglist:
-                    taglist.append(tag)
-        self.taglist = taglist
+        """Create the tag index and the taglist by scanning the entire outline."""
+        index: Dict[str, Set[str]] = {}
+        for v in self.c.all_unique_nodes():
+            for tag in self.get_vnode_tags(v):
+                index.setdefault(tag, set()).add(v.gnx)
+        self.tag_index = index
+        self.taglist = list(index)
 
     #@+node:peckj.20140804103733.9264: *3* tag_c.outline-level
     #@+node:peckj.20140804103733.9268: *4* tag_c.get_all_tags
@@ -160,14 +172,12 @@ class TagController:
     #@+node:ekr.20201030095446.1: *4* tag_c.show_all_tags
     def show_all_tags(self):
         """Show all tags, organized by node."""
-        c, tc = self.c, self
+        c = self.c
+        gnxDict = c.fileCommands.gnxDict
         d = {}
-        for p in c.all_unique_positions():
-            u = p.v.u
-            tags = set(u.get(tc.TAG_LIST_KEY, set([])))
-            for tag in tags:
-                aList = d.get(tag, [])
-                aList.append(p.h)
+        for tag, gnxs in self.tag_index.items():
+            aList = [gnxDict[gnx].h for gnx in self.get_live_gnxes(gnxs)]
+            if aList:
                 d[tag] = aList
         # Print all tags.
         if d:
@@ -182,42 +192,70 @@ class TagController:
     #@+node:peckj.20140804103733.9267: *4* tag_c.update_taglist
     def update_taglist(self, tag):
         """ ensures the outline's taglist is consistent with the state of the nodes in the outline """
-        if tag not in self.taglist:
-            self.taglist.append(tag)
-        nodelist = self.get_tagged_nodes(tag)
-        if not nodelist:
-            self.taglist.remove(tag)
+        gnxs = self.tag_index.get(tag)
+        if gnxs and self.get_live_gnxes(gnxs):
+            if tag not in self.taglist:
+                self.taglist.append(tag)
+        else:
+            # Keep the gnxs of deleted nodes: undo may restore them.
+            if not gnxs:
+                self.tag_index.pop(tag, None)
+            if tag in self.taglist:
+                self.taglist.remove(tag)
         if hasattr(self, 'ui'):
             self.ui.update_all()
     #@+node:peckj.20140804103733.9258: *4* tag_c.get_tagged_nodes
     def get_tagged_nodes(self, tag):
         """ return a list of *positions* of nodes containing the tag, with * as a wildcard """
+        gnxs = self.find_gnxes(tag)
         nodelist = []
-        # replace * with .* for regex compatibility
-        tag = tag.replace('*', '.*')
-        regex = re.compile(tag)
-        for p in self.c.all_unique_positions():
-            for tag in self.get_tags(p):
-                if regex.match(tag):
-                    nodelist.append(p.copy())
-                    break
+        if gnxs:
+            # Return positions in outline order.
+            for p in self.c.all_unique_positions():
+                if p.v.gnx in gnxs:
+                    nodelist.append(p)
+                    if len(nodelist) == len(gnxs):
+                        break
         return nodelist
     #@+node:vitalije.20170811150914.1: *4* tag_c.get_tagged_gnxes
     def get_tagged_gnxes(self, tag):
-        c = self.c
-        tag = tag.replace('*', '.*')
-        regex = re.compile(tag)
-        for p in c.all_unique_positions():
-            for t in self.get_tags(p):
-                if regex.match(t):
-                    yield p.v.gnx
+        yield from self.find_gnxes(tag)
+    #@+node:tom.20261019031012.24: *4* tag_c.find_gnxes
+    def find_gnxes(self, tag):
+        """
+        Return the set of gnxs of all nodes containing the tag, with * as a
+        wildcard. Search the tag index, not the outline.
+        """
+        # replace * with .* for regex compatibility
+        regex = re.compile(tag.replace('*', '.*'))
+        result: Set[str] = set()
+        for key, gnxs in self.tag_index.items():
+            if regex.match(key):
+                result |= gnxs
+        return self.get_live_gnxes(result)
+    #@+node:tom.20261019031012.25: *4* tag_c.get_live_gnxes
+    def get_live_gnxes(self, gnxs):
+        """
+        Return the set of gnxs of nodes that are still in the outline.
+
+        Deleting a node cuts the parent links of all nodes in its tree, so
+        the index need not change when nodes are deleted or undeleted.
+        """
+        gnxDict = self.c.fileCommands.gnxDict
+        return {gnx for gnx in gnxs if gnx in gnxDict and gnxDict[gnx].parents}
     #@+node:peckj.20140804103733.9265: *3* tag_c.individual nodes
     #@+node:peckj.20140804103733.9259: *4* tag_c.get_tags
     def get_tags(self, p):
         """ returns a list of tags applied to position p."""
         if p:
-            tags = p.v.u.get(self.TAG_LIST_KEY, set([]))
-            return list(tags)
+            return self.get_vnode_tags(p.v)
+        return []
+    #@+node:tom.20261019031012.26: *4* tag_c.get_vnode_tags
+    def get_vnode_tags(self, v):
+        """Return a list of tags applied to v, without creating v.u."""
+        u = getattr(v, 'unknownAttributes', None)
+        if isinstance(u, dict):
+            return list(u.get(self.TAG_LIST_KEY, []))
         return []
     #@+node:peckj.20140804103733.9260: *4* tag_c.add_tag
     def add_tag(self, p, tag):
@@ -226,6 +264,7 @@ class TagController:
         tags = set(p.v.u.get(self.TAG_LIST_KEY, set([])))
         tags.add(tag)
         p.v.u[self.TAG_LIST_KEY] = tags
+        self.tag_index.setdefault(tag, set()).add(p.v.gnx)
         self.c.setChanged()
         self.update_taglist(tag)
     #@+node:peckj.20140804103733.9261: *4* tag_c.remove_tag
@@ -241,6 +280,7 @@ class TagController:
         else:
             del v.u[self.TAG_LIST_KEY]
             # prevent a few corner cases, and conserve disk space
+        self.tag_index.get(tag, set()).discard(v.gnx)
         self.c.setChanged()
         self.update_taglist(tag)
     #@-others
@@ -4,6 +4,10 @@
 #@@first
 """Tests of leo.commands.leoCheckerCommands."""
 import re
+import sys
+import threading
+import time
+from leo.core import leoGlobals as g
 from leo.core.leoTest2 import LeoUnitTest
 import leo.commands.checkerCommands as checkerCommands
 #@+others
@@ -11,6 +15,62 @@ import leo.commands.checkerCommands as checkerCommands
 class TestChecker(LeoUnitTest):
     """Test cases for leoCheckerCommands.py"""
     #@+others
+    #@+node:tom.20261019021012.16: *3* test_checker_pool
+    def test_checker_pool(self):
+        pool = checkerCommands.CheckerPool()
+        calls, finished, reports = [], [], []
+
+        def check(s):
+            calls.append(s)
+            return len(s.split()), s.split()
+
+        table = (
+            # contents, expected calls, expected number of cached files.
+            (['a b', 'c'], ['a b', 'c'], 0),
+            (['a b', 'c d'], ['c d'], 1),  # Only file1.py has changed.
+        )
+        for contents, expected_calls, expected_cached in table:
+            calls.clear()
+            tasks = [
+                g.Bunch(args=(s,), key=s, path=f"file{i}.py", report=reports.append)
+                    for i, s in enumerate(contents)]
+            pool.start('test', tasks,
+                finish=finished.append, func=check, processes=False, workers=2)
+            self.assertEqual(sorted(calls), expected_calls)
+            batch = finished[-1]
+            self.assertEqual(batch.n_files, 2)
+            self.assertEqual(batch.n_cached, expected_cached)
+        self.assertEqual(batch.n_errors, 4)
+        self.assertEqual(len(finished), 2)
+        self.assertEqual(len(reports), 4)
+        self.assertEqual(pool.batches, [])
+    #@+node:tom.20261019031012.46: *3* test_checker_pool_kill
+    def test_checker_pool_kill(self):
+        pool = checkerCommands.CheckerPool()
+        procs = checkerCommands.CheckerProcesses()
+        command = [sys.executable, '-c', 'import time; time.sleep(60)']
+        results = []
+
+        def run():
+            results.append(checkerCommands.run_pylint_command(command, r'(.*)', procs))
+
+        thread = threading.Thread(target=run)
+        thread.start()
+        t1 = time.time()
+        while not procs.procs and time.time() - t1 < 10:
+            time.sleep(0.01)
+        self.assertEqual(len(procs.procs), 1)
+        proc = list(procs.procs)[0]
+        pool.batches.append(g.Bunch(kind='pylint', procs=procs, tasks=[]))
+        pool.kill('pylint')
+        thread.join(10)
+        self.assertFalse(thread.is_alive())
+        self.assertIsNotNone(proc.returncode)
+        self.assertEqual(pool.batches, [])
+        self.assertEqual(procs.procs, set())
+        # Processes started after the kill are terminated at once.
+        checkerCommands.run_pylint_command(command, r'(.*)', procs)
+        self.assertLess(time.time() - t1, 30)
     #@+node:ekr.20210904031436.1: *3* test_regex_for_pylint
     def test_regex_for_pylint(self):
         c = self.c
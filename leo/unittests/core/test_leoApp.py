@@ -4,6 +4,7 @@
 #@@first
 """Tests of leoApp.py"""
 import os
+import time
 import zipfile
 from leo.core import leoGlobals as g
 from leo.core.leoTest2 import LeoUnitTest
@@ -83,6 +84,52 @@ class TestApp(LeoUnitTest):
         finally:
             os.remove(path)
         self.assertEqual(s, s2)
+    #@+node:tom.20261019011012.4: *3* TestApp.test_lm_settings_snapshot
+    def test_lm_settings_snapshot(self):
+        from leo.core import leoCache
+        from leo.core import leoConfig
+        lm = g.app.loadManager
+        old_db, old_config = g.app.db, g.app.config
+        old_dicts = lm.globalSettingsDict, lm.globalBindingsDict
+        g.app.db = leoCache.SqlitePickleShare('')  # Uses :memory: when unit testing.
+
+        def config_state():
+            d = g.app.config.__dict__
+            return {key: repr(d[key]) for key in sorted(d)}
+
+        try:
+            # Startup benchmark: a full read, then a read from the snapshot.
+            # Each read starts with a new g.app.config, as at startup.
+            g.app.config = leoConfig.GlobalConfigManager()
+            t1 = time.process_time()
+            lm.readGlobalSettingsFiles()
+            t2 = time.process_time()
+            self.assertFalse(lm.settings_snapshot_hit)
+            assert lm.leo_settings_c
+            settings_d, bindings_d = lm.globalSettingsDict, lm.globalBindingsDict
+            state = config_state()
+            self.assertTrue(g.app.config.modeCommandsDict)
+            g.app.config = leoConfig.GlobalConfigManager()
+            lm.readGlobalSettingsFiles()
+            t3 = time.process_time()
+            self.assertTrue(lm.settings_snapshot_hit)
+            self.assertEqual(lm.leo_settings_c, None)
+            self.assertEqual(lm.globalBindingsDict.name(), 'lm.globalBindingsDict')
+            for d1, d2 in ((settings_d, lm.globalSettingsDict), (bindings_d, lm.globalBindingsDict)):
+                self.assertEqual(sorted(d1.keys()), sorted(d2.keys()))
+                for key in d1.keys():
+                    self.assertEqual(repr(d1.get(key)), repr(d2.get(key)), msg=key)
+            # Both paths leave g.app.config in the same state.
+            self.assertEqual(config_state(), state)
+            assert t3 - t2 < t2 - t1, (t2 - t1, t3 - t2)
+            # The active settings outline always needs the commanders.
+            lm.readGlobalSettingsFiles(use_snapshot=False)
+            self.assertFalse(lm.settings_snapshot_hit)
+            assert lm.leo_settings_c
+        finally:
+            g.app.db = old_db
+            g.app.config = old_config
+            lm.globalSettingsDict, lm.globalBindingsDict = old_dicts
     #@+node:ekr.20210909194336.4: *3* TestApp.test_rfm_writeRecentFilesFileHelper
     def test_rfm_writeRecentFilesFileHelper(self):
         fn = 'ффф.leo'
@@ -6,11 +6,14 @@
 #@+<< leoAst imports >>
 #@+node:ekr.20210902074548.1: ** << leoAst imports >>
 import ast
+import gc
 import os
 import sys
+import tempfile
 import textwrap
 import time
 import token as token_module
+import tracemalloc
 from typing import Any, Dict, List
 import unittest
 import warnings
@@ -30,7 +33,7 @@ except Exception:
 
 # pylint: disable=wrong-import-position
 from leo.core import leoGlobals as g
-from leo.core.leoAst import AstNotEqual
+from leo.core.leoAst import AstNotEqual, BatchRunner
 from leo.core.leoAst import Fstringify, Orange
 from leo.core.leoAst import Token, TokenOrderGenerator, TokenOrderTraverser
 from leo.core.leoAst import get_encoding_directive, read_file, strip_BOM
@@ -479,6 +482,45 @@ class Optional_TestFiles(BaseTest):
             for node in asttokens.util.walk(tree):
                 print(f"{node.__class__.__name__:>10} {atok.get_text(node)!s}")
     #@-others
+#@+node:tom.20261019011012.14: *3* class TestBatchRunner (BaseTest)
+class TestBatchRunner(BaseTest):
+    """Tests for the BatchRunner class."""
+    #@+others
+    #@+node:tom.20261019011012.15: *4* TestBatchRunner.test_batch_runner
+    def test_batch_runner(self):
+
+        contents = {
+            'good.py': 'a = 1\n',
+            'ugly.py': 'a=1+2\nb = "%s" % a\n',
+        }
+        with tempfile.TemporaryDirectory() as directory:
+            cache_path = os.path.join(directory, 'cache.json')
+            files = []
+            for name, s in contents.items():
+                path = os.path.join(directory, name)
+                files.append(path)
+                with open(path, 'w') as f:
+                    f.write(s)
+            files.append(os.path.join(directory, 'missing.py'))
+            table = (
+                # kind, jobs, expected (checked, changed, cached).
+                ('orange-diff', 2, (2, 1, 0)),  # Uses worker processes. Caches good.py.
+                ('orange-diff', 1, (2, 1, 1)),
+                ('fstringify', 1, (2, 1, 0)),  # Uses a separate cache entry.
+                ('orange', 1, (2, 1, 1)),  # Writes ugly.py.
+                ('orange', 1, (2, 0, 1)),  # Caches the new ugly.py.
+                ('orange', 1, (2, 0, 2)),
+            )
+            for kind, jobs, expected in table:
+                runner = BatchRunner(kind, cache_path=cache_path, jobs=jobs)
+                runner.min_parallel_files = 1
+                runner.run(files)
+                result = (runner.n_checked, runner.n_changed, runner.n_cached)
+                self.assertEqual(result, expected, msg=(kind, jobs))
+                self.assertEqual(runner.n_errors, 0)
+            with open(files[1]) as f:
+                self.assertEqual(f.read(), 'a = 1 + 2\nb = f"{a}"\n')
+    #@-others
 #@+node:ekr.20191229083512.1: *3* class TestFstringify (BaseTest)
 class TestFstringify(BaseTest):
     """Tests for the TokenOrderGenerator class."""
@@ -1604,6 +1646,85 @@ class TestReassignTokens(BaseTest):
         contents = """name='uninverted %s' % d.name()"""
         self.make_data(contents)
     #@-others
+#@+node:tom.20261019031012.1: *3* class TestScaling (BaseTest)
+class TestScaling(BaseTest):
+    """
+    Benchmarks showing that the tokenizer, the TOG and Orange take time and
+    memory proportional to the size of their input.
+    """
+    #@+others
+    #@+node:tom.20261019031012.2: *4* TestScaling.make_corpus
+    def make_corpus(self, n):
+        """Return n copies of a class using most of Python's syntax."""
+        template = textwrap.dedent('''\
+            class C{i}(object):
+                """Docstring {i}."""
+                def f{i}(self, a, b=2, *args, **kw):  # A comment.
+                    x = [a+b for a in range({i}) if a%2]
+                    d = {{'k{i}': (a, b), "s": f"{{a!r}} {{b}}"}}
+                    if a and not b or x[0] is None:
+                        return d.get('k', -1) * 2 ** 3
+                    try:
+                        y = lambda q: q[1:2] + q[::3]
+                    except (ValueError, TypeError) as e:
+                        raise RuntimeError('bad', e)
+                    return y
+        ''')
+        return ''.join(template.format(i=i) for i in range(n))
+    #@+node:tom.20261019031012.3: *4* TestScaling.measure
+    def measure(self, contents):
+        """
+        Tokenize, parse, link and beautify contents.
+        Return a dict of the times taken by each phase.
+        """
+        times = {}
+        # Collections of the growing heap would hide the algorithms' own costs.
+        gc.disable()
+        try:
+            t1 = time.process_time()
+            tokens = make_tokens(contents)
+            tree = parse_ast(contents)
+            t2 = time.process_time()
+            list(TokenOrderGenerator().create_links(tokens, tree))
+            t3 = time.process_time()
+            Orange().beautify(contents, 'test', tokens, tree)
+            t4 = time.process_time()
+        finally:
+            gc.enable()
+        times['tokens'], times['links'], times['orange'] = t2 - t1, t3 - t2, t4 - t3
+        return times
+    #@+node:tom.20261019031012.4: *4* TestScaling.measure_peak_memory
+    def measure_peak_memory(self, contents):
+        """Return the peak memory used while beautifying contents."""
+        tracemalloc.start()
+        try:
+            tokens = make_tokens(contents)
+            tree = parse_ast(contents)
+            list(TokenOrderGenerator().create_links(tokens, tree))
+            Orange().beautify(contents, 'test', tokens, tree)
+            return tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    #@+node:tom.20261019031012.5: *4* TestScaling.test_linear_memory
+    def test_linear_memory(self):
+
+        small, large = self.make_corpus(10), self.make_corpus(40)
+        ratio = self.measure_peak_memory(large) / self.measure_peak_memory(small)
+        assert ratio < 6, ratio
+    #@+node:tom.20261019031012.6: *4* TestScaling.test_linear_time
+    def test_linear_time(self):
+
+        # Quadratic behavior would make the ratios about 16.
+        small, large = self.make_corpus(100), self.make_corpus(400)
+        # Use the best of several runs: the small times are the noisiest.
+        small_times = [self.measure(small) for i in range(3)]
+        large_times = [self.measure(large) for i in range(2)]
+        for phase in small_times[0]:
+            t1 = min(z[phase] for z in small_times)
+            t2 = min(z[phase] for z in large_times)
+            ratio = t2 / max(t1, 1e-6)
+            assert ratio < 8, (phase, ratio)
+    #@-others
 #@+node:ekr.20191227051737.1: *3* class TestTOG (BaseTest)
 class TestTOG(BaseTest):
     """
@@ -9,6 +9,7 @@ import textwrap
 from leo.core import leoGlobals as g
 from leo.core import leoAtFile
 from leo.core import leoBridge
+from leo.core import leoCache
 from leo.core.leoTest2 import LeoUnitTest
 
 #@+others
@@ -399,6 +400,99 @@ class TestAtFile(LeoUnitTest):
         at.putRefLine(s, 0, n1, n2, name, p)
         
        
+    #@+node:tom.20261018103015.1: *3* TestAtFile.test_readAll_with_scanned_files
+    def test_readAll_with_scanned_files(self):
+
+        at, c = self.at, self.c
+        with tempfile.TemporaryDirectory() as temp_dir:
+            # Create several external files, sharing a clone.
+            clone = None
+            roots, expected = [], []
+            for i in range(4):
+                root = c.lastTopLevel().insertAfter()
+                root.h = f"@file {temp_dir}{os.sep}test_{i}.py"
+                root.b = f"# file {i}\n@others\n"
+                child = root.insertAsLastChild()
+                child.h, child.b = f"child {i}", f"a = {i}\n"
+                if clone:
+                    clone.clone().moveToLastChildOf(root)
+                else:
+                    clone = child
+                roots.append(root)
+            for root in roots:
+                s = at.atFileToString(root, sentinels=True)
+                with open(g.fullPath(c, root), 'w') as f:
+                    f.write(s)
+                expected.append(s)
+            for root in roots:
+                while root.hasChildren():
+                    root.firstChild().doDelete()
+            # Scan the files as worker processes would.
+            encoding = c.config.default_derived_file_encoding
+            for root in roots:
+                path = g.fullPath(c, root)
+                result = leoAtFile.scan_external_file(path, root.gnx, encoding)
+                self.assertTrue(result and result[1], msg=path)
+                at.scannedFiles[path] = result
+            at.readAll(c.rootPosition())
+            self.assertEqual(at.scannedFiles, {})
+            for root, s in zip(roots, expected):
+                self.assertEqual(at.atFileToString(root, sentinels=True), s)
+            self.assertTrue(roots[1].lastChild().isCloned())
+            self.assertEqual(roots[1].lastChild().v, roots[3].lastChild().v)
+            self.assertEqual(c.checkOutline(), 0)
+    #@+node:tom.20261020090000.4: *3* TestAtFile.test_scanFilesInWorkers
+    def test_scanFilesInWorkers(self):
+        at, c = self.at, self.c
+        with tempfile.TemporaryDirectory() as temp_dir:
+            roots, expected = [], []
+            for i in range(3):
+                root = c.lastTopLevel().insertAfter()
+                root.h = f"@file {temp_dir}{os.sep}test_{i}.py"
+                root.b = f"# file {i}\n@others\n"
+                child = root.insertAsLastChild()
+                child.h, child.b = f"child {i}", f"a = {i}\n"
+                roots.append(root)
+            for root in roots:
+                s = at.atFileToString(root, sentinels=True)
+                with open(g.fullPath(c, root), 'w') as f:
+                    f.write(s)
+                expected.append(s)
+                while root.hasChildren():
+                    root.firstChild().doDelete()
+            # Scan the files in a real pool of worker processes.
+            at.atFileReadWorkers = 2
+            at.scanFilesInWorkers(roots)
+            paths = [g.fullPath(c, root) for root in roots]
+            self.assertEqual(sorted(at.scannedFiles), sorted(paths))
+            # at.read uses the workers' trees without reading the files again.
+            for path in paths:
+                with open(path, 'w') as f:
+                    f.write('changed')
+            for root in roots:
+                self.assertTrue(at.read(root))
+            self.assertEqual(at.scannedFiles, {})
+            for root, s in zip(roots, expected):
+                self.assertEqual(at.atFileToString(root, sentinels=True), s)
+            # Workers only hash unchanged files whose trees are cached.
+            at.useAtFileCache = True
+            at.atFileCacher = cacher = leoCache.AtFileCacher()
+            root, path = roots[0], paths[0]
+            with open(path, 'w') as f:
+                f.write(expected[0])
+            at.scannedFiles[path] = leoAtFile.scan_external_file(path, root.gnx, 'utf-8')
+            self.assertTrue(at.read(root))
+            self.assertEqual(cacher.stores, 1)
+            self.assertIsNone(cacher.get_hash(path, 'another.gnx'))
+            result = leoAtFile.scan_external_file(
+                path, root.gnx, 'utf-8', cacher.get_hash(path, root.gnx))
+            self.assertIsNone(result[1])
+            at.scannedFiles[path] = result
+            while root.hasChildren():
+                root.firstChild().doDelete()
+            self.assertTrue(at.read(root))
+            self.assertEqual(cacher.hits, 1)
+            self.assertEqual(at.atFileToString(root, sentinels=True), expected[0])
     #@+node:ekr.20210905052021.24: *3* TestAtFile.test_remove
     def test_remove(self):
         
@@ -476,6 +570,34 @@ class TestAtFile(LeoUnitTest):
         finally:
             f.close()
             os.unlink(f.name)
+    #@+node:tom.20261018150322.8: *3* TestAtFile.test_replaceFile_cached_hash
+    def test_replaceFile_cached_hash(self):
+
+        at, c = self.at, self.c
+        at.initCommonIvars()
+        at.scanAllDirectives(c.p)
+        encoding = 'utf-8'
+        hasher = leoCache.get_content_hasher()
+        with tempfile.TemporaryDirectory() as temp_dir:
+            fn = os.path.join(temp_dir, 'test.txt')
+            contents = 'test contents'
+            with open(fn, 'w', encoding=encoding) as f:
+                f.write(contents)
+            # Pretend the file was written an hour ago, so its hash can be cached.
+            t = os.path.getmtime(fn) - 3600
+            os.utime(fn, (t, t))
+            content_hash = hasher.get_hash(fn)
+            self.assertEqual(content_hash, hasher.hash_bytes(g.toEncodedString(contents)))
+            self.assertEqual(hasher.get_cached_hash(fn), content_hash)
+            # Unchanged contents.
+            n = at.unchangedFiles
+            self.assertFalse(at.replaceFile(contents, encoding, fn, at.root))
+            self.assertEqual(at.unchangedFiles, n + 1)
+            # Changed contents. The file was just written, so its hash is not cached.
+            self.assertTrue(at.replaceFile('new contents', encoding, fn, at.root))
+            self.assertEqual(hasher.get_cached_hash(fn), None)
+            with open(fn, 'r', encoding=encoding) as f:
+                self.assertEqual(f.read(), 'new contents')
     #@+node:ekr.20210905052021.21: *3* TestAtFile.test_setPathUa
     def test_setPathUa(self):
 
@@ -521,6 +643,51 @@ class TestAtFile(LeoUnitTest):
         # Just test the last line.
         at.sentinels = False
         at.validInAtOthers(p)
+    #@+node:tom.20261018160144.3: *3* TestAtFile.test_writeAll_skips_unchanged_trees
+    def test_writeAll_skips_unchanged_trees(self):
+
+        at, c = self.at, self.c
+        at.skipUnchangedWrites = True
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = os.path.join(temp_dir, 'test.py')
+            root = c.lastTopLevel().insertAfter()
+            root.h = f"@clean {path}"
+            root.b = "@others\n"
+            child = root.insertAsLastChild()
+            child.h, child.b = 'child', 'a = 1\n'
+
+            def write():
+                root.setDirty()
+                at.writeAll(dirty=True)
+                return at.writtenFiles, at.unchangedFiles, at.skippedFiles
+
+            self.assertEqual(write(), (1, 0, 0))
+            # Nothing has changed.
+            self.assertEqual(write(), (0, 0, 1))
+            self.assertFalse(root.isDirty())
+            # Fingerprints are sha1 digests of length-prefixed fields.
+            fileName, fingerprint = at.getWriteFingerprint(root)
+            self.assertEqual(len(fingerprint), 40)
+            child.h, child.b = 'child a', ' = 1\n'
+            self.assertNotEqual(at.getWriteFingerprint(root)[1], fingerprint)
+            child.h, child.b = 'child', 'a = 1\n'
+            self.assertEqual(at.getWriteFingerprint(root)[1], fingerprint)
+            # A changed body.
+            child.b = 'a = 2\n'
+            self.assertEqual(write(), (1, 0, 0))
+            # A changed tree.
+            child2 = child.insertAfter()
+            child2.b = 'b = 1\n'
+            self.assertEqual(write(), (1, 0, 0))
+            child2.doDelete()
+            self.assertEqual(write(), (1, 0, 0))
+            # A changed external file.
+            t = os.path.getmtime(path) - 10
+            os.utime(path, (t, t))
+            self.assertEqual(write(), (0, 1, 0))
+            self.assertEqual(write(), (0, 0, 1))
+            with open(path, 'r') as f:
+                self.assertEqual(f.read(), 'a = 2\n')
     #@-others
 #@+node:ekr.20211031085414.1: ** class TestFastAtRead(LeoUnitTest)
 class TestFastAtRead(LeoUnitTest):
@@ -1041,5 +1208,91 @@ class TestFastAtRead(LeoUnitTest):
         s = c.atFileCommands.atFileToString(root, sentinels=True)
         self.assertEqual(contents, s)
     #@-others
+#@+node:tom.20261018093102.1: ** class TestAtFileCacher(LeoUnitTest)
+class TestAtFileCacher(LeoUnitTest):
+    """Test the AtFileCacher class."""
+
+    def setUp(self):
+        super().setUp()
+        self.cacher = leoCache.AtFileCacher(db={})
+
+    #@+others
+    #@+node:tom.20261018093102.2: *3* TestAtFileCacher.read
+    def read(self, contents, root):
+        """Read contents into root, using the cache if possible."""
+        c, cacher = self.c, self.cacher
+        x = leoAtFile.FastAtRead(c, c.fileCommands.gnxDict)
+        tree = cacher.get_tree('test', contents, root.gnx)
+        if tree:
+            x.read_tree_into_root(tree, root)
+        else:
+            x.read_into_root(contents, 'test', root)
+            cacher.put_tree('test', contents, root.gnx, x.make_tree(root.v))
+    #@+node:tom.20261018093102.3: *3* TestAtFileCacher.make_contents
+    def make_contents(self, root, a=1):
+        # Be careful: no line should look like a Leo sentinel!
+        return textwrap.dedent(f'''\
+        #AT+leo-ver=5-thin
+        #AT+node:{root.gnx}: * {root.h}
+        #AT@language python
+
+        a = {a}
+
+        #AT+others
+        #AT+node:tom.20261018093102.10: ** cloned node
+        a = 2
+        #AT+node:tom.20261018093102.11: *3* child
+        a = 3
+        #AT+node:tom.20261018093102.12: ** sibling
+        b = 4
+        #AT+node:tom.20261018093102.10: ** cloned node
+        a = 2
+        #AT+node:tom.20261018093102.11: *3* child
+        a = 3
+        #AT-others
+        #AT-leo
+        ''').replace('AT', '@')
+    #@+node:tom.20261018093102.4: *3* TestAtFileCacher.test_cache_hit_matches_cold_read
+    def test_cache_hit_matches_cold_read(self):
+
+        c, cacher = self.c, self.cacher
+        root = c.rootPosition()
+        root.h = '@file /test/test_cache.py'
+        contents = self.make_contents(root)
+        # The cold read fills the cache.
+        self.read(contents, root)
+        self.assertEqual((cacher.hits, cacher.misses, cacher.stores), (0, 1, 1))
+        cold = [(p.gnx, p.h, p.b, p.level(), p.isCloned()) for p in root.self_and_subtree()]
+        # Change the outline, then re-read from the cache.
+        root.firstChild().b = 'changed'
+        root.lastChild().doDelete()
+        self.read(contents, root)
+        self.assertEqual((cacher.hits, cacher.misses, cacher.stores), (1, 1, 1))
+        warm = [(p.gnx, p.h, p.b, p.level(), p.isCloned()) for p in root.self_and_subtree()]
+        self.assertEqual(cold, warm)
+        self.assertEqual(root.firstChild().v, root.lastChild().v)
+        self.assertEqual(len(root.firstChild().v.parents), 2)
+        s = c.atFileCommands.atFileToString(root, sentinels=True)
+        self.assertEqual(contents, s)
+        self.assertTrue(c.checkOutline() == 0)
+    #@+node:tom.20261018093102.5: *3* TestAtFileCacher.test_cache_invalidation
+    def test_cache_invalidation(self):
+
+        c, cacher = self.c, self.cacher
+        root = c.rootPosition()
+        root.h = '@file /test/test_cache.py'
+        self.read(self.make_contents(root), root)
+        # Changed contents are a miss.
+        self.read(self.make_contents(root, a=5), root)
+        self.assertEqual((cacher.hits, cacher.misses), (0, 2))
+        self.assertTrue(root.b.endswith('a = 5\n\n@others\n'), repr(root.b))
+        self.read(self.make_contents(root, a=5), root)
+        self.assertEqual((cacher.hits, cacher.misses), (1, 2))
+        # Clearing the cache forces a cold read.
+        self.assertEqual(cacher.clear(), 1)
+        self.read(self.make_contents(root, a=5), root)
+        self.assertEqual((cacher.hits, cacher.misses), (0, 1))
+        self.assertTrue('1 miss,' in cacher.stats(), cacher.stats())
+    #@-others
 #@-others
 #@-leo
@@ -9,6 +9,10 @@ from leo.core.leoTest2 import LeoUnitTest
 import leo.core.leoBridge as leoBridge
 
 #@+others
+#@+node:tom.20261018163410.2: ** function: count_nodes
+def count_nodes(c):
+    """Return the number of vnodes in c. Workers require a module-level function."""
+    return len(list(c.all_unique_nodes()))
 #@+node:ekr.20210903153138.2: ** class TestBridge(LeoUnitTest)
 class TestBridge(LeoUnitTest):
     """Test cases for leoBridge.py"""
@@ -31,6 +35,27 @@ class TestBridge(LeoUnitTest):
         self.assertTrue(os.path.exists(test_dot_leo), msg=test_dot_leo)
         c = controller.openLeoFile(test_dot_leo)
         self.assertTrue(c)
+    #@+node:tom.20261018163410.3: *3* TestBridge.test_process_files
+    def test_process_files(self):
+        unittest_dir = os.path.abspath(os.path.dirname(__file__))
+        test_dot_leo = os.path.normpath(os.path.join(unittest_dir, '..', '..', 'test', 'test.leo'))
+        missing_leo = os.path.join(unittest_dir, 'xyzzy.leo')
+        paths = [test_dot_leo, missing_leo, test_dot_leo]
+        expected = None
+        for workers in (1, 2):
+            results = list(leoBridge.process_files(paths, count_nodes, workers=workers))
+            self.assertEqual(sorted(z.path for z in results), sorted(paths))
+            for r in results:
+                if r.path == missing_leo:
+                    self.assertTrue('FileNotFoundError' in r.error, msg=r.error)
+                    self.assertEqual(r.result, None)
+                else:
+                    self.assertEqual(r.error, None)
+                    self.assertTrue(r.result > 0)
+                    self.assertTrue(r.seconds >= r.open_seconds)
+                    if expected is None:
+                        expected = r.result
+                    self.assertEqual(r.result, expected)
     #@-others
 #@-others
 #@-leo
@@ -5,6 +5,7 @@
 """Tests of leoColorizer.py"""
 
 import textwrap
+import time
 from leo.core import leoGlobals as g
 from leo.core.leoTest2 import LeoUnitTest
 import leo.core.leoColorizer as leoColorizer
@@ -1383,6 +1384,182 @@ class TestColorizer(LeoUnitTest):
             </MODE>
     """)
         self.color('html', text)
+    #@+node:tom.20261018211512.4: *3* TestColorizer.test_colorizer_throughput
+    def test_colorizer_throughput(self):
+        # A throughput benchmark: lines colored per second for several languages.
+        if not leoColorizer.QtWidgets:
+            self.skipTest('Requires Qt')
+        c = self.c
+        wrapper = c.frame.body.wrapper
+        x = leoColorizer.JEditColorizer(c, c.frame.body.widget, wrapper)
+        # Color all tags, as Qt's wrapper would.
+        wrapper.configDict = {z: 'blue' for z in x.tags}
+        wrapper.configUnderlineDict = {}
+        with open(g.os_path_finalize_join(g.app.loadDir, 'leoNodes.py'), encoding='utf-8') as f:
+            python_s = f.read()
+        table = (
+            ('python', python_s),
+            ('c', textwrap.dedent("""\
+                #include <stdio.h>
+                /* A block comment. */
+                static int count_lines(const char *s, int n) {
+                    int i, result = 0;  // A line comment.
+                    for (i = 0; i < n; i++) {
+                        if (s[i] == '\\n') result++;
+                    }
+                    return result + printf("%d\\n", n);
+                }
+            """) * 200),
+            ('html', textwrap.dedent("""\
+                <html>
+                <!-- A comment -->
+                <body class="main" id='x'>
+                    <p>Some <b>bold</b> text &amp; a <a href="http://leoeditor.com">link</a></p>
+                </body>
+                </html>
+            """) * 200),
+            ('rest', textwrap.dedent("""\
+                Section
+                =======
+
+                Some *emphasis*, **strong** text and ``literals``.
+
+                - A list item with a `link <http://leoeditor.com>`_.
+            """) * 200),
+        )
+        rates = {}
+        for language, text in table:
+            lines = text.splitlines()
+            x.language = language
+            x.init()
+            # Only characters that might start a match are examined.
+            leadins = x.compile_leadins(x.rulesDict)
+            self.assertIsNone(leadins.match(' '), msg=language)
+            self.assertIs(x.compile_leadins(x.rulesDict), leadins)
+            n = x.initialStateNumber
+            t1 = time.perf_counter()
+            for s in lines:
+                x.mainLoop(n, s)
+            t2 = time.perf_counter()
+            rates[language] = len(lines) / max(t2 - t1, 1e-6)
+        for language, rate in rates.items():
+            self.assertGreater(rate, 1000, msg=f"{language}: {rate:.0f} lines/sec")
+    #@+node:tom.20261019031012.38: *3* TestColorizer.test_compile_leadins_cache
+    def test_compile_leadins_cache(self):
+        if not leoColorizer.QtWidgets:
+            self.skipTest('Requires Qt')
+        c = self.c
+        x = leoColorizer.JEditColorizer(c, c.frame.body.widget, c.frame.body.wrapper)
+        x.language = 'python'
+        x.init()
+        d = x.rulesDict
+        leadins = x.compile_leadins(d)
+        self.assertIsNone(leadins.match(' '))
+        self.assertIs(x.compile_leadins(d), leadins)
+
+        def rule(self, s, i):
+            return 0
+
+        # Replace a list of null rules with a list of the same length.
+        saved = d[' ']
+        d[' '] = [rule] * len(saved)
+        x.set_wikiview_patterns([], [])
+        self.assertIsNotNone(x.compile_leadins(d).match(' '))
+        # Replace a rule in place.
+        d[' '][:] = saved
+        x.init_mode('rest')  # Loading any mode rechecks all leadins.
+        self.assertIsNone(x.compile_leadins(d).match(' '))
+    #@+node:tom.20261018223512.7: *3* TestColorizer.test_line_cache
+    def test_line_cache(self):
+        if not leoColorizer.QtWidgets:
+            self.skipTest('Requires Qt')
+        c = self.c
+        wrapper = c.frame.body.wrapper
+        x = leoColorizer.JEditColorizer(c, c.frame.body.widget, wrapper)
+        wrapper.configDict = {z: 'blue' for z in x.tags}
+        wrapper.configUnderlineDict = {}
+        x.highlighter = leoColorizer.PrecolorHighlighter()
+        lines = textwrap.dedent('''\
+            def spam(a, b=2):
+                """
+                A docstring
+                spanning lines.
+                """
+                return a + b  # A comment.
+            < < a section reference > >
+            s = 'a string'
+        ''').replace('< <', '<<').replace('> >', '>>').splitlines()
+        tags, calls = [], []
+        setTag, mainLoop = x.setTag, x.mainLoop
+
+        def record_tag(tag, s, i, j):
+            if i < j:
+                tags.append((tag, i, j))
+            setTag(tag, s, i, j)
+
+        def count_calls(n, s):
+            calls.append(s)
+            mainLoop(n, s)
+
+        x.setTag, x.mainLoop = record_tag, count_calls
+
+        def color_lines():
+            # Simulate selecting the node: state numbers start afresh.
+            x.language = 'python'
+            x.init()
+            calls.clear()
+            result = []
+            n = x.initialStateNumber
+            for block_n, s in enumerate(lines):
+                tags.clear()
+                x.colorLine(c.p.v, block_n, n, s)
+                n = x.currentState()
+                result.append((x.stateDict.get(n), list(tags)))
+            return result
+
+        x.line_cache_size = 0
+        expected = color_lines()
+        self.assertEqual(len(calls), len(lines))
+        x.line_cache_size = 20
+        self.assertEqual(color_lines(), expected)
+        self.assertEqual(len(calls), len(lines))
+        # Only the section reference is colored again.
+        self.assertEqual(color_lines(), expected)
+        self.assertEqual(calls, [lines[6]])
+        # Changed lines are colored again.
+        lines[2] = 'Changed.'
+        color_lines()
+        self.assertEqual(calls, ['Changed.', lines[6]])
+        # So are lines whose starting state has changed.
+        lines[1] = '    pass'
+        color_lines()
+        self.assertEqual(len(calls), len(lines) - 1)
+    #@+node:tom.20261019031012.39: *3* TestColorizer.test_precolor_step
+    def test_precolor_step(self):
+        if not leoColorizer.QtWidgets:
+            self.skipTest('Requires Qt')
+        c = self.c
+        wrapper = c.frame.body.wrapper
+        x = leoColorizer.JEditColorizer(c, c.frame.body.widget, wrapper)
+        wrapper.configDict = {z: 'blue' for z in x.tags}
+        wrapper.configUnderlineDict = {}
+        p = c.p.insertAfter()
+        p.h = 'rest'
+        p.b = '@language rest\n\nSection\n=======\n\nSome *emphasis*.\n'
+        x.language = 'python'
+        x.init()
+        rulesDict, keywordsDict = x.rulesDict, x.keywordsDict
+        # Before the first recolor no mode has been pushed.
+        x.modeBunch = None
+        x.precolor_queue = [p.copy()]
+        while x.precolorStep():
+            pass
+        self.assertTrue(x.line_cache.get(p.v))
+        self.assertEqual(x.language, 'python')
+        self.assertIsNone(x.modeBunch)
+        self.assertIs(x.rulesDict, rulesDict)
+        self.assertIs(x.keywordsDict, keywordsDict)
+        self.assertEqual(x.rulesetName, 'python_main')
     #@+node:ekr.20210905170507.36: *3* TestColorizer.test_colorizer_wikiTest
     def test_colorizer_wikiTest(self):
         # both color_markup & add_directives plugins must be enabled.
@@ -4,7 +4,10 @@
 #@@first
 """Tests of leoExternalFiles.py"""
 
+import os
+import tempfile
 from leo.core import leoGlobals as g
+from leo.core import leoCache
 import leo.core.leoApp as leoApp
 from leo.core.leoTest2 import LeoUnitTest
 import leo.core.leoExternalFiles as leoExternalFiles
@@ -21,6 +24,109 @@ class TestExternalFiles(LeoUnitTest):
         g.app.idleTimeManager = leoApp.IdleTimeManager()
         g.app.idleTimeManager.start()
         g.app.externalFilesController = leoExternalFiles.ExternalFilesController(c=c)
+    #@+node:tom.20261018150322.9: *3* TestExternalFiles.test_checksum
+    def test_checksum(self):
+        efc = g.app.externalFilesController
+        hasher = leoCache.ContentHashCacher()
+        hasher.chunk_size = 7  # Test chunking.
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = os.path.join(temp_dir, 'test.txt')
+            data = b'line 1\nline 2\nline 3\n'
+            with open(path, 'wb') as f:
+                f.write(data)
+            self.assertEqual(hasher.hash_file(path), hasher.hash_bytes(data))
+            # Recently modified files are never cached.
+            hasher.get_hash(path)
+            hasher.get_hash(path)
+            self.assertEqual((hasher.hits, hasher.misses), (0, 2))
+            t = os.path.getmtime(path) - 3600
+            os.utime(path, (t, t))
+            hasher.get_hash(path)
+            self.assertEqual(hasher.get_hash(path), hasher.hash_bytes(data))
+            self.assertEqual((hasher.hits, hasher.misses), (1, 3))
+            # Changing the modification time invalidates the cached hash.
+            data = b'line 1\nline 2\nline X\n'
+            with open(path, 'wb') as f:
+                f.write(data)
+            os.utime(path, (t + 1, t + 1))
+            self.assertEqual(hasher.get_hash(path), hasher.hash_bytes(data))
+            self.assertEqual((hasher.hits, hasher.misses), (1, 4))
+            # The external files controller uses the shared cache.
+            self.assertEqual(efc.checksum(path), hasher.hash_bytes(data))
+            self.assertEqual(efc.checksum(os.path.join(temp_dir, 'xyzzy.txt')), None)
+    #@+node:tom.20261018140512.9: *3* TestExternalFiles.test_get_at_file_nodes
+    def test_get_at_file_nodes(self):
+        c = self.c
+        efc = g.app.externalFilesController
+        aList = efc.get_at_file_nodes(c)
+        n = len(aList)
+        # The list is cached.
+        self.assertTrue(efc.get_at_file_nodes(c) is aList)
+        # Changing the outline recomputes the list.
+        p = c.rootPosition().insertAfter()
+        aList = efc.get_at_file_nodes(c)
+        self.assertEqual(len(aList), n)
+        # Changing ordinary headlines does not.
+        p.h = 'xyzzy'
+        self.assertTrue(efc.get_at_file_nodes(c) is aList)
+        # Creating or removing @<file> nodes does.
+        p.h = '@clean xyzzy.py'
+        aList = efc.get_at_file_nodes(c)
+        self.assertEqual(len(aList), n + 1)
+        self.assertTrue(any(p2 == p and path.endswith('xyzzy.py') for p2, path in aList))
+        # Changing @path directives in ancestors does.
+        p.h = 'xyzzy'
+        child = p.insertAsLastChild()
+        child.h = '@clean xyzzy.py'
+        aList = efc.get_at_file_nodes(c)
+        p.b = '@path abc\n'
+        aList2 = efc.get_at_file_nodes(c)
+        self.assertFalse(aList2 is aList)
+        self.assertTrue(any(path.endswith(os.path.join('abc', 'xyzzy.py')) for p2, path in aList2))
+        child.h = 'xyzzy'
+        self.assertEqual(len(efc.get_at_file_nodes(c)), n)
+    #@+node:tom.20261019031012.35: *3* TestExternalFiles.test_get_at_file_nodes_to_check
+    def test_get_at_file_nodes_to_check(self):
+        c = self.c
+        efc = g.app.externalFilesController
+        # Simulate a running watcher.
+        watcher = efc.watcher = leoExternalFiles.ExternalFileWatcher()
+        watcher.active = True
+        watcher.observer = g.NullObject()
+        efc.watch_d[c] = True
+        paths = []
+        for i in range(3):
+            p = c.rootPosition().insertAfter()
+            p.h = f"@clean xyzzy{i}.py"
+            paths.append(g.fullPath(c, p))
+        # All new paths must be checked once.
+        aList = efc.get_at_file_nodes_to_check(c)
+        self.assertEqual(sorted(path for p, path in aList), sorted(paths))
+        self.assertEqual(efc.get_at_file_nodes_to_check(c), [])
+        # Afterwards, only the paths that the watcher reports.
+        watcher.dispatch(g.Bunch(src_path=paths[1]))
+        aList = efc.get_at_file_nodes_to_check(c)
+        self.assertEqual([path for p, path in aList], [paths[1]])
+        efc.has_changed(paths[1])
+        self.assertEqual(efc.get_at_file_nodes_to_check(c), [])
+    #@+node:tom.20261018140512.10: *3* TestExternalFiles.test_watcher_dispatch
+    def test_watcher_dispatch(self):
+        # Simulate the events that watchdog's observer thread would send.
+        watcher = leoExternalFiles.ExternalFileWatcher()
+        path = g.os_path_realpath(g.os_path_finalize_join(g.app.loadDir, 'leoGlobals.py'))
+        other_path = g.os_path_realpath(g.os_path_finalize_join(g.app.loadDir, 'leoNodes.py'))
+        watcher.paths.add(path)
+        self.assertFalse(watcher.is_changed(path))
+        # Changes to unwatched files are ignored.
+        watcher.dispatch(g.Bunch(src_path=other_path))
+        self.assertFalse(watcher.is_changed(other_path))
+        watcher.dispatch(g.Bunch(src_path=path))
+        self.assertTrue(watcher.is_changed(path))
+        watcher.discard(path)
+        self.assertFalse(watcher.is_changed(path))
+        # Moves report changes to the destination.
+        watcher.dispatch(g.Bunch(src_path=other_path, dest_path=path))
+        self.assertTrue(watcher.is_changed(path))
     #@+node:ekr.20210911052754.4: *3* TestExternalFiles.test_on_idle
     def test_on_idle(self):
         """
@@ -8,6 +8,12 @@ Tests of leoFileCommands.py.
 test-file-commands runs these tests.
 """
 
+import os
+import sqlite3
+import tempfile
+import time
+import tracemalloc
+import leo.core.leoCache as leoCache
 import leo.core.leoFileCommands as leoFileCommands
 from leo.core.leoTest2 import LeoUnitTest
 
@@ -94,6 +100,145 @@ class TestFileCommands(LeoUnitTest):
         s = fc.putUnknownAttributes(p.v)
         expected = ' unit_test="58040000006162636471002e"'
         self.assertEqual(s, expected)
+    #@+node:tom.20261019031012.19: *3* TestFileCommands.test_background_save
+    def test_background_save(self):
+        c, root = self.c, self.root_p
+        fc = c.fileCommands
+        for i in range(3):
+            p = root.insertAsLastChild()
+            p.h = f"node {i}"
+            p.b = f"a < b & {i}\n"
+        # @<file> trees, @edit nodes, @ignore trees, clones and uAs.
+        for h in ('@file a.py', '@clean b.py', '@auto c.py', '@edit d.txt', '@edit e.txt'):
+            p = root.insertAsLastChild()
+            p.h = h
+            p.b = 'body of <' + h + '>\n'
+            if h != '@edit e.txt':
+                child = p.insertAsLastChild()
+                child.h = 'child & <tag>'
+                child.v.unknownAttributes = {'str_ua': 'val'}
+        clone = root.firstChild().clone()
+        clone.moveToLastChildOf(root.lastChild().back())
+        p = c.rootPosition().insertAfter()
+        p.h = '@ignore <tree>'
+        p2 = p.insertAsLastChild()
+        p2.h = '@file ignored.py'
+        p2.b = 'ignored & written'
+        p2.insertAsLastChild().h = 'ignored child'
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'test.leo')
+            expected = bytes(fc.outline_to_xml_string(), fc.leo_file_encoding, 'replace')
+            # Changes made after the snapshot don't affect the saved file.
+            snapshot = fc.outline_to_xml_snapshot()
+            root.firstChild().b = 'changed'
+            root.firstChild().clone()
+            leoFileCommands.write_xml_snapshot(snapshot, path, fc.leo_file_encoding)
+            with open(path, 'rb') as f:
+                self.assertEqual(f.read(), expected)
+            # Write in the worker thread.
+            os.remove(path)
+            expected = bytes(fc.outline_to_xml_string(), fc.leo_file_encoding, 'replace')
+            self.assertTrue(fc.write_xml_file(path, background=True, silent=True))
+            fc.finishBackgroundSaves()
+            with open(path, 'rb') as f:
+                self.assertEqual(f.read(), expected)
+            self.assertEqual(os.listdir(directory), ['test.leo'])
+            # A failed save marks the outline as changed.
+            c.clearChanged()
+            path = os.path.join(directory, 'missing', 'test.leo')
+            self.assertTrue(fc.write_xml_file(path, background=True, silent=True))
+            fc.finishBackgroundSaves()
+            self.assertTrue(c.changed)
+            # A successful save clears the changed flag only if the outline
+            # has not changed since the snapshot.
+            path = os.path.join(directory, 'test.leo')
+            snapshot = fc.outline_to_xml_snapshot()
+            self.assertTrue(fc.snapshot_is_current(snapshot))
+            root.b = root.b + 'changed'
+            self.assertFalse(fc.snapshot_is_current(snapshot))
+            snapshot = fc.outline_to_xml_snapshot()
+            root.insertAsLastChild()
+            self.assertFalse(fc.snapshot_is_current(snapshot))
+            c.setChanged()
+            self.assertTrue(fc.write_xml_file(path, background=True, silent=True))
+            fc.finishBackgroundSaves()
+            self.assertFalse(c.changed)
+    #@+node:tom.20261019031012.23: *3* TestFileCommands.test_db_incremental_save
+    def test_db_incremental_save(self):
+        # A save benchmark: a full export vs. saving a one-node edit.
+        from leo.core import leoCommands
+        from leo.core.leoGui import NullGui
+        c, root = self.c, self.root_p
+        fc = c.fileCommands
+
+        def export(path):
+            t1 = time.perf_counter()
+            self.assertTrue(fc.exportToSqlite(path))
+            t2 = time.perf_counter()
+            c.sqlite_connection.close()
+            c.sqlite_connection = None
+            return t2 - t1
+
+        def read(path):
+            c2 = leoCommands.Commands(path, gui=NullGui())
+            conn = sqlite3.connect(path)
+            c2.fileCommands.getLeoFile(conn, path, readAtFileNodesFlag=False, silent=True)
+            conn.close()
+            return c2
+
+        def contents(c):
+            return [(p.gnx, p.h, p.b, p.level()) for p in c.all_positions()]
+
+        for i in range(2000):
+            p = root.insertAsLastChild()
+            p.h = f"node {i}"
+            p.b = f"line {i}\n" * 1000
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'test.db')
+            fc.db_cache = None
+            full_time = export(path)
+            # The cache holds digests of bodies, not the bodies themselves.
+            bodies = set(v.b for v in c.all_unique_nodes() if v.b)
+            self.assertFalse(any(row[2] in bodies for row in fc.db_cache.rows.values()))
+            root.firstChild().b = 'changed'
+            update_time = export(path)
+            self.assertLess(update_time, full_time,
+                msg=f"full export: {full_time:.3f} sec, update: {update_time:.3f} sec")
+            self.assertEqual(contents(read(path)), contents(c))
+            # Delete, insert and clone nodes.
+            root.firstChild().doDelete()
+            root.lastChild().insertAfter().h = 'new'
+            root.firstChild().clone()
+            export(path)
+            self.assertEqual(contents(read(path)), contents(c))
+            # Reorder top-level nodes: this requires a full export.
+            root.moveToRoot()
+            c.rootPosition().next().moveToRoot()
+            export(path)
+            self.assertEqual(contents(read(path)), contents(c))
+            # Saving changes to a newly-read outline updates only changed rows.
+            c2 = read(path)
+            fc2 = c2.fileCommands
+            self.assertEqual(fc2.db_cache.path, path)
+            p = c2.rootPosition().firstChild()
+            p.b = 'changed again'
+            rows = len(fc2.db_cache.rows)
+            self.assertTrue(fc2.exportToSqlite(path))
+            c2.sqlite_connection.close()
+            self.assertEqual(len(fc2.db_cache.rows), rows)
+            self.assertEqual(contents(read(path)), contents(c2))
+            # The hashes of external files come from the shared content hasher.
+            fn = os.path.join(directory, 'a.py')
+            with open(fn, 'w') as f:
+                f.write('print(1)\n')
+            p = root.insertAsLastChild()
+            p.h = f"@file {fn}"
+            export(path)
+            conn = sqlite3.connect(path)
+            row = conn.execute(
+                'select value from extra_infos where name=?', ('md5_' + p.gnx,)).fetchone()
+            conn.close()
+            self.assertEqual(row[0], leoCache.get_content_hasher().get_hash(fn))
     #@+node:ekr.20210905052021.32: *3* TestFileCommands.test_fast_readWithElementTree
     def test_fast_readWithElementTree(self):
         # Test the translation table and associated logic.
@@ -103,6 +248,157 @@ class TestFileCommands(LeoUnitTest):
         self.assertEqual(len(s), 4)
         s = s.translate(table)
         self.assertEqual(len(s), 2)
+    #@+node:tom.20261018170012.11: *3* TestFileCommands.test_lazy_body_loading
+    def test_lazy_body_loading(self):
+        from leo.core import leoCommands
+        from leo.core.leoGui import NullGui
+        c, root = self.c, self.root_p
+
+        def read(path, lazy):
+            c2 = leoCommands.Commands(path, gui=NullGui())
+            c2.config.set(None, 'bool', 'lazy-body-loading', lazy)
+            c2.config.set(None, 'int', 'lazy-body-cache-size', 2)
+            theFile = sqlite3.connect(path) if path.endswith('.db') else open(path, 'rb')
+            c2.fileCommands.getLeoFile(theFile, path, readAtFileNodesFlag=False, silent=True)
+            if path.endswith('.db'):
+                theFile.close()
+            return c2
+
+        bodies = ['a < b & c > d\n', 'line 1\r\nline 2\n', '', 'plain\n' * 3, '&amp; &#13;\n']
+        for i, body in enumerate(bodies):
+            p = root.insertAsLastChild()
+            p.h = f"node {i}"
+            p.b = body
+        root.firstChild().clone()
+        for ext in ('.leo', '.db'):
+            with tempfile.TemporaryDirectory() as directory:
+                path = os.path.join(directory, 'lazy' + ext)
+                c.fileCommands.writeOutline(path)
+                if c.sqlite_connection:
+                    c.sqlite_connection.close()
+                    c.sqlite_connection = None
+                c1 = read(path, lazy=False)
+                expected = {v.gnx: v.b for v in c1.all_unique_nodes()}
+                # Read the outline lazily.
+                c2 = read(path, lazy=True)
+                fc = c2.fileCommands
+                loader = fc.bodyLoader
+                self.assertEqual(len(loader.index), 4, msg=ext)
+                self.assertEqual(loader.loads, 0, msg=ext)
+                self.assertEqual({v.gnx: v.b for v in c2.all_unique_nodes()}, expected, msg=ext)
+                self.assertEqual(loader.loads, 4, msg=ext)
+                self.assertEqual(len(loader.resident), 2, msg=ext)
+                # Changed bodies stay resident.
+                p = c2.rootPosition().firstChild()
+                p.b = 'changed'
+                expected[p.gnx] = 'changed'
+                self.assertEqual({v.gnx: v.b for v in c2.all_unique_nodes()}, expected, msg=ext)
+                # Saving over a .leo file reads all unloaded bodies first.
+                # Saving a .db file leaves unloaded bodies in the file.
+                fc.writeOutline(path)
+                if ext == '.db':
+                    self.assertTrue(fc.bodyLoader is loader)
+                else:
+                    self.assertIsNone(fc.bodyLoader, msg=ext)
+                    self.assertTrue(all(loader.is_loaded(v) for v in c2.all_unique_nodes()), msg=ext)
+                self.assertEqual({v.gnx: v.b for v in c2.all_unique_nodes()}, expected, msg=ext)
+                if c2.sqlite_connection:
+                    c2.sqlite_connection.close()
+                c3 = read(path, lazy=False)
+                self.assertEqual({v.gnx: v.b for v in c3.all_unique_nodes()}, expected, msg=ext)
+                # Undo restores deleted nodes whose bodies were never loaded.
+                c4 = read(path, lazy=True)
+                c4.selectPosition(c4.rootPosition())
+                self.assertEqual(c4.p.h, 'root')
+                c4.deleteOutline()
+                c4.recreateGnxDict()  # As refresh-from-disk does.
+                c4.fileCommands.writeOutline(path)
+                c4.undoer.undo()
+                self.assertEqual({v.gnx: v.b for v in c4.all_unique_nodes()}, expected, msg=ext)
+                if c4.sqlite_connection:
+                    c4.sqlite_connection.close()
+    #@+node:tom.20261020090000.2: *3* TestFileCommands.test_lazy_db_save
+    def test_lazy_db_save(self):
+        from leo.core import leoCommands
+        from leo.core.leoGui import NullGui
+        c, root = self.c, self.root_p
+
+        def read(path, lazy):
+            c2 = leoCommands.Commands(path, gui=NullGui())
+            c2.config.set(None, 'bool', 'lazy-body-loading', lazy)
+            c2.config.set(None, 'int', 'lazy-body-cache-size', 10)
+            conn = sqlite3.connect(path)
+            c2.fileCommands.getLeoFile(conn, path, readAtFileNodesFlag=False, silent=True)
+            conn.close()
+            return c2
+
+        def contents(c):
+            return sorted((v.gnx, v.h, v.b) for v in c.all_unique_nodes())
+
+        for i in range(500):
+            p = root.insertAsLastChild()
+            p.h = f"node {i}"
+            p.b = f"line {i}\n" * 10
+        root.lastChild().b = '@ignore\n'
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'lazy.db')
+            c.fileCommands.writeOutline(path)
+            c.sqlite_connection.close()
+            c.sqlite_connection = None
+            c2 = read(path, lazy=True)
+            fc = c2.fileCommands
+            loader = fc.bodyLoader
+            max_bodies = loader.max_bodies
+            # Saving changed nodes doesn't load the other bodies.
+            c2.rootPosition().firstChild().b = 'changed'
+            self.assertTrue(fc.writeOutline(path))
+            self.assertLessEqual(loader.loads, max_bodies)
+            self.assertLessEqual(len(loader.resident), max_bodies)
+            # Neither does a full export.
+            c2.rootPosition().firstChild().moveToRoot()
+            self.assertTrue(fc.writeOutline(path))
+            self.assertLessEqual(loader.loads, max_bodies)
+            self.assertLessEqual(len(loader.resident), max_bodies)
+            c2.sqlite_connection.close()
+            self.assertEqual(contents(read(path, lazy=False)), contents(c2))
+    #@+node:tom.20261019031012.9: *3* TestFileCommands.test_write_xml_file
+    def test_write_xml_file(self):
+        # A save benchmark: the streaming writer vs. the whole-document string.
+        c, root = self.c, self.root_p
+        fc = c.fileCommands
+        for i in range(200):
+            p = root.insertAsLastChild()
+            p.h = f"node {i} <&>"
+            p.b = f"line {i} & <tag> \u00e9\n" * 2000  # About 50K per node.
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'test.leo')
+            with open(path, 'w') as f:
+                f.write('old contents')
+            os.chmod(path, 0o640)
+            tracemalloc.start()
+            try:
+                t1 = time.perf_counter()
+                s = fc.outline_to_xml_string()
+                expected = bytes(s, fc.leo_file_encoding, 'replace')
+                t2 = time.perf_counter()
+                string_peak = tracemalloc.get_traced_memory()[1]
+                del s
+                tracemalloc.reset_peak()
+                self.assertTrue(fc.write_xml_file(path))
+                t3 = time.perf_counter()
+                stream_peak = tracemalloc.get_traced_memory()[1]
+            finally:
+                tracemalloc.stop()
+            report = (
+                f"{len(expected) / 1e6:.1f}MB file: "
+                f"string: {t2 - t1:.2f} sec, {string_peak / 1e6:.1f}MB peak. "
+                f"stream: {t3 - t2:.2f} sec, {stream_peak / 1e6:.1f}MB peak")
+            with open(path, 'rb') as f:
+                self.assertEqual(f.read(), expected)
+            self.assertEqual(os.listdir(directory), ['test.leo'])
+            self.assertEqual(os.stat(path).st_mode & 0o777, 0o640)
+            # The peak includes the expected bytes and the outline itself.
+            self.assertLess(stream_peak - len(expected), len(expected) // 2, msg=report)
     #@-others
 #@-others
 #@-leo
@@ -151,6 +151,72 @@ class TestFind(LeoUnitTest):
         settings.pattern_match = False
         settings.suboutline_only = False
         x.do_change_all(settings)
+    #@+node:tom.20261018201012.3: *4* TestFind.change-all (processes)
+    def test_change_all_in_processes(self):
+        c, settings, x = self.c, self.settings, self.x
+        table = (
+            # find_text, change_text, ignore_case, pattern_match, whole_word
+            ('def', '_DEF_', False, False, True),
+            ('CHILD', 'kid', True, False, False),
+            (r'v(\d) = (\d)', r'w\2 = \1', False, True, False),
+        )
+
+        def change_all(workers):
+            while c.rootPosition().hasNext():
+                c.rootPosition().next().doDelete()
+            self.make_test_tree()
+            self.original = contents()
+            x.change_all_workers = workers
+            x.change_all_min_nodes = 0
+            count = x.do_change_all(settings)
+            return count, contents()
+
+        def contents():
+            return [(p.h, p.b) for p in c.all_positions()]
+
+        for find_text, change_text, ignore_case, pattern_match, whole_word in table:
+            settings.find_text = find_text
+            settings.change_text = change_text
+            settings.ignore_case = ignore_case
+            settings.pattern_match = pattern_match
+            settings.whole_word = whole_word
+            expected = change_all(workers=0)
+            self.assertEqual(x.change_all_report, '')
+            result = change_all(workers=2)
+            self.assertTrue(x.change_all_report, msg=find_text)
+            self.assertEqual(result, expected, msg=find_text)
+            # All changes are a single undoable group.
+            self.assertNotEqual(contents(), self.original, msg=find_text)
+            c.undoer.undo()
+            self.assertEqual(contents(), self.original, msg=find_text)
+    #@+node:tom.20261019031012.37: *4* TestFind.change-all (processes, clones)
+    def test_change_all_clones_in_processes(self):
+        c, settings, x = self.c, self.settings, self.x
+        settings.find_text = 'child'
+        settings.change_text = 'child child'  # Changing a node twice would be visible.
+        settings.ignore_case = False
+        settings.pattern_match = False
+        settings.whole_word = False
+        settings.suboutline_only = True
+
+        def change_all(workers):
+            while c.rootPosition().hasNext():
+                c.rootPosition().next().doDelete()
+            self.make_test_tree()
+            # Clone 'child 2' (and its child) within the suboutline.
+            parent = c.rootPosition().next()
+            clone = parent.firstChild().clone()
+            clone.moveToLastChildOf(parent)
+            c.selectPosition(parent)
+            x.change_all_workers = workers
+            x.change_all_min_nodes = 0
+            count = x.do_change_all(settings)
+            return count, [(p.h, p.b) for p in c.all_positions()]
+
+        expected = change_all(workers=0)
+        self.assertEqual(expected[0], 4)  # Two cloned vnodes, one match each in headline and body.
+        self.assertIn(('child child 2', 'def child child2():\n    v2 = 2\n'), expected[1])
+        self.assertEqual(change_all(workers=2), expected)
     #@+node:ekr.20210110073117.60: *4* TestFind.clone-find-all
     def test_clone_find_all(self):
         settings, x = self.settings, self.x
@@ -262,6 +328,64 @@ class TestFind(LeoUnitTest):
         settings.find_text = 'not-found-xyzzy'
         x.do_find_all(settings)
 
+    #@+node:tom.20261018181512.7: *4* TestFind.find-index
+    def test_find_index(self):
+        c, settings, x = self.c, self.settings, self.x
+        p = c.lastTopLevel().insertAfter()
+        p.h = 'Unicode DEF'
+        p.b = 'ΑΣ ΑΣΑ ς\r\nσ = child2()\n'
+
+        def find_all(use_index, clone):
+            x.use_find_index = use_index
+            c.clearAllVisited()
+            c.selectPosition(c.rootPosition())
+            count = x.do_clone_find_all(settings) if clone else x.do_find_all(settings)
+            if not count:
+                return 0
+            found = c.lastTopLevel()
+            result = count, found.h, found.b, [z.gnx for z in found.v.children]
+            found.doDelete()
+            return result
+
+        table = (
+            # find_text, ignore_case, whole_word, search_headline, search_body
+            ('def', False, False, True, True),
+            ('DEF', True, True, True, True),
+            ('child2', False, True, False, True),
+            ('Child', True, False, True, False),
+            ('ασα ς', True, False, True, True),
+            ('ΑΣ ', False, False, True, True),
+            ('2():\\n    v', False, False, False, True),
+            ('def child', False, False, True, True),
+            ('= child2(', False, True, True, True),
+            ('no-such-text', True, False, True, True),
+            ('():', False, False, True, True),
+        )
+        for find_text, ignore_case, whole_word, headline, body in table:
+            settings.find_text = find_text
+            settings.ignore_case = ignore_case
+            settings.whole_word = whole_word
+            settings.search_headline = headline
+            settings.search_body = body
+            for clone in (False, True):
+                expected = find_all(use_index=False, clone=clone)
+                result = find_all(use_index=True, clone=clone)
+                self.assertEqual(result, expected, msg=(find_text, clone))
+        index = x.find_index
+        self.assertEqual(index.candidates('= child2('), {c.rootPosition().next().firstChild().v, p.v})
+        self.assertIsNone(index.candidates('():'))
+        # Only changed nodes are reindexed.
+        n = index.updates
+        c.rootPosition().b = 'changed'
+        p.v._bodyString = 'changed directly'
+        self.assertEqual(index.candidates('changed'), {c.rootPosition().v, p.v})
+        self.assertEqual(index.updates, n + 2)
+        # Saved signatures are reused.
+        c.db, c.mFileName = {}, 'test_find_index.leo'
+        x.save_find_index()
+        index2 = leoFind.FindIndex(c)
+        self.assertEqual(index2.candidates('changed'), {c.rootPosition().v, p.v})
+        self.assertEqual(index2.updates, 0)
     #@+node:ekr.20210110073117.65: *4* TestFind.find-def
     def test_find_def(self):
         settings, x = self.settings, self.x
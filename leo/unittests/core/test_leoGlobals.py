@@ -543,6 +543,69 @@ class TestGlobals(LeoUnitTest):
         for path, expected in table:
             result = g.stripPathCruft(path)
             self.assertEqual(result, expected)
+    #@+node:tom.20261019031012.33: *3* TestGlobals.test_g_UnlIndex
+    def test_g_UnlIndex(self):
+        c = self.c
+        index = g.getUnlIndex(c)
+        # Create about 300 nodes, including like-named siblings and a clone.
+        last = c.lastTopLevel()
+        for i in range(10):
+            last = parent = last.insertAfter()
+            parent.h = f"node {i}"
+            for j in range(5):
+                child = parent.insertAsLastChild()
+                child.h = 'dup' if j in (3, 4) else f"child {j}"
+                for k in range(5):
+                    child.insertAsLastChild().h = f"leaf {k}"
+        clone = c.lastTopLevel().firstChild().clone()
+        clone.moveToLastChildOf(c.lastTopLevel())
+        # The index finds every position, building itself once.
+        for p in c.all_positions():
+            unl = p.get_UNL(with_file=False).split('-->')
+            found, depth, p2 = g.recursiveUNLFind(unl, c)
+            assert found and p2 == p, (unl, p2)
+        self.assertEqual(index.builds, 1)
+        # Misses.
+        self.assertIsNone(index.find(['xyzzy']))
+        found, depth, p2 = g.recursiveUNLFind(['node 0', 'xyzzy'], c)
+        self.assertFalse(found)
+        self.assertEqual(index.builds, 1)
+        # The index holds each vnode once, not positions.
+        n = len(list(c.all_unique_nodes()))
+        self.assertEqual(sum(len(z) for z in index.heads_d.values()), n)
+        # Headline changes update the index without rebuilding it.
+        p = c.lastTopLevel().firstChild().next()
+        old_unl = p.get_UNL(with_file=False).split('-->')
+        p.h = 'new child'
+        unl = p.get_UNL(with_file=False).split('-->')
+        found, depth, p2 = g.recursiveUNLFind(unl, c)
+        self.assertTrue(found)
+        self.assertEqual(p2, p)
+        self.assertIsNone(index.find(old_unl))
+        self.assertEqual(index.builds, 1)
+        # Structure changes invalidate the index.
+        p.moveToFirstChildOf(c.rootPosition())
+        found, depth, p2 = g.recursiveUNLFind(unl, c)
+        self.assertFalse(found)
+        found, depth, p2 = g.recursiveUNLFind(p.get_UNL(with_file=False).split('-->'), c)
+        self.assertTrue(found)
+        self.assertEqual(p2, p)
+        # Changes made behind the index's back.
+        parent = c.lastTopLevel().next() or c.lastTopLevel()
+        parent.v.children.reverse()
+        p = parent.firstChild()
+        found, depth, p2 = g.recursiveUNLFind(p.get_UNL(with_file=False).split('-->'), c)
+        self.assertTrue(found)
+        self.assertEqual(p2, p)
+        # With soft_idx, find a moved node from its old UNL.
+        p = c.lastTopLevel().back().firstChild().firstChild()
+        p.h = 'moved'
+        unl = p.get_UNL(with_file=False, with_index=False).split('-->')
+        p.moveToLastChildOf(c.lastTopLevel().firstChild())
+        found, depth, p2 = g.recursiveUNLFind(unl, c, soft_idx=True)
+        self.assertFalse(found)
+        self.assertEqual(depth, 2)
+        self.assertEqual(p2, p)
     #@+node:ekr.20210905203541.56: *3* TestGlobals.test_g_warnOnReadOnlyFile
     def test_g_warnOnReadOnlyFile(self):
         c = self.c
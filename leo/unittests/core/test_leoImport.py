@@ -6,8 +6,11 @@
 
 import glob
 import importlib
+import os
+import tempfile
 import textwrap
 from leo.core import leoGlobals as g
+from leo.core import leoImport
 from leo.core.leoTest2 import LeoUnitTest
 # Import all tested scanners.
 import leo.plugins.importers.coffeescript as cs
@@ -4027,6 +4030,48 @@ class TestPython (BaseTestImporter):
         ''')
         self.run_test(c.p, s=s)
     #@-others
+#@+node:tom.20261019001012.7: ** class TestRecursiveImport (BaseTestImporter)
+class TestRecursiveImport (BaseTestImporter):
+
+    #@+others
+    #@+node:tom.20261019001012.8: *3* TestRecursiveImport.test_import_in_processes
+    def test_import_in_processes(self):
+        c = self.c
+        with tempfile.TemporaryDirectory() as directory:
+            os.mkdir(os.path.join(directory, 'sub'))
+            for i, name in enumerate(('a.py', 'b.py', os.path.join('sub', 'c.py'))):
+                with open(os.path.join(directory, name), 'w') as f:
+                    f.write(textwrap.dedent(f"""\
+                        import sys
+
+                        class Class{i}:
+                            def spam(self):
+                                pass
+
+                        def eggs():
+                            pass
+                    """))
+            results, created = [], []
+            for workers in (0, 2):
+                x = leoImport.RecursiveImportController(c, '@clean',
+                    theTypes=['.py'], workers=workers)
+                x.min_parallel_files = 1
+                create = x.create_imported_file
+
+                def create_imported_file(path, parent, tree):
+                    created.append(path)
+                    create(path, parent, tree)
+
+                x.create_imported_file = create_imported_file
+                x.run(directory)
+                root = c.lastTopLevel()
+                results.append([(z.level(), z.h, z.b) for z in root.self_and_subtree()])
+                self.assertEqual(x.timings['Py_Importer'][0], 3)
+        # All files were parsed in worker processes.
+        self.assertEqual(len(created), 3)
+        self.assertEqual(results[0], results[1])
+        self.assertTrue(any(z[1] == 'class Class2' for z in results[0]), msg=results[0])
+    #@-others
 #@+node:ekr.20211108050827.1: ** class TestRst (BaseTestImporter)
 class TestRst(BaseTestImporter):
     
@@ -5,7 +5,10 @@
 """Tests for leo.core.leoNodes"""
 
 # pylint: disable=no-member
+import sys
+import tracemalloc
 from leo.core import leoGlobals as g
+from leo.core import leoNodes
 from leo.core.leoTest2 import LeoUnitTest
 
 #@+others
@@ -866,6 +869,48 @@ class TestNodes(LeoUnitTest):
             result2 = p.v.atAutoRstNodeName(h=s)
             self.assertEqual(result1, expected1, msg=s)
             self.assertEqual(result2, expected2, msg=s)
+    #@+node:tom.20261018112510.1: *4* TestNodes.test_v_lazy_attributes
+    def test_v_lazy_attributes(self):
+        c = self.c
+        v = leoNodes.VNode(context=c)
+        # Rarely-used attributes are not allocated by the ctor.
+        self.assertFalse(hasattr(v, 'at_read'))
+        with self.assertRaises(AttributeError):
+            v.no_such_attribute
+        # v.__getattr__ allocates v.expandedPositions on first use.
+        self.assertEqual(v.expandedPositions, [])
+        v.expandedPositions.append(c.p.copy())
+        self.assertEqual(v.expandedPositions, [c.p])
+    #@+node:tom.20261018112510.2: *4* TestNodes.test_v_memory_per_node
+    def test_v_memory_per_node(self):
+        # A memory benchmark: the number of bytes allocated per new leaf vnode,
+        # compared with vnodes whose lazy attributes have all been allocated.
+        c = self.c
+        n = 10000
+        parent_v = c.hiddenRootNode
+
+        def bytes_per_node(materialize):
+            vnodes = []
+            tracemalloc.start()
+            try:
+                before = tracemalloc.get_traced_memory()[0]
+                for i in range(n):
+                    v = leoNodes.VNode(context=c)
+                    v.parents.append(parent_v)
+                    if materialize:
+                        v.expandedPositions
+                        v.at_read = {}
+                    vnodes.append(v)
+                after = tracemalloc.get_traced_memory()[0]
+            finally:
+                tracemalloc.stop()
+            return (after - before) / n
+
+        lazy, materialized = bytes_per_node(False), bytes_per_node(True)
+        # The saving is at least an empty list and an empty dict per node.
+        saving = sys.getsizeof([]) + sys.getsizeof({})
+        self.assertLessEqual(lazy + saving, materialized,
+            msg=f"lazy: {lazy:.0f} materialized: {materialized:.0f} bytes per node")
     #@-others
 #@-others
 
@@ -292,6 +292,108 @@ class TestUndo(LeoUnitTest):
         j = before.find('line 3')
         func = c.extract
         self.runTest(before, after, i, j, func)
+    #@+node:tom.20261018233012.8: *3* TestUndo.test_body_deltas
+    def test_body_deltas(self):
+        p, u = self.c.p, self.c.undoer
+        lines = [f"line {i}\n" for i in range(1000)]
+        before = p.b = ''.join(lines)
+        u.clearUndoState()
+        for i in (0, 500, 999):
+            bunch = u.beforeChangeBody(p)
+            lines[i] = f"changed {i}\n"
+            p.b = ''.join(lines)
+            u.afterChangeBody(p, 'change-line', bunch)
+            # The bead holds only the changed line.
+            self.assertIsNone(bunch.oldBody)
+            self.assertIsNone(bunch.newBody)
+            self.assertLess(u.beadSize(bunch), 1000)
+        after = p.b
+        for i in range(3):
+            u.undo()
+        self.assertEqual(p.b, before)
+        for i in range(3):
+            u.redo()
+        self.assertEqual(p.b, after)
+        # Deltas also work for deleted and added lines.
+        bunch = u.beforeChangeBody(p)
+        p.b = ''.join(lines[:10] + ['a\n', 'b\n'] + lines[20:])
+        u.afterChangeBody(p, 'change-lines', bunch)
+        u.undo()
+        self.assertEqual(p.b, after)
+        u.redo()
+        self.assertEqual(p.b, ''.join(lines[:10] + ['a\n', 'b\n'] + lines[20:]))
+    #@+node:tom.20261019031012.42: *3* TestUndo.test_body_delta_mismatch
+    def test_body_delta_mismatch(self):
+        p, u = self.c.p, self.c.undoer
+        lines = [f"line {i}\n" for i in range(1000)]
+        p.b = ''.join(lines)
+        u.clearUndoState()
+        bunch = u.beforeChangeBody(p)
+        lines[500] = 'changed\n'
+        p.b = ''.join(lines)
+        u.afterChangeBody(p, 'change-line', bunch)
+        self.assertIsNotNone(bunch.bodyDelta)
+        # Change the body, keeping its length, without telling undo.
+        lines[0] = 'LINE 0\n'
+        body = p.b = ''.join(lines)
+        u.undo()
+        # The body is not patched, and the bead is gone.
+        self.assertEqual(p.b, body)
+        self.assertFalse(u.canUndo())
+        self.assertFalse(u.canRedo())
+        self.assertEqual(u.beads, [])
+    #@+node:tom.20261018233012.9: *3* TestUndo.test_change_tree_deltas
+    def test_change_tree_deltas(self):
+        p, u = self.c.p, self.c.undoer
+        u.clearUndoState()
+        body = ''.join(f"line {i}\n" for i in range(1000))
+        for i in range(3):
+            child = p.insertAsLastChild()
+            child.h = f"child {i}"
+            child.b = body
+        before = [(z.h, z.b) for z in p.subtree()]
+        bunch = u.beforeChangeTree(p)
+        for z in p.subtree():
+            z.v.b = z.b.replace('line 500\n', 'changed\n')
+        z = p.lastChild().insertAsLastChild()
+        z.h = 'new node'
+        u.afterChangeTree(p, 'change-tree', bunch)
+        after = [(z.h, z.b) for z in p.subtree()]
+        self.assertTrue(all(z[2].bodyString is None for z in bunch.oldTree[1:]))
+        for i in range(2):
+            u.undo()
+            self.assertEqual([(z.h, z.b) for z in p.subtree()], before)
+            u.redo()
+            self.assertEqual([(z.h, z.b) for z in p.subtree()], after)
+        # The bead holds only the changed lines.
+        self.assertLess(u.beadSize(bunch), len(body))
+    #@+node:tom.20261018233012.10: *3* TestUndo.test_max_undo_memory
+    def test_max_undo_memory(self):
+        p, u = self.c.p, self.c.undoer
+        u.clearUndoState()
+        try:
+            u.max_undo_memory = 100000
+            for i in range(20):
+                bunch = u.beforeChangeBody(p)
+                # Completely different bodies can't be compressed.
+                p.b = str(i) * 20000
+                u.afterChangeBody(p, 'change-body', bunch)
+            # Only the newest beads remain.
+            self.assertLessEqual(u.undoMemory(), 100000)
+            self.assertLess(len(u.beads), 20)
+            self.assertEqual(u.bead, len(u.beads) - 1)
+            n = len(u.beads)
+            for i in range(n):
+                u.undo()
+            self.assertEqual(p.b, str(19 - n) * 20000)
+            self.assertFalse(u.canUndo())
+            # The present bead always remains.
+            u.max_undo_memory = 1
+            u.redo()
+            self.assertEqual(p.b, str(20 - n) * 20000)
+            self.assertEqual(u.bead, 0)
+        finally:
+            u.reloadSettings()
     #@+node:ekr.20210906172626.14: *3* TestUndo.test_line_to_headline
     def test_line_to_headline(self):
         c = self.c
@@ -193,6 +193,128 @@ class TestLeoServer(LeoUnitTest):
             answer = self._request(method, {"log": log, "tag": "my-tag"})
             if log: g.printObj(answer, tag=f"{tag}:{method}: answer")
 
+    #@+node:tom.20261018120501.11: *3* TestLeoServer.test_position_index
+    def test_position_index(self):
+        server = self.server
+        test_dot_leo = g.os_path_finalize_join(g.app.loadDir, '..', 'test', 'test.leo')
+        self._request("!open_file", {"log": False, "filename": test_dot_leo})
+        self._request("!get_request_latency", {"reset": True})
+        try:
+            c = server.c
+            index = server.position_index
+            # All gnx lookups use a single traversal.
+            builds = index.builds
+            for p in c.all_unique_positions():
+                p2 = server._positionFromGnx(p.gnx)
+                self.assertEqual(p2, p)
+            self.assertEqual(index.builds, builds + 1)
+            self.assertFalse(server._positionFromGnx('xyzzy'))
+            # Safe requests do not invalidate the index.
+            generation = index.generation
+            ap = server._p_to_ap(c.lastVisible())
+            self._request("!set_current_position", {"ap": ap})
+            self._request("!get_body_states", {"ap": ap})
+            self.assertEqual(index.generation, generation)
+            # Safe requests reuse the archived positions and the resolved positions.
+            p = c.lastVisible()
+            d = server._get_position_d(p)
+            self.assertEqual(server._p_to_ap(p), ap)
+            self.assertTrue(index.is_known(c, p))
+            self.assertEqual(server._ap_to_p(ap), p)
+            self.assertFalse(server._p_to_ap(p).get('headline'), d)
+            # Safe requests may change headlines: the atFile flag follows them.
+            self.assertFalse(d.get('atFile'))
+            self._request("!set_headline", {"ap": ap, "name": "@file xyzzy.py"})
+            self.assertTrue(server._get_position_d(p).get('atFile'))
+            self._request("!set_headline", {"ap": ap, "name": d['headline']})
+            self.assertFalse(server._get_position_d(p).get('atFile'))
+            self.assertEqual(index.generation, generation)
+            # Mutating requests do.
+            self._request("!insert_node", {"ap": ap})
+            self.assertTrue(index.generation > generation)
+            p = c.p
+            self.assertEqual(server._positionFromGnx(p.gnx), p)
+            self.assertEqual(server._ap_to_p(server._p_to_ap(p)), p)
+            # The latency histogram.
+            answer = self._request("!get_request_latency", {"reset": True})
+            buckets = answer["buckets"]
+            d = answer["latency"]["!insert_node"]
+            self.assertEqual(d["count"], 1)
+            self.assertEqual(len(d["buckets"]), len(buckets) + 1)
+            self.assertEqual(sum(d["buckets"]), d["count"])
+            answer = self._request("!get_request_latency", {})
+            self.assertEqual(list(answer["latency"].keys()), ["!get_request_latency"])
+        finally:
+            self._request("!close_file", {"forced": True})
+    #@+node:tom.20261018131207.9: *3* TestLeoServer.test_outline_changes
+    def test_outline_changes(self):
+        # A round-trip benchmark: patch a client-side model of a large outline.
+        server = self.server
+        self._request("!open_file", {"log": False})  # A new outline.
+        c = server.c
+        try:
+            # Create about 5000 nodes.
+            root = c.rootPosition()
+            for i in range(50):
+                child = root.insertAsLastChild()
+                child.h = f"child {i}"
+                for j in range(100):
+                    grand_child = child.insertAsLastChild()
+                    grand_child.h = f"grand child {i}.{j}"
+                    grand_child.b = f"body {i}.{j}\n"
+
+            def get_model():
+                """Return a model of the outline: (children_d, headline_d)."""
+                children_d = {c.hiddenRootNode.gnx: [z.gnx for z in c.hiddenRootNode.children]}
+                headline_d = {}
+                for v in c.all_unique_nodes():
+                    children_d[v.gnx] = [z.gnx for z in v.children]
+                    headline_d[v.gnx] = v.h
+                return children_d, headline_d
+
+            # A full fetch.
+            answer = self._request("!get_outline_changes", {})
+            self.assertTrue(answer["reset"])
+            revision = answer["revision"]
+            children_d, headline_d = get_model()
+            full = server.get_all_positions({})
+            # Change the outline.
+            p = root.firstChild().firstChild()
+            ap = server._p_to_ap(p)
+            self._request("!set_headline", {"ap": ap, "name": "changed"})
+            self._request("!insert_node", {"ap": ap})
+            self._request("!clone_node", {"ap": server._p_to_ap(root.lastChild())})
+            self._request("-move-outline-up", {"ap": server._p_to_ap(root.firstChild().next())})
+            # Requests only mark the log stale: they don't compare the outline with the snapshot.
+            log = server.change_logs[c.hash()]
+            self.assertTrue(log.stale)
+            self.assertEqual(log.revision, revision)
+            # Fetch and apply the changes.
+            delta = server.get_outline_changes({"revision": revision})
+            changes = json.loads(delta)["changes"]
+            self.assertTrue(changes["inserted"])
+            self.assertTrue(changes["changed"])
+            self.assertFalse(changes["deleted"])
+            for gnx in changes["deleted"]:
+                children_d.pop(gnx, None)
+                headline_d.pop(gnx, None)
+            for gnx in changes["inserted"]:
+                children_d[gnx] = []
+            for gnx, d in changes["nodes"].items():
+                headline_d[gnx] = d["headline"]
+            children_d.update(changes["children"])
+            self.assertEqual((children_d, headline_d), get_model())
+            self.assertLess(len(delta) * 20, len(full))
+            # Nothing more has changed.
+            answer = self._request("!get_outline_changes", {"revision": json.loads(delta)["revision"]})
+            changes = answer["changes"]
+            self.assertFalse(any(changes[z] for z in ('inserted', 'deleted', 'moved', 'changed', 'children')))
+            # Unknown revisions require a full fetch.
+            answer = self._request("!get_outline_changes", {"revision": answer["revision"] + 1})
+            self.assertTrue(answer["reset"])
+        finally:
+            c.changed = False
+            self._request("!close_file", {"forced": True})
     #@-others
 #@-others
 
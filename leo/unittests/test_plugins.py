@@ -104,6 +104,30 @@ class TestPlugins(LeoUnitTest):
             assert p2
             self.assertEqual(p2.v, p.v)
             assert c.positionExists(p2), 'does not exist: %s' % p2
+    #@+node:tom.20261019031012.27: *3* TestPlugins.test_nodetags_index
+    def test_nodetags_index(self):
+        from leo.plugins import nodetags
+        c, root = self.c, self.root_p
+        a = root.insertAsLastChild()
+        b = root.insertAsLastChild()
+        a.v.u = {'__node_tags': {'work/urgent', 'home'}}
+        tc = nodetags.TagController(c)
+        self.assertEqual(sorted(tc.get_all_tags()), ['home', 'work/urgent'])
+        tc.add_tag(b, 'work/later')
+        tc.add_tag(c.rootPosition(), 'home')
+        self.assertEqual(set(tc.get_tagged_gnxes('work/*')), {a.gnx, b.gnx})
+        self.assertEqual(tc.get_tagged_nodes('home'), [c.rootPosition(), a])
+        tc.remove_tag(b, 'work/later')
+        self.assertEqual(sorted(tc.get_all_tags()), ['home', 'work/urgent'])
+        self.assertFalse(tc.get_tagged_nodes('work/later'))
+        # Deleted nodes are not tagged.
+        c.selectPosition(a)
+        c.deleteOutline()
+        self.assertEqual(tc.get_tagged_nodes('*'), [c.rootPosition()])
+        tc.update_taglist('work/urgent')
+        self.assertEqual(tc.get_all_tags(), ['home'])
+        c.undoer.undo()
+        self.assertEqual(list(tc.get_tagged_gnxes('work/urgent')), [a.gnx])
     #@+node:ekr.20210909194336.57: *3* TestPlugins.test_regularizeName
     def test_regularizeName(self):
         pc = LeoPluginsController()